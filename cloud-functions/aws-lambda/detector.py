@@ -1 +1,256 @@
-hi
+"""AWS Lambda entry point for sharded AWS detection.
+
+Each invocation processes one account/region shard, e.g.
+``{"account_id": "123456789012", "region": "eu-west-1"}``; region ``global``
+runs the account-wide Cost Explorer rules. Fan shards out with a Step
+Functions Map state or one EventBridge rule per shard.
+
+Only the standard library is imported at module load. The detector stack
+is imported on the first invocation and timed against COLD_START_BUDGET_MS;
+the DB connection, assumed-role credentials and detectors (with their
+boto3 clients) are kept for warm invocations.
+
+Local run against stubbed clients (botocore Stubber, empty inventory) and
+a dry-run DB connection; add --db to write to the DB_* database instead:
+    python cloud-functions/aws-lambda/detector.py --local --region us-east-1
+Import budget check for CI:
+    python cloud-functions/aws-lambda/detector.py --check-import-budget
+"""
+import time
+
+_MODULE_LOAD_STARTED = time.perf_counter()
+
+import os
+import sys
+import json
+import logging
+import argparse
+
+# src/ is packaged next to this file in the deployment zip; in the repo it
+# lives two directories up
+_HERE = os.path.dirname(os.path.abspath(__file__))
+for _root in (_HERE, os.path.dirname(os.path.dirname(_HERE))):
+    if os.path.isdir(os.path.join(_root, 'src')):
+        sys.path.insert(0, _root)
+        break
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_REGION = 'global'
+
+# Refresh assumed-role credentials this long before they expire
+CREDENTIAL_REFRESH_SECONDS = 300
+
+# State kept across warm invocations of the same execution environment
+_state = {
+    'cold': True,
+    'db_conn': None,
+    'credentials': {},
+    'detectors': {}
+}
+
+
+def _import_detector_stack() -> float:
+    """Import everything a detection run needs; return the time it took in ms"""
+    start = time.perf_counter()
+    import boto3  # noqa: F401
+    import psycopg2  # noqa: F401
+    from src.monitoring.logging_config import configure_logging
+    from src.detectors.aws_detector import AWSDetector  # noqa: F401
+    configure_logging()
+    return (time.perf_counter() - start) * 1000
+
+
+def _db_connection():
+    conn = _state['db_conn']
+    if conn is None or conn.closed:
+        import psycopg2
+        conn = psycopg2.connect(
+            dbname=os.getenv('DB_NAME', 'cloud_cost'),
+            user=os.getenv('DB_USER', 'postgres'),
+            password=os.getenv('DB_PASSWORD', 'postgres'),
+            host=os.getenv('DB_HOST', 'localhost'),
+            port=os.getenv('DB_PORT', '5432')
+        )
+        _state['db_conn'] = conn
+    return conn
+
+
+def _home_region() -> str:
+    return os.getenv('AWS_REGION', 'us-east-1')
+
+
+def _credentials_for(account_id: str) -> dict:
+    """Assumed-role credentials for ``account_id``, cached until shortly before
+    they expire; detectors built on replaced credentials are dropped"""
+    cached = _state['credentials'].get(account_id)
+    if cached is None or cached['Expiration'].timestamp() - time.time() < CREDENTIAL_REFRESH_SECONDS:
+        import boto3
+        role_name = os.getenv('AWS_ASSUME_ROLE_NAME', 'OrganizationAccountAccessRole')
+        sts = boto3.Session(region_name=_home_region()).client('sts')
+        cached = sts.assume_role(
+            RoleArn=f"arn:aws:iam::{account_id}:role/{role_name}",
+            RoleSessionName='cost-anomaly-lambda'
+        )['Credentials']
+        _state['credentials'][account_id] = cached
+        for key in [k for k in _state['detectors'] if k[0] == account_id]:
+            del _state['detectors'][key]
+    return cached
+
+
+def _session_for(account_id: str, region: str):
+    """Session with the function's own role, or an assumed role in ``account_id``"""
+    import boto3
+
+    if not account_id:
+        return boto3.Session(region_name=region)
+
+    credentials = _credentials_for(account_id)
+    return boto3.Session(
+        aws_access_key_id=credentials['AccessKeyId'],
+        aws_secret_access_key=credentials['SecretAccessKey'],
+        aws_session_token=credentials['SessionToken'],
+        region_name=region
+    )
+
+
+def _detector(account_id: str, region: str, session_factory):
+    """Detector for a shard, reused (with its boto3 clients) while warm"""
+    from src.detectors.aws_detector import AWSDetector
+
+    conn = _db_connection()
+    if account_id and session_factory is _session_for:
+        _credentials_for(account_id)
+
+    key = (account_id, region)
+    detector = _state['detectors'].get(key)
+    if detector is None:
+        session = session_factory(account_id, _home_region() if region == GLOBAL_REGION else region)
+        detector = AWSDetector(session=session, account_id=account_id or None, db_conn=conn)
+        # Each invocation is one shard of a fan-out, even without an account_id
+        detector.single_account = False
+        _state['detectors'][key] = detector
+    detector.db_conn = conn
+    return detector
+
+
+def handler(event, context=None, session_factory=None):
+    """Run detection for the account/region shard named in ``event``"""
+    started = time.perf_counter()
+    cold = _state['cold']
+    import_ms = None
+    if cold:
+        import_ms = _import_detector_stack() + (started - _MODULE_LOAD_STARTED) * 1000
+        budget_ms = float(os.getenv('COLD_START_BUDGET_MS', '1500'))
+        log = logger.warning if import_ms > budget_ms else logger.info
+        log("Cold start imports", extra={'import_ms': round(import_ms, 1), 'budget_ms': budget_ms})
+        _state['cold'] = False
+
+    account_id = event.get('account_id', '')
+    region = event.get('region') or _home_region()
+    scope = 'global' if region == GLOBAL_REGION else 'regional'
+
+    try:
+        detector = _detector(account_id, region, session_factory or _session_for)
+        findings = detector.detect_anomalies(scope=scope)
+    except Exception:
+        # A broken connection is reopened on the next invocation
+        conn = _state['db_conn']
+        if conn is not None and not conn.closed:
+            try:
+                conn.rollback()
+            except Exception:
+                conn.close()
+        raise
+
+    result = {
+        'account_id': account_id,
+        'region': region,
+        'findings': len(findings),
+        'failed_rules': detector.failed_rules,
+        'cold_start': cold,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+    if import_ms is not None:
+        result['import_ms'] = round(import_ms, 1)
+    logger.info("Shard complete", extra=result)
+    return result
+
+
+# Empty inventory per scope: enough for every rule to run without AWS access
+LOCAL_FIXTURES = {
+    'regional': {
+        'ec2': [('describe_instances', {'Reservations': []}), ('describe_volumes', {'Volumes': []})],
+        'rds': [('describe_db_instances', {'DBInstances': []})]
+    },
+    'global': {
+        'ce': [('get_cost_and_usage', {'ResultsByTime': []})]
+    }
+}
+
+
+class StubbedSession:
+    """boto3 session whose clients answer from botocore Stubber queues"""
+
+    def __init__(self, region_name: str, fixtures: dict, invocations: int = 1):
+        import boto3
+        self.region_name = region_name
+        self.fixtures = fixtures
+        self.invocations = invocations
+        self._session = boto3.Session(
+            aws_access_key_id='stub', aws_secret_access_key='stub', region_name=region_name
+        )
+
+    def client(self, service: str, config=None):
+        from botocore.stub import Stubber
+        client = self._session.client(service, config=config)
+        stubber = Stubber(client)
+        for _ in range(self.invocations):
+            for operation, response in self.fixtures.get(service, []):
+                stubber.add_response(operation, response)
+        stubber.activate()
+        return client
+
+
+def _check_import_budget() -> int:
+    """Measure a cold import in this fresh interpreter; non-zero exit if over budget"""
+    import_ms = _import_detector_stack() + (time.perf_counter() - _MODULE_LOAD_STARTED) * 1000
+    budget_ms = float(os.getenv('COLD_START_BUDGET_MS', '1500'))
+    print(json.dumps({'import_ms': round(import_ms, 1), 'budget_ms': budget_ms}))
+    return 0 if import_ms <= budget_ms else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Lambda detector handler outside Lambda")
+    parser.add_argument('--local', action='store_true', help="Use stubbed AWS clients and no database")
+    parser.add_argument('--db', action='store_true', help="With --local, read and write the DB_* database")
+    parser.add_argument('--fixtures', help="JSON file: {service: [[operation, response], ...]}")
+    parser.add_argument('--account-id', default='')
+    parser.add_argument('--region', default=None, help="AWS region or 'global'")
+    parser.add_argument('--invocations', type=int, default=1, help="Repeat to exercise warm reuse")
+    parser.add_argument('--check-import-budget', action='store_true')
+    args = parser.parse_args()
+
+    if args.check_import_budget:
+        return _check_import_budget()
+
+    event = {'account_id': args.account_id, 'region': args.region or _home_region()}
+    session_factory = None
+    if args.local:
+        if args.fixtures:
+            with open(args.fixtures) as f:
+                fixtures = json.load(f)
+        else:
+            fixtures = LOCAL_FIXTURES['global' if event['region'] == GLOBAL_REGION else 'regional']
+        session_factory = lambda account_id, region: StubbedSession(region, fixtures, args.invocations)
+        if not args.db:
+            from src.detectors.dry_run import DryRunConnection
+            _state['db_conn'] = DryRunConnection()
+
+    for _ in range(args.invocations):
+        print(json.dumps(handler(event, session_factory=session_factory)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -21,6 +21,7 @@ CREATE TABLE IF NOT EXISTS cost_anomalies (
     cost_impact DECIMAL(10,2) DEFAULT 0,
     severity VARCHAR(20) NOT NULL,
     details JSONB,
+    tags JSONB NOT NULL DEFAULT '{}',
     status VARCHAR(20) DEFAULT 'open',
     resolved_at TIMESTAMP,
     resolved_by VARCHAR(100),
@@ -33,6 +34,12 @@ CREATE INDEX IF NOT EXISTS idx_anomalies_detected ON cost_anomalies(detected_at
 CREATE INDEX IF NOT EXISTS idx_anomalies_status ON cost_anomalies(status);
 CREATE INDEX IF NOT EXISTS idx_anomalies_severity ON cost_anomalies(severity);
 CREATE INDEX IF NOT EXISTS idx_anomalies_cloud ON cost_anomalies(cloud_provider);
+-- Lookup of the open row a re-detected finding refreshes
+CREATE INDEX IF NOT EXISTS idx_anomalies_open_resource ON cost_anomalies(resource_id, anomaly_type) WHERE status = 'open';
+
+-- Resource tags (team, environment, owner, ...); GIN index answers tags @> and tags ? key
+ALTER TABLE cost_anomalies ADD COLUMN IF NOT EXISTS tags JSONB NOT NULL DEFAULT '{}';
+CREATE INDEX IF NOT EXISTS idx_anomalies_tags ON cost_anomalies USING GIN (tags);
 
 -- Stats table for daily aggregates
 CREATE TABLE IF NOT EXISTS daily_stats (
@@ -46,6 +53,102 @@ CREATE TABLE IF NOT EXISTS daily_stats (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Daily spend history per account and service (feeds forecasting)
+CREATE TABLE IF NOT EXISTS daily_costs (
+    usage_date DATE NOT NULL,
+    cloud_provider VARCHAR(10) NOT NULL,
+    account_id VARCHAR(64) NOT NULL DEFAULT '',
+    service VARCHAR(255) NOT NULL,
+    amount DECIMAL(14,4) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (usage_date, cloud_provider, account_id, service)
+);
+
+-- Incremental exports read rows changed after the last export
+CREATE INDEX IF NOT EXISTS idx_daily_costs_updated ON daily_costs(updated_at);
+
+-- Daily spend per cost allocation tag value; untagged spend has tag_value ''
+CREATE TABLE IF NOT EXISTS daily_tag_costs (
+    usage_date DATE NOT NULL,
+    cloud_provider VARCHAR(10) NOT NULL,
+    account_id VARCHAR(64) NOT NULL DEFAULT '',
+    service VARCHAR(255) NOT NULL,
+    tag_key VARCHAR(128) NOT NULL,
+    tag_value VARCHAR(256) NOT NULL DEFAULT '',
+    amount DECIMAL(14,4) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (usage_date, cloud_provider, account_id, service, tag_key, tag_value)
+);
+
+CREATE INDEX IF NOT EXISTS idx_tag_costs_tag ON daily_tag_costs(tag_key, tag_value, usage_date);
+
+-- Hourly on-demand usage per instance family and region (feeds the commitment optimizer)
+CREATE TABLE IF NOT EXISTS hourly_usage (
+    usage_hour TIMESTAMP NOT NULL,
+    cloud_provider VARCHAR(10) NOT NULL,
+    account_id VARCHAR(64) NOT NULL DEFAULT '',
+    region VARCHAR(30) NOT NULL,
+    instance_family VARCHAR(50) NOT NULL,
+    usage_units DECIMAL(14,4) NOT NULL DEFAULT 0,
+    on_demand_cost DECIMAL(14,4) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (usage_hour, cloud_provider, account_id, region, instance_family)
+);
+
+-- Monthly budgets; an empty account_id/service covers all accounts/services
+CREATE TABLE IF NOT EXISTS budgets (
+    id SERIAL PRIMARY KEY,
+    cloud_provider VARCHAR(10) NOT NULL,
+    account_id VARCHAR(64) NOT NULL DEFAULT '',
+    service VARCHAR(255) NOT NULL DEFAULT '',
+    monthly_amount DECIMAL(14,2) NOT NULL,
+    UNIQUE (cloud_provider, account_id, service)
+);
+
+-- Months in which a budget breach was already alerted (one alert per budget per month)
+CREATE TABLE IF NOT EXISTS budget_alerts (
+    budget_id INTEGER NOT NULL REFERENCES budgets(id) ON DELETE CASCADE,
+    month DATE NOT NULL,
+    alerted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (budget_id, month)
+);
+
+-- Sharded detection sweeps (one row per sweep over all accounts/regions)
+CREATE TABLE IF NOT EXISTS detection_sweeps (
+    id SERIAL PRIMARY KEY,
+    cloud_provider VARCHAR(10) NOT NULL,
+    started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP,
+    status VARCHAR(20) NOT NULL DEFAULT 'running',
+    total_units INTEGER NOT NULL DEFAULT 0,
+    CONSTRAINT valid_sweep_status CHECK (status IN ('running', 'completed', 'partial'))
+);
+
+-- Per account/region checkpoint so an interrupted sweep can resume
+CREATE TABLE IF NOT EXISTS sweep_checkpoints (
+    sweep_id INTEGER NOT NULL REFERENCES detection_sweeps(id) ON DELETE CASCADE,
+    account_id VARCHAR(20) NOT NULL,
+    region VARCHAR(30) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    findings_count INTEGER,
+    error TEXT,
+    completed_at TIMESTAMP,
+    PRIMARY KEY (sweep_id, account_id, region),
+    CONSTRAINT valid_checkpoint_status CHECK (status IN ('pending', 'done', 'failed'))
+);
+
+-- Position of each named incremental export (last id / updated_at streamed)
+CREATE TABLE IF NOT EXISTS export_watermarks (
+    name VARCHAR(100) NOT NULL,
+    dataset VARCHAR(50) NOT NULL,
+    last_value TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (name, dataset)
+);
+
+CREATE INDEX IF NOT EXISTS idx_sweeps_running ON detection_sweeps(started_at DESC) WHERE status = 'running';
+
 -- Sample data for testing (optional)
 INSERT INTO cost_anomalies (cloud_provider, resource_id, resource_type, anomaly_type, severity, cost_impact, details)
 VALUES 
@@ -66,6 +169,25 @@ FROM cost_anomalies
 WHERE status = 'open'
 GROUP BY DATE(detected_at), cloud_provider, severity;
 
+-- Anomaly counts per tag, refreshed after every detection run (group_by=tag:<key>)
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_anomaly_tag_rollup AS
+SELECT 
+    DATE(a.detected_at) as detection_date,
+    a.cloud_provider,
+    a.severity,
+    COALESCE(a.status, 'open') as status,
+    a.anomaly_type,
+    t.key as tag_key,
+    t.value as tag_value,
+    COUNT(*) as anomaly_count,
+    SUM(a.cost_impact) as total_impact
+FROM cost_anomalies a, jsonb_each_text(a.tags) t
+GROUP BY 1, 2, 3, 4, 5, 6, 7;
+
+-- Unique index lets REFRESH ... CONCURRENTLY run without blocking readers
+CREATE UNIQUE INDEX IF NOT EXISTS idx_anomaly_tag_rollup ON mv_anomaly_tag_rollup
+    (tag_key, tag_value, detection_date, cloud_provider, severity, status, anomaly_type);
+
 -- Create function to update daily stats
 CREATE OR REPLACE FUNCTION update_daily_stats()
 RETURNS void AS $$
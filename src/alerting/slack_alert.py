@@ -1,14 +1,17 @@
 import requests
 import json
 import os
+import logging
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 def send_slack_alert(finding: dict):
     """Send real-time Slack alert for anomalies"""
     
     webhook_url = os.getenv('SLACK_WEBHOOK_URL')
     if not webhook_url:
-        print("SLACK_WEBHOOK_URL not set, skipping Slack alert")
+        logger.warning("SLACK_WEBHOOK_URL not set, skipping Slack alert")
         return
     
     # Severity colors
@@ -99,6 +102,9 @@ def send_slack_alert(finding: dict):
             headers={'Content-Type': 'application/json'}
         )
         if response.status_code != 200:
-            print(f"Failed to send Slack alert: {response.status_code}")
-    except Exception as e:
-        print(f"Error sending Slack alert: {e}")
+            logger.error("Failed to send Slack alert", extra={
+                'status_code': response.status_code,
+                'resource_id': finding['resource_id']
+            })
+    except Exception:
+        logger.exception("Error sending Slack alert", extra={'resource_id': finding['resource_id']})
@@ -0,0 +1,169 @@
+import json
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+from psycopg2.extras import RealDictCursor
+from src.monitoring.metrics import DB_QUERY_DURATION
+
+# group_by values that map onto a plain column
+ANOMALY_GROUP_COLUMNS = {
+    'cloud': 'cloud_provider',
+    'severity': 'severity',
+    'anomaly_type': 'anomaly_type',
+    'status': 'status'
+}
+COST_GROUP_COLUMNS = {
+    'cloud': 'cloud_provider',
+    'account': 'account_id',
+    'service': 'service',
+    'date': 'usage_date'
+}
+
+
+def parse_group_by(group_by: str, columns: Dict[str, str]) -> Tuple[Optional[str], Optional[str]]:
+    """Split ``group_by`` into ``(column, tag_key)``; exactly one of them is set"""
+    if group_by.startswith('tag:'):
+        tag_key = group_by[4:]
+        if not tag_key:
+            raise ValueError("group_by=tag:<key> needs a tag key")
+        return None, tag_key
+    if group_by not in columns:
+        raise ValueError(f"group_by must be one of {sorted(columns)} or tag:<key>")
+    return columns[group_by], None
+
+
+def parse_tag_filters(tags: Optional[List[str]]) -> Dict[str, str]:
+    """``['team:payments', 'env:prod']`` -> ``{'team': 'payments', 'env': 'prod'}``"""
+    filters = {}
+    for tag in tags or []:
+        key, sep, value = tag.partition(':')
+        if not sep or not key:
+            raise ValueError(f"Tag filter '{tag}' must look like key:value")
+        filters[key] = value
+    return filters
+
+
+def refresh_rollups(conn):
+    """Rebuild the tag rollups without blocking readers"""
+    with DB_QUERY_DURATION.labels(query='refresh_tag_rollups').time(), conn.cursor() as cur:
+        cur.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY mv_anomaly_tag_rollup")
+    conn.commit()
+
+
+def anomaly_groups(conn, group_by: str, tag_filters: Dict[str, str], cloud: Optional[str] = None,
+                   severity: Optional[str] = None, status: Optional[str] = None) -> Dict:
+    """Anomaly count and cost impact per group.
+
+    ``group_by=tag:<key>`` with no filters on other tag keys is answered from
+    ``mv_anomaly_tag_rollup``. Everything else filters the base table through
+    the GIN index on ``tags``; resources without the key are left out.
+    """
+    column, tag_key = parse_group_by(group_by, ANOMALY_GROUP_COLUMNS)
+    use_rollup = tag_key is not None and set(tag_filters) <= {tag_key}
+
+    where, params = [], []
+    for name, value in (('cloud_provider', cloud), ('severity', severity), ('status', status)):
+        if value:
+            where.append(f"{name} = %s")
+            params.append(value)
+
+    if use_rollup:
+        key_expr = "tag_value"
+        where.append("tag_key = %s")
+        params.append(tag_key)
+        if tag_key in tag_filters:
+            where.append("tag_value = %s")
+            params.append(tag_filters[tag_key])
+        query = f"""
+            SELECT {key_expr} as key, SUM(anomaly_count) as anomaly_count, SUM(total_impact) as total_impact
+            FROM mv_anomaly_tag_rollup
+            WHERE {' AND '.join(where)}
+            GROUP BY {key_expr}
+            ORDER BY total_impact DESC
+        """
+    else:
+        if tag_key is not None:
+            key_expr = "tags->>%s"
+            params = [tag_key] + params
+            where.append("tags ? %s")
+            params.append(tag_key)
+        else:
+            key_expr = column
+        if tag_filters:
+            where.append("tags @> %s::jsonb")
+            params.append(json.dumps(tag_filters))
+        query = f"""
+            SELECT {key_expr} as key, COUNT(*) as anomaly_count, SUM(cost_impact) as total_impact
+            FROM cost_anomalies
+            {('WHERE ' + ' AND '.join(where)) if where else ''}
+            GROUP BY 1
+            ORDER BY total_impact DESC
+        """
+
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(query, params)
+        groups = cur.fetchall()
+
+    return {
+        "group_by": group_by,
+        "source": "mv_anomaly_tag_rollup" if use_rollup else "cost_anomalies",
+        "groups": [
+            {"key": g['key'], "anomaly_count": int(g['anomaly_count']), "total_impact": float(g['total_impact'] or 0)}
+            for g in groups
+        ]
+    }
+
+
+def cost_groups(conn, start: date, end: date, group_by: str, tag_filters: Dict[str, str],
+                cloud: Optional[str] = None, account_id: Optional[str] = None,
+                service: Optional[str] = None) -> Dict:
+    """Spend between ``start`` and ``end`` (inclusive) per group.
+
+    Untagged questions read ``daily_costs``; anything involving a tag reads
+    ``daily_tag_costs``, which holds one cost allocation tag key per row, so a
+    query may involve at most one tag key.
+    """
+    column, tag_key = parse_group_by(group_by, COST_GROUP_COLUMNS)
+    keys = set(tag_filters) | ({tag_key} if tag_key else set())
+    if len(keys) > 1:
+        raise ValueError("Cost queries can group or filter by one tag key at a time")
+
+    where = ["usage_date BETWEEN %s AND %s"]
+    params = [start, end]
+    for name, value in (('cloud_provider', cloud), ('account_id', account_id), ('service', service)):
+        if value:
+            where.append(f"{name} = %s")
+            params.append(value)
+
+    if keys:
+        table = "daily_tag_costs"
+        key = keys.pop()
+        where.append("tag_key = %s")
+        params.append(key)
+        if key in tag_filters:
+            where.append("tag_value = %s")
+            params.append(tag_filters[key])
+    else:
+        table = "daily_costs"
+    key_expr = "tag_value" if tag_key else column
+
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(f"""
+            SELECT {key_expr} as key, SUM(amount) as amount
+            FROM {table}
+            WHERE {' AND '.join(where)}
+            GROUP BY 1
+            ORDER BY {'1' if group_by == 'date' else 'amount DESC'}
+        """, params)
+        groups = cur.fetchall()
+
+    amounts = [round(float(g['amount']), 2) for g in groups]
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "group_by": group_by,
+        "total": round(sum(amounts), 2),
+        "groups": [
+            {"key": g['key'].isoformat() if group_by == 'date' else g['key'], "amount": amount}
+            for g, amount in zip(groups, amounts)
+        ]
+    }
@@ -0,0 +1,250 @@
+import os
+import sys
+import json
+import argparse
+from typing import Dict, List, Optional
+import numpy as np
+from psycopg2.extras import RealDictCursor
+from .forecast import load_cost_history
+
+# Days in the trailing mean the spike rule compares against (includes the day itself)
+SPIKE_WINDOW_DAYS = 7
+
+# Statuses a human set on a finding; auto-reconciled rows are not labels
+TRUE_POSITIVE, FALSE_POSITIVE = 'resolved', 'false_positive'
+LABEL_SQL = f"""
+    CASE WHEN status = '{FALSE_POSITIVE}' THEN 0
+         WHEN status = '{TRUE_POSITIVE}' AND COALESCE(resolved_by, '') <> 'auto-reconciler' THEN 1
+    END
+"""
+
+
+def load_account_totals(conn, days: int, cloud: Optional[str] = None):
+    """Daily spend per (cloud, account) as a dense (account x day) matrix"""
+    keys, dates, costs = load_cost_history(conn, days, cloud)
+    accounts = sorted({(c, a) for c, a, _ in keys})
+    account_index = {k: i for i, k in enumerate(accounts)}
+    totals = np.zeros((len(accounts), len(dates)))
+    np.add.at(totals, np.array([account_index[(c, a)] for c, a, _ in keys], dtype=np.int64), costs)
+    return accounts, dates, totals
+
+
+def load_spike_labels(conn, accounts: List, dates: np.ndarray, days: int) -> np.ndarray:
+    """(account x day) labels: 1 true positive, 0 false positive, NaN unlabelled"""
+    labels = np.full((len(accounts), len(dates)), np.nan)
+    if not len(dates):
+        return labels
+    account_index = {k: i for i, k in enumerate(accounts)}
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(f"""
+            SELECT cloud_provider, COALESCE(details->>'account_id', '') as account_id,
+                   (details->>'date')::date as spike_date, MAX({LABEL_SQL}) as label
+            FROM cost_anomalies
+            WHERE anomaly_type = 'cost_spike'
+              AND detected_at >= CURRENT_DATE - %s
+              AND details ? 'date'
+            GROUP BY 1, 2, 3
+        """, (days,))
+        rows = cur.fetchall()
+    for row in rows:
+        i = account_index.get((row['cloud_provider'], row['account_id']))
+        d = int((np.datetime64(row['spike_date'], 'D') - dates[0]).astype(np.int64))
+        if i is not None and 0 <= d < len(dates) and row['label'] is not None:
+            labels[i, d] = row['label']
+    return labels
+
+
+def spike_signal(totals: np.ndarray):
+    """Per (account, day): spend, ratio to the trailing mean and whether the
+    rule could have run (a full window of history before the day)"""
+    csum = np.cumsum(totals, axis=1)
+    window = csum.copy()
+    window[:, SPIKE_WINDOW_DAYS:] -= csum[:, :-SPIKE_WINDOW_DAYS]
+    mean = window / SPIKE_WINDOW_DAYS
+
+    # The detector needs more than SPIKE_WINDOW_DAYS days of history
+    has_data = np.cumsum(totals > 0, axis=1) > 0
+    history = np.cumsum(has_data, axis=1)
+    valid = (history > SPIKE_WINDOW_DAYS) & (mean > 0)
+    ratio = np.divide(totals, mean, out=np.zeros_like(totals), where=mean > 0)
+    return totals, ratio, valid
+
+
+def _precision(tp, fp):
+    labelled = tp + fp
+    return np.where(labelled > 0, tp / np.maximum(labelled, 1), np.nan)
+
+
+def backtest_spikes(totals: np.ndarray, labels: np.ndarray, multipliers, critical_thresholds,
+                    high_thresholds) -> List[Dict]:
+    """Alert volume and precision of the spike rule for every setting in the grid.
+
+    The critical/high/medium split reproduces
+    ``src.detectors.base_detector.spike_severity``. All (multiplier,
+    critical, high) combinations are scored in one pass:
+    an (M x N) alert mask over every account-day is multiplied by an
+    (N x T) matrix of spend-above-threshold indicators.
+    """
+    multipliers = np.asarray(multipliers, dtype=float)
+    critical_thresholds = np.asarray(critical_thresholds, dtype=float)
+    high_thresholds = np.asarray(high_thresholds, dtype=float)
+    n_days = totals.shape[1] if totals.ndim == 2 else 0
+
+    spend, ratio, valid = spike_signal(totals)
+    spend, ratio, labels = spend[valid], ratio[valid], labels[valid]
+    positive = (labels == 1).astype(np.float32)
+    negative = (labels == 0).astype(np.float32)
+
+    alerts = (ratio[None, :] > multipliers[:, None]).astype(np.float32)          # (M, N)
+    thresholds = np.union1d(critical_thresholds, high_thresholds)
+    above = (spend[:, None] > thresholds[None, :]).astype(np.float32)          # (N, T)
+    alert_above = alerts @ above                                                # (M, T)
+    tp_above = (alerts * positive) @ above
+    fp_above = (alerts * negative) @ above
+
+    total = alerts.sum(axis=1)
+    tp = (alerts * positive).sum(axis=1)
+    fp = (alerts * negative).sum(axis=1)
+    positives = positive.sum()
+
+    c_idx = np.searchsorted(thresholds, critical_thresholds)
+    h_idx = np.searchsorted(thresholds, high_thresholds)
+    # Critical and high alerts together are everything above the lower threshold
+    page_idx = np.minimum(c_idx[:, None], h_idx[None, :])                      # (C, H)
+
+    critical = alert_above[:, c_idx][:, :, None]                               # (M, C, 1)
+    paging = alert_above[:, page_idx]                                          # (M, C, H)
+    paging_precision = _precision(tp_above[:, page_idx], fp_above[:, page_idx])
+    precision = _precision(tp, fp)
+    months = max(n_days / 30.0, 1e-9)
+
+    results = []
+    for m, multiplier in enumerate(multipliers):
+        for c, critical_threshold in enumerate(critical_thresholds):
+            for h, high_threshold in enumerate(high_thresholds):
+                results.append({
+                    'spike_multiplier': float(multiplier),
+                    'critical_threshold': float(critical_threshold),
+                    'high_threshold': float(high_threshold),
+                    'alerts': int(total[m]),
+                    'alerts_per_month': round(float(total[m]) / months, 1),
+                    'critical': int(critical[m, c, 0]),
+                    'high': int(paging[m, c, h] - critical[m, c, 0]),
+                    'medium': int(total[m] - paging[m, c, h]),
+                    'labelled': int(tp[m] + fp[m]),
+                    'precision': None if np.isnan(precision[m]) else round(float(precision[m]), 3),
+                    'recall': round(float(tp[m] / positives), 3) if positives else None,
+                    'paging_precision': (None if np.isnan(paging_precision[m, c, h])
+                                         else round(float(paging_precision[m, c, h]), 3))
+                })
+    return results
+
+
+def load_idle_findings(conn, days: int, resource_type: str):
+    """p99 CPU and label of every idle finding of ``resource_type`` in the window"""
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT COALESCE(details->>'cpu_p99', details->>'average_cpu')::float, {LABEL_SQL}
+            FROM cost_anomalies
+            WHERE anomaly_type = 'idle_resource' AND resource_type = %s
+              AND detected_at >= CURRENT_DATE - %s
+              AND COALESCE(details->>'cpu_p99', details->>'average_cpu') IS NOT NULL
+        """, (resource_type, days))
+        rows = cur.fetchall()
+    cpu = np.array([r[0] for r in rows], dtype=float)
+    labels = np.array([np.nan if r[1] is None else r[1] for r in rows], dtype=float)
+    return cpu, labels
+
+
+def backtest_cpu_cutoffs(cpu: np.ndarray, labels: np.ndarray, cutoffs, days: int) -> List[Dict]:
+    """Volume and precision of the idle rule at each p99 CPU cutoff.
+
+    Only stored findings can be re-scored, so cutoffs above the one in force
+    when they were raised cannot show the extra alerts they would add.
+    """
+    cutoffs = np.asarray(cutoffs, dtype=float)
+    kept = cpu[None, :] < cutoffs[:, None]                                      # (K, N)
+    tp = (kept & (labels == 1)).sum(axis=1)
+    fp = (kept & (labels == 0)).sum(axis=1)
+    positives = (labels == 1).sum()
+    precision = _precision(tp, fp)
+    return [{
+        'cpu_p99_cutoff': float(cutoff),
+        'alerts': int(kept[k].sum()),
+        'alerts_per_month': round(float(kept[k].sum()) * 30.0 / days, 1),
+        'labelled': int(tp[k] + fp[k]),
+        'precision': None if np.isnan(precision[k]) else round(float(precision[k]), 3),
+        'recall': round(float(tp[k] / positives), 3) if positives else None
+    } for k, cutoff in enumerate(cutoffs)]
+
+
+def run_backtest(conn, days: int, multipliers, critical_thresholds, high_thresholds,
+                 cpu_cutoffs, cloud: Optional[str] = None) -> Dict:
+    accounts, dates, totals = load_account_totals(conn, days, cloud)
+    labels = load_spike_labels(conn, accounts, dates, days)
+    result = {
+        'days': days,
+        'accounts': len(accounts),
+        'cost_spikes': backtest_spikes(totals, labels, multipliers, critical_thresholds, high_thresholds),
+        'idle_cpu': {}
+    }
+    for resource_type in ('ec2', 'rds'):
+        cpu, cpu_labels = load_idle_findings(conn, days, resource_type)
+        result['idle_cpu'][resource_type] = backtest_cpu_cutoffs(cpu, cpu_labels, cpu_cutoffs, days)
+    return result
+
+
+def _floats(value: str) -> List[float]:
+    return [float(v) for v in value.split(',') if v.strip()]
+
+
+def _print_table(rows: List[Dict]):
+    if not rows:
+        print("  (no data)")
+        return
+    columns = list(rows[0])
+    widths = [max(len(c), *(len(str(r[c])) for r in rows)) for c in columns]
+    print("  " + "  ".join(c.rjust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  " + "  ".join(str(row[c]).rjust(w) for c, w in zip(columns, widths)))
+
+
+def main():
+    import psycopg2
+
+    parser = argparse.ArgumentParser(description="Score detection threshold settings against stored history")
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--cloud', default=None)
+    parser.add_argument('--multipliers', type=_floats, default=[1.2, 1.3, 1.5, 1.75, 2.0, 2.5])
+    parser.add_argument('--critical', type=_floats, default=[500, 1000, 2000, 5000])
+    parser.add_argument('--high', type=_floats, default=[0, 100, 250, 500, 1000])
+    parser.add_argument('--cpu-cutoffs', type=_floats, default=[1, 2, 5, 10, 15])
+    parser.add_argument('--json', action='store_true', help="Print the full result as JSON")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(
+        dbname=os.getenv('DB_NAME', 'cloud_cost'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', 'postgres'),
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432')
+    )
+    try:
+        result = run_backtest(conn, args.days, args.multipliers, args.critical, args.high,
+                              args.cpu_cutoffs, args.cloud)
+    finally:
+        conn.close()
+
+    if args.json:
+        json.dump(result, sys.stdout, indent=2)
+        return
+
+    print(f"Cost spikes ({result['accounts']} accounts, {result['days']} days)")
+    _print_table(result['cost_spikes'])
+    for resource_type, rows in result['idle_cpu'].items():
+        print(f"\nIdle {resource_type} p99 CPU cutoff")
+        _print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
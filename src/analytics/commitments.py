@@ -0,0 +1,175 @@
+import os
+from typing import Dict, Optional
+import numpy as np
+
+HOURS_PER_MONTH = 730
+
+# Usage drop applied when estimating how fragile a recommendation is
+STRESS_USAGE_DROP = 0.2
+
+
+def load_hourly_usage(conn, days: int = 365, cloud: Optional[str] = None):
+    """Load stored hourly usage as dense (family/region x hour) matrices.
+
+    Returns ``(keys, hours, usage, cost)``: ``keys[i]`` is the
+    ``(cloud_provider, region, instance_family)`` of row ``i``, ``usage``
+    holds normalized units and ``cost`` the on-demand spend per hour.
+    Hours with no stored row are zero usage.
+    """
+    where = "usage_hour >= NOW() - make_interval(days => %s)"
+    params = [days]
+    if cloud:
+        where += " AND cloud_provider = %s"
+        params.append(cloud)
+
+    # One row per key with its hours (since the epoch) and values as float8
+    # arrays, so millions of hourly rows never become Python dicts
+    query = f"""
+        SELECT cloud_provider, region, instance_family,
+               array_agg(hour ORDER BY hour),
+               array_agg(usage_units ORDER BY hour),
+               array_agg(on_demand_cost ORDER BY hour)
+        FROM (
+            SELECT cloud_provider, region, instance_family,
+                   (EXTRACT(EPOCH FROM usage_hour) / 3600)::bigint AS hour,
+                   SUM(usage_units)::float8 AS usage_units,
+                   SUM(on_demand_cost)::float8 AS on_demand_cost
+            FROM hourly_usage
+            WHERE {where}
+            GROUP BY cloud_provider, region, instance_family, hour
+        ) per_hour
+        GROUP BY cloud_provider, region, instance_family
+        ORDER BY cloud_provider, region, instance_family
+    """
+
+    with conn.cursor() as cur:
+        cur.execute(query, params)
+        rows = cur.fetchall()
+
+    if not rows:
+        empty = np.zeros((0, 0))
+        return [], np.array([], dtype='datetime64[h]'), empty, empty
+
+    keys = [tuple(r[:3]) for r in rows]
+    counts = np.fromiter((len(r[3]) for r in rows), dtype=np.int64, count=len(rows))
+    stamps = np.concatenate([np.asarray(r[3], dtype=np.int64) for r in rows])
+    start = stamps.min()
+    hours = np.arange(start, stamps.max() + 1).astype('datetime64[h]')
+
+    # Hours are unique per key after the GROUP BY, so plain assignment is enough
+    rows_idx = np.repeat(np.arange(len(rows)), counts)
+    cols_idx = stamps - start
+    usage = np.zeros((len(keys), len(hours)))
+    cost = np.zeros((len(keys), len(hours)))
+    usage[rows_idx, cols_idx] = np.concatenate([np.asarray(r[4], dtype=np.float64) for r in rows])
+    cost[rows_idx, cols_idx] = np.concatenate([np.asarray(r[5], dtype=np.float64) for r in rows])
+    return keys, hours, usage, cost
+
+
+def optimal_commitments(usage: np.ndarray, on_demand_rate: np.ndarray, discount: float) -> Dict[str, np.ndarray]:
+    """Savings-maximizing hourly commitment for every row of ``usage`` at once.
+
+    Each row is sorted into a load duration curve L (descending). Committing
+    to level L[j] covers min(u, L[j]) every hour, so the covered total is
+    (j + 1) * L[j] + sum(L[j + 1:]), read off a suffix cumsum. Net savings
+    at every candidate level is therefore O(1) after an O(H log H) sort,
+    and the best level is one argmax per row.
+    """
+    n_rows, n_hours = usage.shape
+    curve = -np.sort(-usage, axis=1)
+    suffix = np.concatenate([np.cumsum(curve[:, ::-1], axis=1)[:, ::-1][:, 1:], np.zeros((n_rows, 1))], axis=1)
+    ranks = np.arange(1, n_hours + 1)
+    covered = ranks * curve + suffix
+
+    rate = on_demand_rate[:, None]
+    committed_rate = rate * (1 - discount)
+    savings = rate * covered - committed_rate * curve * n_hours
+
+    best = savings.argmax(axis=1)
+    rows = np.arange(n_rows)
+    level = curve[rows, best]
+    best_savings = np.maximum(savings[rows, best], 0)
+    # Never commit when no level saves money
+    level = np.where(best_savings > 0, level, 0.0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        utilization = np.where(level > 0, np.minimum(usage, level[:, None]).sum(axis=1) / (level * n_hours), 0.0)
+    underutilized_hours = np.where(level > 0, (usage < level[:, None]).mean(axis=1), 0.0)
+
+    stressed = usage * (1 - STRESS_USAGE_DROP)
+    stressed_savings = (
+        rate[:, 0] * np.minimum(stressed, level[:, None]).sum(axis=1)
+        - committed_rate[:, 0] * level * n_hours
+    )
+
+    return {
+        'commitment_level': level,
+        'utilization': utilization,
+        'underutilized_hour_share': underutilized_hours,
+        'savings': best_savings,
+        'stressed_savings': np.where(level > 0, stressed_savings, 0.0),
+        'on_demand_cost': rate[:, 0] * usage.sum(axis=1)
+    }
+
+
+def _scale_to_month(value: float, n_hours: int) -> float:
+    return round(float(value) * HOURS_PER_MONTH / max(n_hours, 1), 2)
+
+
+def analyze_commitments(conn, days: int = 365, discount: float = None, cloud: Optional[str] = None) -> Dict:
+    """Reserved Instance recommendations per family/region and a Savings Plan
+    recommendation over total hourly on-demand spend"""
+    discount = discount if discount is not None else float(os.getenv('COMMITMENT_DISCOUNT', '0.3'))
+    keys, hours, usage, cost = load_hourly_usage(conn, days, cloud)
+    if not keys:
+        return {'hours_analyzed': 0, 'reserved_instances': [], 'savings_plan': None}
+
+    n_hours = len(hours)
+    total_usage = usage.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = np.where(total_usage > 0, cost.sum(axis=1) / total_usage, 0.0)
+
+    ri = optimal_commitments(usage, rate, discount)
+    # A Savings Plan covers dollars of on-demand spend per hour across all
+    # families, so it is the same problem over the summed cost series; the
+    # level found is on-demand equivalent, the commitment is that at discount
+    sp = optimal_commitments(cost.sum(axis=0, keepdims=True), np.ones(1), discount)
+
+    reserved = []
+    for i in np.argsort(-ri['savings']):
+        if ri['commitment_level'][i] <= 0:
+            continue
+        cloud_provider, region, family = keys[i]
+        reserved.append({
+            'cloud_provider': cloud_provider,
+            'region': region,
+            'instance_family': family,
+            'commit_units_per_hour': round(float(ri['commitment_level'][i]), 3),
+            'on_demand_rate_per_unit': round(float(rate[i]), 5),
+            'monthly_on_demand_cost': _scale_to_month(ri['on_demand_cost'][i], n_hours),
+            'monthly_net_savings': _scale_to_month(ri['savings'][i], n_hours),
+            'expected_utilization': round(float(ri['utilization'][i]), 4),
+            'break_even_utilization': round(1 - discount, 4),
+            'underutilized_hour_share': round(float(ri['underutilized_hour_share'][i]), 4),
+            'monthly_net_savings_if_usage_drops_20pct': _scale_to_month(ri['stressed_savings'][i], n_hours)
+        })
+
+    savings_plan = {
+        'commit_dollars_per_hour': round(float(sp['commitment_level'][0]) * (1 - discount), 2),
+        'covered_on_demand_dollars_per_hour': round(float(sp['commitment_level'][0]), 2),
+        'monthly_on_demand_cost': _scale_to_month(sp['on_demand_cost'][0], n_hours),
+        'monthly_net_savings': _scale_to_month(sp['savings'][0], n_hours),
+        'expected_utilization': round(float(sp['utilization'][0]), 4),
+        'break_even_utilization': round(1 - discount, 4),
+        'underutilized_hour_share': round(float(sp['underutilized_hour_share'][0]), 4),
+        'monthly_net_savings_if_usage_drops_20pct': _scale_to_month(sp['stressed_savings'][0], n_hours)
+    }
+
+    return {
+        'hours_analyzed': n_hours,
+        'from': str(hours[0]),
+        'to': str(hours[-1]),
+        'discount': discount,
+        'reserved_instances': reserved,
+        'savings_plan': savings_plan
+    }
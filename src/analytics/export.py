@@ -0,0 +1,315 @@
+import io
+import os
+import csv
+import sys
+import json
+import argparse
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Column kinds drive the per-format conversion of database values
+INT, FLOAT, STR, JSON, TIMESTAMP, DATE = 'int', 'float', 'str', 'json', 'timestamp', 'date'
+
+# Exportable tables. ``key`` orders incremental exports: rows with a key
+# greater than the stored watermark are new since the last export. With
+# ``settle_column``, incremental exports skip rows written in the last
+# EXPORT_SETTLE_SECONDS (measured against ``settle_clock``): keys are
+# assigned before their transaction commits, so concurrent writers (sharded
+# workers, slow upserts) can commit a row below a watermark already stored.
+# Anomaly exports are insert-only: status changes and save_finding
+# refreshes update rows in place and never reach an incremental export.
+DATASETS = {
+    'anomalies': {
+        'table': 'cost_anomalies',
+        'time_column': 'detected_at',
+        'key': ('id', 'bigint'),
+        # save_finding stamps detected_at in UTC
+        'settle_column': 'detected_at',
+        'settle_clock': "(NOW() AT TIME ZONE 'UTC')",
+        'columns': [
+            ('id', INT), ('cloud_provider', STR), ('resource_id', STR), ('resource_type', STR),
+            ('anomaly_type', STR), ('detected_at', TIMESTAMP), ('cost_impact', FLOAT),
+            ('severity', STR), ('details', JSON), ('tags', JSON), ('status', STR),
+            ('resolved_at', TIMESTAMP), ('resolved_by', STR)
+        ],
+        'filters': ('cloud_provider', 'severity', 'status', 'anomaly_type', 'resource_type'),
+        'tags': True
+    },
+    'daily_costs': {
+        'table': 'daily_costs',
+        'time_column': 'usage_date',
+        'key': ('updated_at', 'timestamp'),
+        'settle_column': 'updated_at',
+        'columns': [
+            ('usage_date', DATE), ('cloud_provider', STR), ('account_id', STR), ('service', STR),
+            ('amount', FLOAT), ('updated_at', TIMESTAMP)
+        ],
+        'filters': ('cloud_provider', 'account_id', 'service'),
+        'tags': False
+    }
+}
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+DEFAULT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '10000'))
+SETTLE_SECONDS = int(os.getenv('EXPORT_SETTLE_SECONDS', '300'))
+
+
+def _build_query(spec: Dict, start: Optional[datetime], end: Optional[datetime],
+                 filters: Dict[str, str], tag_filters: Dict[str, str], since: Optional[str],
+                 incremental: bool = False) -> Tuple[str, List]:
+    unknown = set(filters) - set(spec['filters'])
+    if unknown:
+        raise ValueError(f"Unsupported filters for {spec['table']}: {sorted(unknown)}")
+    if tag_filters and not spec['tags']:
+        raise ValueError(f"{spec['table']} has no tags to filter on")
+
+    where, params = [], []
+    if start:
+        where.append(f"{spec['time_column']} >= %s")
+        params.append(start)
+    if end:
+        where.append(f"{spec['time_column']} < %s")
+        params.append(end)
+    for column, value in sorted(filters.items()):
+        where.append(f"{column} = %s")
+        params.append(value)
+    if tag_filters:
+        where.append("tags @> %s::jsonb")
+        params.append(json.dumps(tag_filters))
+
+    key_column, key_type = spec['key']
+    if since is not None:
+        where.append(f"{key_column} > %s::{key_type}")
+        params.append(since)
+    if (incremental or since is not None) and spec.get('settle_column'):
+        clock = spec.get('settle_clock', 'LOCALTIMESTAMP')
+        where.append(f"{spec['settle_column']} < {clock} - %s * INTERVAL '1 second'")
+        params.append(SETTLE_SECONDS)
+
+    query = f"SELECT {', '.join(name for name, _ in spec['columns'])} FROM {spec['table']}"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    # Keyset order makes the watermark the last row streamed
+    query += f" ORDER BY {key_column}"
+    return query, params
+
+
+def load_watermark(conn, name: str, dataset: str) -> Optional[str]:
+    """Last exported key for a named incremental export, or None on first run"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT last_value FROM export_watermarks
+            WHERE name = %s AND dataset = %s
+        """, (name, dataset))
+        row = cur.fetchone()
+    conn.commit()
+    return row[0] if row else None
+
+
+def save_watermark(conn, name: str, dataset: str, value: str):
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO export_watermarks (name, dataset, last_value)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (name, dataset)
+            DO UPDATE SET last_value = EXCLUDED.last_value, updated_at = CURRENT_TIMESTAMP
+        """, (name, dataset, value))
+    conn.commit()
+
+
+def _read_chunks(conn, query: str, params: List, chunk_size: int) -> Iterator[List[tuple]]:
+    """Rows from a server-side cursor, ``chunk_size`` at a time"""
+    with conn.cursor(name=f"export_{os.getpid()}_{id(query)}") as cur:
+        cur.itersize = chunk_size
+        cur.execute(query, params)
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    conn.commit()
+
+
+def _jsonable(kind: str):
+    if kind == FLOAT:
+        return lambda v: None if v is None else float(v)
+    if kind in (TIMESTAMP, DATE):
+        return lambda v: None if v is None else v.isoformat()
+    return None
+
+
+def _encode_ndjson(columns, chunks) -> Iterator[bytes]:
+    names = [name for name, _ in columns]
+    converters = [(i, _jsonable(kind)) for i, (_, kind) in enumerate(columns) if _jsonable(kind)]
+    for rows in chunks:
+        lines = []
+        for row in rows:
+            row = list(row)
+            for i, convert in converters:
+                row[i] = convert(row[i])
+            lines.append(json.dumps(dict(zip(names, row))))
+        yield ("\n".join(lines) + "\n").encode()
+
+
+def _encode_csv(columns, chunks) -> Iterator[bytes]:
+    json_columns = [i for i, (_, kind) in enumerate(columns) if kind == JSON]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in columns])
+    for rows in chunks:
+        for row in rows:
+            if json_columns:
+                row = list(row)
+                for i in json_columns:
+                    row[i] = None if row[i] is None else json.dumps(row[i])
+            writer.writerow(row)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only stream that hands back whatever was written since the last drain"""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def _encode_parquet(columns, chunks) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow_types = {
+        INT: pa.int64(), FLOAT: pa.float64(), STR: pa.string(), JSON: pa.string(),
+        TIMESTAMP: pa.timestamp('us'), DATE: pa.date32()
+    }
+    schema = pa.schema([(name, arrow_types[kind]) for name, kind in columns])
+    sink = _ChunkSink()
+    # One row group per chunk, flushed to the client as soon as it is written
+    with pq.ParquetWriter(sink, schema, compression='zstd') as writer:
+        for rows in chunks:
+            arrays = []
+            for i, (_, kind) in enumerate(columns):
+                values = [row[i] for row in rows]
+                if kind == FLOAT:
+                    values = [None if v is None else float(v) for v in values]
+                elif kind == JSON:
+                    values = [None if v is None else json.dumps(v) for v in values]
+                arrays.append(pa.array(values, type=schema.field(i).type))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+ENCODERS = {'ndjson': _encode_ndjson, 'csv': _encode_csv, 'parquet': _encode_parquet}
+
+
+def prepare_export(conn, dataset: str, fmt: str = 'ndjson', start: Optional[datetime] = None,
+                   end: Optional[datetime] = None, filters: Optional[Dict[str, str]] = None,
+                   tag_filters: Optional[Dict[str, str]] = None, since: Optional[str] = None,
+                   watermark: Optional[str] = None, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+    """Validate an export and return an iterator of encoded bytes.
+
+    Rows are read through a server-side cursor and encoded one chunk at a
+    time, so memory stays bounded by ``chunk_size`` whatever the row count.
+    With ``watermark``, only rows after the last run of that named export
+    are read, and the watermark moves forward once the stream completes.
+    """
+    if dataset not in DATASETS:
+        raise ValueError(f"dataset must be one of {sorted(DATASETS)}")
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {sorted(FORMATS)}")
+    if fmt == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError("Parquet export needs pyarrow installed")
+
+    spec = DATASETS[dataset]
+    if watermark and since is None:
+        since = load_watermark(conn, watermark, dataset)
+    query, params = _build_query(spec, start, end, filters or {}, tag_filters or {}, since, bool(watermark))
+    key_index = [name for name, _ in spec['columns']].index(spec['key'][0])
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+
+    def stream():
+        last_key = None
+
+        def chunks():
+            nonlocal last_key
+            for rows in _read_chunks(conn, query, params, chunk_size):
+                last_key = rows[-1][key_index]
+                yield rows
+
+        yield from ENCODERS[fmt](spec['columns'], chunks())
+        if watermark and last_key is not None:
+            save_watermark(conn, watermark, dataset, str(last_key))
+
+    return stream()
+
+
+def main():
+    from src.analytics.allocation import parse_tag_filters
+    import psycopg2
+
+    parser = argparse.ArgumentParser(description="Stream anomalies or cost history to a file")
+    parser.add_argument('dataset', choices=sorted(DATASETS))
+    parser.add_argument('--format', choices=sorted(FORMATS), default='ndjson')
+    parser.add_argument('--output', '-o', help="Output file (default: stdout)")
+    parser.add_argument('--start', type=datetime.fromisoformat, help="Inclusive lower bound on the time column")
+    parser.add_argument('--end', type=datetime.fromisoformat, help="Exclusive upper bound on the time column")
+    parser.add_argument('--filter', action='append', default=[], help="column=value, repeatable")
+    parser.add_argument('--tag', action='append', help="key:value, repeatable (anomalies only)")
+    parser.add_argument('--since', help="Only rows whose key (id / updated_at) is greater than this")
+    parser.add_argument('--watermark', help="Name of an incremental export whose position is stored in the DB")
+    parser.add_argument('--chunk-size', type=int, default=None)
+    args = parser.parse_args()
+
+    filters = dict(f.split('=', 1) for f in args.filter)
+    conn = psycopg2.connect(
+        dbname=os.getenv('DB_NAME', 'cloud_cost'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', 'postgres'),
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432')
+    )
+    try:
+        stream = prepare_export(conn, args.dataset, args.format, args.start, args.end, filters,
+                                parse_tag_filters(args.tag), args.since, args.watermark, args.chunk_size)
+        out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            for data in stream:
+                out.write(data)
+        finally:
+            if args.output:
+                out.close()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+from statistics import NormalDist
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from psycopg2.extras import RealDictCursor
+
+# Trend + weekly seasonality needs at least two full weeks to be meaningful
+MIN_HISTORY_DAYS = 14
+
+
+def load_cost_history(conn, history_days: int = 90, cloud: Optional[str] = None,
+                      account_id: Optional[str] = None, service: Optional[str] = None):
+    """Load stored daily costs as a dense (series x day) matrix.
+
+    Returns ``(keys, dates, costs)`` where ``keys[i]`` is the
+    ``(cloud_provider, account_id, service)`` tuple of row ``i`` and
+    ``dates`` is a contiguous ``datetime64[D]`` range. Days with no stored
+    cost are treated as zero spend.
+    """
+    query = """
+        SELECT cloud_provider, account_id, service, usage_date, amount
+        FROM daily_costs
+        WHERE usage_date >= CURRENT_DATE - %s
+    """
+    params = [history_days]
+    if cloud:
+        query += " AND cloud_provider = %s"
+        params.append(cloud)
+    if account_id:
+        query += " AND account_id = %s"
+        params.append(account_id)
+    if service:
+        query += " AND service = %s"
+        params.append(service)
+
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(query, params)
+        rows = cur.fetchall()
+
+    if not rows:
+        return [], np.array([], dtype='datetime64[D]'), np.zeros((0, 0))
+
+    series_keys = [(r['cloud_provider'], r['account_id'], r['service']) for r in rows]
+    keys = sorted(set(series_keys))
+    key_index = {k: i for i, k in enumerate(keys)}
+
+    days = np.array([r['usage_date'] for r in rows], dtype='datetime64[D]')
+    start = days.min()
+    dates = np.arange(start, days.max() + 1)
+
+    costs = np.zeros((len(keys), len(dates)))
+    rows_idx = np.fromiter((key_index[k] for k in series_keys), dtype=np.int64, count=len(rows))
+    cols_idx = (days - start).astype(np.int64)
+    np.add.at(costs, (rows_idx, cols_idx), np.array([float(r['amount']) for r in rows]))
+    return keys, dates, costs
+
+
+def _design_matrix(dates: np.ndarray, origin: np.datetime64) -> np.ndarray:
+    """Intercept, linear trend (in weeks) and day-of-week dummies (Monday is the baseline)"""
+    offset = (dates - origin).astype(np.float64)
+    weekday = (dates.astype('datetime64[D]').view('int64') - 4) % 7  # 1970-01-01 was a Thursday
+    dummies = (weekday[:, None] == np.arange(1, 7)[None, :]).astype(np.float64)
+    return np.column_stack([np.ones(len(dates)), offset / 7.0, dummies])
+
+
+def forecast_month_end(dates: np.ndarray, costs: np.ndarray, confidence: float = 0.95,
+                       month: Optional[np.datetime64] = None) -> Dict[str, np.ndarray]:
+    """Fit trend + weekly seasonality to every row of ``costs`` at once.
+
+    All series share the same design matrix, so a single least-squares solve
+    fits the whole batch. Returns month-to-date spend, the projected
+    month-end total and its confidence interval, one entry per series, for
+    ``month`` (default: the month of the last stored day).
+    """
+    n_series, n_days = costs.shape
+    last_day = dates[-1]
+    month = last_day.astype('datetime64[M]') if month is None else np.datetime64(month, 'M')
+    month_start = month.astype('datetime64[D]')
+    month_end = (month + 1).astype('datetime64[D]') - 1
+
+    month_to_date = costs[:, (dates >= month_start) & (dates <= month_end)].sum(axis=1)
+    future = np.arange(max(last_day + 1, month_start), month_end + 1)
+
+    if n_days < MIN_HISTORY_DAYS:
+        # Not enough history for a trend; extrapolate the recent daily mean
+        daily_mean = costs.mean(axis=1)
+        projection = month_to_date + daily_mean * len(future)
+        return {
+            'month_to_date': month_to_date,
+            'projected': projection,
+            'lower': projection.copy(),
+            'upper': projection.copy(),
+            'remaining_days': len(future)
+        }
+
+    X = _design_matrix(dates, dates[0])
+    beta, _, rank, _ = np.linalg.lstsq(X, costs.T, rcond=None)  # (p, n_series)
+
+    residuals = costs.T - X @ beta
+    dof = max(n_days - rank, 1)
+    sigma2 = (residuals ** 2).sum(axis=0) / dof
+
+    if len(future):
+        X_future = _design_matrix(future, dates[0])
+        remaining = np.clip(X_future @ beta, 0, None).sum(axis=0)
+        # Variance of a sum of future observations: noise on each day plus
+        # uncertainty in the fitted coefficients. The coefficient term only
+        # depends on the shared design, so it is a single scalar.
+        s = X_future.sum(axis=0)
+        param_term = s @ np.linalg.pinv(X.T @ X) @ s
+        std = np.sqrt(sigma2 * (len(future) + param_term))
+    else:
+        remaining = np.zeros(n_series)
+        std = np.zeros(n_series)
+
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    projection = month_to_date + remaining
+    return {
+        'month_to_date': month_to_date,
+        'projected': projection,
+        'lower': np.maximum(projection - z * std, month_to_date),
+        'upper': projection + z * std,
+        'remaining_days': len(future)
+    }
+
+
+def load_budgets(conn) -> List[Dict]:
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("SELECT id, cloud_provider, account_id, service, monthly_amount FROM budgets")
+        return cur.fetchall()
+
+
+def budget_membership(keys: List[Tuple[str, str, str]], budgets: List[Dict]) -> np.ndarray:
+    """(budget x series) 0/1 matrix; empty account/service on a budget matches all"""
+    membership = np.zeros((len(budgets), len(keys)))
+    for b, budget in enumerate(budgets):
+        for s, (cloud, account_id, service) in enumerate(keys):
+            if (budget['cloud_provider'] == cloud
+                    and budget['account_id'] in ('', account_id)
+                    and budget['service'] in ('', service)):
+                membership[b, s] = 1.0
+    return membership
+
+
+def forecast_budgets(dates: np.ndarray, costs: np.ndarray, keys: List[Tuple[str, str, str]],
+                     budgets: List[Dict], confidence: float = 0.95,
+                     month: Optional[np.datetime64] = None) -> List[Dict]:
+    """Project each budget's scope to the end of ``month`` and flag predicted breaches"""
+    if not budgets or costs.size == 0:
+        return []
+
+    # Aggregate each budget's scope first and forecast the aggregate series,
+    # so the interval reflects the combined spend rather than summed errors
+    aggregated = budget_membership(keys, budgets) @ costs
+    result = forecast_month_end(dates, aggregated, confidence, month)
+
+    statuses = []
+    for i, budget in enumerate(budgets):
+        amount = float(budget['monthly_amount'])
+        projected = float(result['projected'][i])
+        statuses.append({
+            'budget_id': budget['id'],
+            'cloud_provider': budget['cloud_provider'],
+            'account_id': budget['account_id'],
+            'service': budget['service'],
+            'budget': amount,
+            'month_to_date': round(float(result['month_to_date'][i]), 2),
+            'projected_month_end': round(projected, 2),
+            'lower': round(float(result['lower'][i]), 2),
+            'upper': round(float(result['upper'][i]), 2),
+            'breach_predicted': projected > amount,
+            'breach_certain': float(result['lower'][i]) > amount
+        })
+    return statuses
+
+
+def build_forecast(conn, history_days: int = 90, confidence: float = 0.95, cloud: Optional[str] = None,
+                   account_id: Optional[str] = None, service: Optional[str] = None) -> Dict:
+    """Month-end projections for every stored series plus budget status"""
+    keys, dates, costs = load_cost_history(conn, history_days, cloud, account_id, service)
+    if not keys:
+        return {'as_of': None, 'series': [], 'budgets': []}
+
+    result = forecast_month_end(dates, costs, confidence)
+    series = [
+        {
+            'cloud_provider': cloud_provider,
+            'account_id': account,
+            'service': service_name,
+            'month_to_date': round(float(result['month_to_date'][i]), 2),
+            'projected_month_end': round(float(result['projected'][i]), 2),
+            'lower': round(float(result['lower'][i]), 2),
+            'upper': round(float(result['upper'][i]), 2)
+        }
+        for i, (cloud_provider, account, service_name) in enumerate(keys)
+    ]
+
+    # Budgets are only meaningful against the unfiltered history
+    budgets = []
+    if not (cloud or account_id or service):
+        budgets = forecast_budgets(dates, costs, keys, load_budgets(conn), confidence)
+
+    return {
+        'as_of': str(dates[-1]),
+        'confidence': confidence,
+        'remaining_days': result['remaining_days'],
+        'series': series,
+        'budgets': budgets
+    }
@@ -0,0 +1,152 @@
+import os
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+from src.detectors.trusted_files import app_data_dir, check_trusted, make_private_dirs
+
+logger = logging.getLogger(__name__)
+
+# Column order of every feature matrix passed to the scorer
+FEATURE_NAMES = ('cpu', 'network_bytes', 'iops', 'monthly_cost', 'age_days')
+
+
+def build_feature_matrix(resources: List[Dict]) -> np.ndarray:
+    """Stack per-resource feature dicts into an (n, len(FEATURE_NAMES)) array"""
+    return np.array(
+        [[float(r.get(name) or 0.0) for name in FEATURE_NAMES] for r in resources],
+        dtype=np.float64
+    ).reshape(len(resources), len(FEATURE_NAMES))
+
+
+def fleet_key(resource_type: str, account_id: Optional[str] = None, region: Optional[str] = None) -> str:
+    """Model name for one resource type in one account/region"""
+    return '_'.join((account_id or 'default', region or 'default', resource_type))
+
+
+def _transform(X: np.ndarray) -> np.ndarray:
+    # Costs, bytes and IOPS are heavy tailed; compare them on a log scale
+    return np.log1p(np.clip(X, 0, None))
+
+
+class AnomalyModelStore:
+    """IsolationForest models per fleet, persisted between cycles.
+
+    A fleet is one resource type in one account/region, so each sharded
+    detector fits and scores against its own resources rather than
+    overwriting a model shared with other shards. A model is loaded from
+    ``ML_MODEL_DIR`` and reused until it is older than ``ML_RETRAIN_HOURS``;
+    only then is it refitted on the current fleet and written back to disk.
+    """
+
+    def __init__(self, model_dir: Optional[str] = None):
+        self.model_dir = Path(model_dir or os.getenv('ML_MODEL_DIR') or app_data_dir('models'))
+        self.retrain_seconds = float(os.getenv('ML_RETRAIN_HOURS', '24')) * 3600
+        self.min_samples = int(os.getenv('ML_MIN_SAMPLES', '20'))
+        self.contamination = float(os.getenv('ML_CONTAMINATION', '0.02'))
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _path(self, fleet: str) -> Path:
+        return self.model_dir / f"isolation_forest_{fleet}.joblib"
+
+    def _load(self, fleet: str) -> Optional[Dict]:
+        bundle = self._models.get(fleet)
+        if bundle is None:
+            path = self._path(fleet)
+            if path.exists():
+                import joblib
+                # joblib.load unpickles: only load models nobody else could have written
+                check_trusted(path, self.model_dir)
+                bundle = joblib.load(path)
+                self._models[fleet] = bundle
+        return bundle
+
+    def _train(self, fleet: str, X: np.ndarray) -> Dict:
+        # scikit-learn and joblib take most of the detector's import time;
+        # load them only when a model is actually needed
+        import joblib
+        from sklearn.ensemble import IsolationForest
+
+        Xt = _transform(X)
+        model = IsolationForest(
+            n_estimators=200,
+            contamination=self.contamination,
+            random_state=0
+        ).fit(Xt)
+
+        # Robust centre and spread of the training data, used to explain
+        # which feature pushed a resource away from the fleet
+        median = np.median(Xt, axis=0)
+        q75, q25 = np.percentile(Xt, [75, 25], axis=0)
+        scale = np.where(q75 - q25 > 0, q75 - q25, 1.0)
+
+        bundle = {
+            'model': model,
+            'median': median,
+            'scale': scale,
+            'features': FEATURE_NAMES,
+            'trained_at': time.time(),
+            'n_samples': len(X)
+        }
+
+        make_private_dirs(self.model_dir)
+        tmp_path = self._path(fleet).with_suffix('.tmp')
+        joblib.dump(bundle, tmp_path)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, self._path(fleet))
+        self._models[fleet] = bundle
+
+        logger.info("Trained anomaly model", extra={'fleet': fleet, 'samples': len(X)})
+        return bundle
+
+    def get_model(self, fleet: str, X: np.ndarray) -> Optional[Dict]:
+        """Return a usable model, retraining on ``X`` if none exists or it is stale"""
+        with self._lock:
+            bundle = self._load(fleet)
+            stale = (
+                bundle is None
+                or bundle['features'] != FEATURE_NAMES
+                or time.time() - bundle['trained_at'] > self.retrain_seconds
+            )
+            if stale and len(X) >= self.min_samples:
+                bundle = self._train(fleet, X)
+            return bundle
+
+    def score(self, fleet: str, X: np.ndarray) -> Optional[Dict[str, np.ndarray]]:
+        """Score a feature matrix in one batch.
+
+        Returns ``anomaly_score`` (higher is more unusual), ``is_outlier``
+        and per-feature robust z-scores, or None if no model is available.
+        """
+        if len(X) == 0:
+            return None
+        bundle = self.get_model(fleet, X)
+        if bundle is None:
+            return None
+
+        Xt = _transform(X)
+        model = bundle['model']
+        return {
+            'anomaly_score': -model.score_samples(Xt),
+            'is_outlier': model.predict(Xt) == -1,
+            'feature_z': (Xt - bundle['median']) / bundle['scale']
+        }
+
+
+def explain(feature_z: np.ndarray, top_n: int = 3) -> List[Dict]:
+    """Features that deviate most from the fleet for one scored row"""
+    order = np.argsort(-np.abs(feature_z))[:top_n]
+    return [
+        {
+            'feature': FEATURE_NAMES[i],
+            'direction': 'high' if feature_z[i] > 0 else 'low',
+            'robust_z': round(float(feature_z[i]), 2)
+        }
+        for i in order
+    ]
+
+
+model_store = AnomalyModelStore()
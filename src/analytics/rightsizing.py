@@ -0,0 +1,174 @@
+import os
+import json
+from typing import Dict, List, Optional
+import numpy as np
+
+HOURS_PER_MONTH = 730
+
+# (kind, name, family, category, arch, vcpu, memory_gib, network_gbps, hourly_usd)
+# On-demand Linux / single-AZ list prices in us-east-1 and eastus. Network is
+# None where the provider does not publish a per-size figure.
+_BUILTIN_CATALOG = [
+    ('ec2', 't2.micro', 't2', 'burstable', 'x86_64', 1, 1, 0.5, 0.0116),
+    ('ec2', 't2.small', 't2', 'burstable', 'x86_64', 1, 2, 0.5, 0.023),
+    ('ec2', 't2.medium', 't2', 'burstable', 'x86_64', 2, 4, 0.5, 0.0464),
+    ('ec2', 't2.large', 't2', 'burstable', 'x86_64', 2, 8, 0.5, 0.0928),
+    ('ec2', 't2.xlarge', 't2', 'burstable', 'x86_64', 4, 16, 0.5, 0.1856),
+    ('ec2', 't3.nano', 't3', 'burstable', 'x86_64', 2, 0.5, 5, 0.0052),
+    ('ec2', 't3.micro', 't3', 'burstable', 'x86_64', 2, 1, 5, 0.0104),
+    ('ec2', 't3.small', 't3', 'burstable', 'x86_64', 2, 2, 5, 0.0208),
+    ('ec2', 't3.medium', 't3', 'burstable', 'x86_64', 2, 4, 5, 0.0416),
+    ('ec2', 't3.large', 't3', 'burstable', 'x86_64', 2, 8, 5, 0.0832),
+    ('ec2', 't3.xlarge', 't3', 'burstable', 'x86_64', 4, 16, 5, 0.1664),
+    ('ec2', 't3.2xlarge', 't3', 'burstable', 'x86_64', 8, 32, 5, 0.3328),
+    ('ec2', 'm5.large', 'm5', 'general', 'x86_64', 2, 8, 10, 0.096),
+    ('ec2', 'm5.xlarge', 'm5', 'general', 'x86_64', 4, 16, 10, 0.192),
+    ('ec2', 'm5.2xlarge', 'm5', 'general', 'x86_64', 8, 32, 10, 0.384),
+    ('ec2', 'm5.4xlarge', 'm5', 'general', 'x86_64', 16, 64, 10, 0.768),
+    ('ec2', 'm5.8xlarge', 'm5', 'general', 'x86_64', 32, 128, 10, 1.536),
+    ('ec2', 'm5.12xlarge', 'm5', 'general', 'x86_64', 48, 192, 12, 2.304),
+    ('ec2', 'm6i.large', 'm6i', 'general', 'x86_64', 2, 8, 12.5, 0.096),
+    ('ec2', 'm6i.xlarge', 'm6i', 'general', 'x86_64', 4, 16, 12.5, 0.192),
+    ('ec2', 'm6i.2xlarge', 'm6i', 'general', 'x86_64', 8, 32, 12.5, 0.384),
+    ('ec2', 'm6i.4xlarge', 'm6i', 'general', 'x86_64', 16, 64, 12.5, 0.768),
+    ('ec2', 'm6g.large', 'm6g', 'general', 'arm64', 2, 8, 10, 0.077),
+    ('ec2', 'm6g.xlarge', 'm6g', 'general', 'arm64', 4, 16, 10, 0.154),
+    ('ec2', 'm6g.2xlarge', 'm6g', 'general', 'arm64', 8, 32, 10, 0.308),
+    ('ec2', 'c5.large', 'c5', 'compute', 'x86_64', 2, 4, 10, 0.085),
+    ('ec2', 'c5.xlarge', 'c5', 'compute', 'x86_64', 4, 8, 10, 0.17),
+    ('ec2', 'c5.2xlarge', 'c5', 'compute', 'x86_64', 8, 16, 10, 0.34),
+    ('ec2', 'c5.4xlarge', 'c5', 'compute', 'x86_64', 16, 32, 10, 0.68),
+    ('ec2', 'r5.large', 'r5', 'memory', 'x86_64', 2, 16, 10, 0.126),
+    ('ec2', 'r5.xlarge', 'r5', 'memory', 'x86_64', 4, 32, 10, 0.252),
+    ('ec2', 'r5.2xlarge', 'r5', 'memory', 'x86_64', 8, 64, 10, 0.504),
+    ('ec2', 'r5.4xlarge', 'r5', 'memory', 'x86_64', 16, 128, 10, 1.008),
+    ('rds', 'db.t3.micro', 'db.t3', 'burstable', 'x86_64', 2, 1, None, 0.017),
+    ('rds', 'db.t3.small', 'db.t3', 'burstable', 'x86_64', 2, 2, None, 0.034),
+    ('rds', 'db.t3.medium', 'db.t3', 'burstable', 'x86_64', 2, 4, None, 0.068),
+    ('rds', 'db.t3.large', 'db.t3', 'burstable', 'x86_64', 2, 8, None, 0.136),
+    ('rds', 'db.m5.large', 'db.m5', 'general', 'x86_64', 2, 8, None, 0.171),
+    ('rds', 'db.m5.xlarge', 'db.m5', 'general', 'x86_64', 4, 16, None, 0.342),
+    ('rds', 'db.m5.2xlarge', 'db.m5', 'general', 'x86_64', 8, 32, None, 0.684),
+    ('rds', 'db.m5.4xlarge', 'db.m5', 'general', 'x86_64', 16, 64, None, 1.368),
+    ('rds', 'db.r5.large', 'db.r5', 'memory', 'x86_64', 2, 16, None, 0.24),
+    ('rds', 'db.r5.xlarge', 'db.r5', 'memory', 'x86_64', 4, 32, None, 0.48),
+    ('rds', 'db.r5.2xlarge', 'db.r5', 'memory', 'x86_64', 8, 64, None, 0.96),
+    ('vm', 'Standard_B1s', 'B', 'burstable', 'x86_64', 1, 1, None, 0.0104),
+    ('vm', 'Standard_B1ms', 'B', 'burstable', 'x86_64', 1, 2, None, 0.0207),
+    ('vm', 'Standard_B2s', 'B', 'burstable', 'x86_64', 2, 4, None, 0.0416),
+    ('vm', 'Standard_B2ms', 'B', 'burstable', 'x86_64', 2, 8, None, 0.0832),
+    ('vm', 'Standard_B4ms', 'B', 'burstable', 'x86_64', 4, 16, None, 0.166),
+    ('vm', 'Standard_D2s_v3', 'Dsv3', 'general', 'x86_64', 2, 8, None, 0.096),
+    ('vm', 'Standard_D4s_v3', 'Dsv3', 'general', 'x86_64', 4, 16, None, 0.192),
+    ('vm', 'Standard_D8s_v3', 'Dsv3', 'general', 'x86_64', 8, 32, None, 0.384),
+    ('vm', 'Standard_D16s_v3', 'Dsv3', 'general', 'x86_64', 16, 64, None, 0.768),
+    ('vm', 'Standard_E2s_v3', 'Esv3', 'memory', 'x86_64', 2, 16, None, 0.126),
+    ('vm', 'Standard_E4s_v3', 'Esv3', 'memory', 'x86_64', 4, 32, None, 0.252),
+    ('vm', 'Standard_E8s_v3', 'Esv3', 'memory', 'x86_64', 8, 64, None, 0.504),
+    ('vm', 'Standard_F2s_v2', 'Fsv2', 'compute', 'x86_64', 2, 4, None, 0.085),
+    ('vm', 'Standard_F4s_v2', 'Fsv2', 'compute', 'x86_64', 4, 8, None, 0.169),
+    ('vm', 'Standard_F8s_v2', 'Fsv2', 'compute', 'x86_64', 8, 16, None, 0.338),
+]
+
+
+class InstanceCatalog:
+    """Instance types as parallel NumPy arrays for fleet-wide matching"""
+
+    def __init__(self, rows: List[tuple]):
+        self.kind = np.array([r[0] for r in rows])
+        self.name = np.array([r[1] for r in rows])
+        self.family = np.array([r[2] for r in rows])
+        self.category = np.array([r[3] for r in rows])
+        self.arch = np.array([r[4] for r in rows])
+        self.vcpu = np.array([r[5] for r in rows], dtype=np.float64)
+        self.memory_gib = np.array([r[6] for r in rows], dtype=np.float64)
+        # Unknown network capacity never rules a candidate out
+        self.network_gbps = np.array([np.inf if r[7] is None else r[7] for r in rows], dtype=np.float64)
+        self.hourly_price = np.array([r[8] for r in rows], dtype=np.float64)
+        self._index = {(k, n): i for i, (k, n) in enumerate(zip(self.kind, self.name))}
+
+    def __len__(self):
+        return len(self.name)
+
+    def lookup(self, kind: str, name: str) -> Optional[int]:
+        return self._index.get((kind, name))
+
+    def monthly_price(self, kind: str, name: str) -> Optional[float]:
+        i = self.lookup(kind, name)
+        return None if i is None else float(self.hourly_price[i] * HOURS_PER_MONTH)
+
+
+def load_catalog() -> InstanceCatalog:
+    """Built-in catalog, optionally extended/overridden by RIGHTSIZING_CATALOG_PATH (JSON rows)"""
+    rows = {(r[0], r[1]): tuple(r) for r in _BUILTIN_CATALOG}
+    path = os.getenv('RIGHTSIZING_CATALOG_PATH')
+    if path:
+        with open(path) as f:
+            for r in json.load(f):
+                rows[(r[0], r[1])] = tuple(r)
+    return InstanceCatalog(list(rows.values()))
+
+
+catalog = load_catalog()
+
+
+def recommend(kind: str, current_types: List[str], cpu_p95: np.ndarray,
+              network_p95_gbps: Optional[np.ndarray] = None,
+              target_utilization: float = None, memory_floor: float = None) -> List[Optional[Dict]]:
+    """Cheapest compatible instance type for every resource in one pass.
+
+    A candidate must be the same kind, category and CPU architecture, be
+    cheaper than the current type, give the observed p95 CPU load room to
+    run at ``target_utilization`` and keep at least ``memory_floor`` of the
+    current memory (there is no memory metric to size against). Returns one
+    dict per resource with the target type and exact monthly saving, or
+    None when the resource's type is unknown or nothing cheaper fits.
+    """
+    target_utilization = target_utilization or float(os.getenv('RIGHTSIZING_TARGET_UTILIZATION', '0.7'))
+    memory_floor = memory_floor or float(os.getenv('RIGHTSIZING_MEMORY_FLOOR', '0.5'))
+
+    n = len(current_types)
+    if n == 0:
+        return []
+
+    current = np.array([catalog.lookup(kind, t) if catalog.lookup(kind, t) is not None else -1
+                        for t in current_types])
+    known = current >= 0
+    cur = np.where(known, current, 0)
+
+    cpu_p95 = np.nan_to_num(np.asarray(cpu_p95, dtype=np.float64), nan=100.0)
+    required_vcpu = catalog.vcpu[cur] * (cpu_p95 / 100.0) / target_utilization
+    required_memory = catalog.memory_gib[cur] * memory_floor
+    required_network = np.zeros(n)
+    if network_p95_gbps is not None:
+        required_network = np.nan_to_num(np.asarray(network_p95_gbps, dtype=np.float64)) / target_utilization
+
+    # (resources, catalog) compatibility mask
+    fits = (
+        (catalog.kind[None, :] == kind)
+        & (catalog.category[None, :] == catalog.category[cur][:, None])
+        & (catalog.arch[None, :] == catalog.arch[cur][:, None])
+        & (catalog.vcpu[None, :] >= required_vcpu[:, None])
+        & (catalog.memory_gib[None, :] >= required_memory[:, None])
+        & (catalog.network_gbps[None, :] >= required_network[:, None])
+        & (catalog.hourly_price[None, :] < catalog.hourly_price[cur][:, None])
+        & known[:, None]
+    )
+
+    # Prefer staying in the same family when prices tie
+    other_family = catalog.family[None, :] != catalog.family[cur][:, None]
+    cost = np.where(fits, catalog.hourly_price[None, :] + other_family * 1e-6, np.inf)
+    best = cost.argmin(axis=1)
+    found = np.isfinite(cost[np.arange(n), best])
+
+    savings = (catalog.hourly_price[cur] - catalog.hourly_price[best]) * HOURS_PER_MONTH
+    return [
+        {
+            'current_type': current_types[i],
+            'target_type': str(catalog.name[best[i]]),
+            'current_monthly_cost': round(float(catalog.hourly_price[cur[i]] * HOURS_PER_MONTH), 2),
+            'target_monthly_cost': round(float(catalog.hourly_price[best[i]] * HOURS_PER_MONTH), 2),
+            'monthly_savings': round(float(savings[i]), 2)
+        } if found[i] else None
+        for i in range(n)
+    ]
@@ -0,0 +1,49 @@
+import json
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import FileResponse
+from src.monitoring.profiler import profiler
+from src.detectors.cloud_client import client_stats
+
+router = APIRouter(prefix="/api/v1/admin")
+
+@router.post("/profiling")
+async def enable_profiling(runs: int = Query(1, ge=1, le=50)):
+    """Profile the next N detection runs"""
+    profiler.arm(runs)
+    return {"status": "armed", "remaining_runs": profiler.remaining_runs}
+
+@router.delete("/profiling")
+async def disable_profiling():
+    """Cancel any pending profiling runs"""
+    profiler.disarm()
+    return {"status": "disarmed", "remaining_runs": 0}
+
+@router.get("/profiling")
+async def list_profiles():
+    """List saved profiles"""
+    return {
+        "remaining_runs": profiler.remaining_runs,
+        "captures": profiler.list_captures()
+    }
+
+@router.get("/profiling/{capture_id}")
+async def get_profile_summary(capture_id: str):
+    """Top cumulative functions and allocators for one capture"""
+    path = profiler.capture_path(capture_id, '.json')
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    with open(path) as f:
+        return json.load(f)
+
+@router.get("/profiling/{capture_id}/download")
+async def download_profile(capture_id: str):
+    """Download the raw cProfile output (open with pstats or snakeviz)"""
+    path = profiler.capture_path(capture_id, '.prof')
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=path.name)
+
+@router.get("/clients")
+async def get_client_stats():
+    """Adaptive rate limits, circuit breaker states and response cache hit/miss counts"""
+    return client_stats()
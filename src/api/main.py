@@ -1,16 +1,29 @@
 
-from fastapi import FastAPI, BackgroundTasks, HTTPException
+from fastapi import FastAPI, Response
 
 from fastapi.middleware.cors import CORSMiddleware
 
-from datetime import datetime
-
+import os
 import asyncio
+import logging
+import time
 import uvicorn
+import psycopg2
+from prometheus_client import CONTENT_TYPE_LATEST
 from .routes import router
+from .admin import router as admin_router
 from src.detectors.aws_detector import AWSDetector
 from src.detectors.azure_detector import AzureDetector
 from src.detectors.gcp_detector import GCPDetector
+from src.detectors.sharding import ShardedAWSSweep
+from src.detectors.budget_detector import BudgetDetector
+from src.monitoring.logging_config import configure_logging
+from src.monitoring.metrics import DETECTION_RUN_DURATION, metrics_payload
+from src.monitoring.profiler import profiler
+from src.analytics.allocation import refresh_rollups
+
+configure_logging()
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Cloud Cost Anomaly Detection MVP", version="1.0.0")
 
@@ -24,12 +37,14 @@ app.add_middleware(
 )
 
 app.include_router(router)
+app.include_router(admin_router)
 
 # Global detector instances
 detectors = {
-    'aws': AWSDetector(),
+    'aws': ShardedAWSSweep() if os.getenv('AWS_SHARDED_SWEEP', 'false').lower() == 'true' else AWSDetector(),
     'azure': AzureDetector(),
-    'gcp': GCPDetector()
+    'gcp': GCPDetector(),
+    'budgets': BudgetDetector()
 }
 
 @app.on_event("startup")
@@ -47,11 +62,37 @@ async def periodic_detection():
 async def run_all_detections():
     """Run all cloud detectors"""
     for cloud, detector in detectors.items():
+        start = time.perf_counter()
         try:
-            findings = await asyncio.to_thread(detector.detect_anomalies)
-            print(f"[{datetime.utcnow()}] {cloud}: Found {len(findings)} anomalies")
-        except Exception as e:
-            print(f"[{datetime.utcnow()}] Error in {cloud} detector: {e}")
+            findings = await asyncio.to_thread(profiler.run, cloud, detector.detect_anomalies)
+            logger.info("Detection run complete", extra={
+                'cloud': cloud,
+                'findings': len(findings),
+                'duration_seconds': round(time.perf_counter() - start, 3)
+            })
+        except Exception:
+            logger.exception("Detection run failed", extra={'cloud': cloud})
+        finally:
+            DETECTION_RUN_DURATION.labels(cloud=cloud).observe(time.perf_counter() - start)
+    
+    try:
+        await asyncio.to_thread(refresh_tag_rollups)
+    except Exception:
+        logger.exception("Tag rollup refresh failed")
+
+def refresh_tag_rollups():
+    """Refresh the group-by-tag rollups once new findings are in"""
+    conn = psycopg2.connect(
+        dbname=os.getenv('DB_NAME', 'cloud_cost'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', 'postgres'),
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432')
+    )
+    try:
+        refresh_rollups(conn)
+    finally:
+        conn.close()
 
 @app.get("/")
 async def root():
@@ -61,9 +102,16 @@ async def root():
         "endpoints": {
             "detect": "/api/v1/detect",
             "anomalies": "/api/v1/anomalies",
+            "costs": "/api/v1/costs",
+            "metrics": "/metrics",
             "dashboard": "/dashboard"
         }
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(metrics_payload(), media_type=CONTENT_TYPE_LATEST)
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -1 +1,18 @@
-#Hi
+from typing import List, Literal, Optional
+from pydantic import BaseModel
+
+AnomalyStatus = Literal['open', 'investigating', 'resolved', 'false_positive']
+
+
+class AnomalyStatusUpdate(BaseModel):
+    """Bulk status change for anomalies"""
+    ids: List[int]
+    status: AnomalyStatus
+    resolved_by: Optional[str] = None
+
+
+class AnomalyStatusUpdateResult(BaseModel):
+    """Outcome of a bulk status change"""
+    status: AnomalyStatus
+    updated: int
+    not_found: List[int]
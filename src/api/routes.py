@@ -1,15 +1,26 @@
-from fastapi import APIRouter, BackgroundTasks, Query
-from datetime import datetime, timedelta
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from datetime import date, datetime, timedelta
+from typing import List
 import json
 from src.detectors.aws_detector import AWSDetector
 from src.detectors.azure_detector import AzureDetector
 from src.detectors.gcp_detector import GCPDetector
+from src.detectors.sharding import ShardedAWSSweep
+from src.monitoring.profiler import profiler
+from src.analytics.forecast import build_forecast
+from src.analytics.commitments import analyze_commitments
+from src.analytics.allocation import anomaly_groups, cost_groups, parse_tag_filters
+from src.analytics.export import FORMATS, prepare_export
+from .models import AnomalyStatusUpdate, AnomalyStatusUpdateResult
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import os
 
 router = APIRouter(prefix="/api/v1")
 
+MAX_BULK_UPDATE = int(os.getenv('MAX_BULK_UPDATE', '50000'))
+
 @router.post("/detect")
 async def trigger_detection(
     cloud: str = Query("all", enum=["aws", "azure", "gcp", "all"]),
@@ -19,7 +30,11 @@ async def trigger_detection(
     
     async def run_detection(cloud_provider: str):
         if cloud_provider == "aws":
-            detector = AWSDetector()
+            # Same entry point as the scheduled cycle in main.py
+            if os.getenv('AWS_SHARDED_SWEEP', 'false').lower() == 'true':
+                detector = ShardedAWSSweep()
+            else:
+                detector = AWSDetector()
         elif cloud_provider == "azure":
             detector = AzureDetector()
         elif cloud_provider == "gcp":
@@ -27,7 +42,7 @@ async def trigger_detection(
         else:
             return
         
-        findings = detector.detect_anomalies()
+        findings = profiler.run(cloud_provider, detector.detect_anomalies)
         return findings
     
     if cloud == "all":
@@ -52,9 +67,16 @@ async def get_anomalies(
     cloud: str = None,
     severity: str = None,
     status: str = "open",
-    limit: int = 100
+    limit: int = 100,
+    group_by: str = None,
+    tag: List[str] = Query(None, description="key:value, repeatable")
 ):
-    """Get detected anomalies"""
+    """Get detected anomalies, or totals per group with group_by=cloud|severity|anomaly_type|tag:<key>"""
+    
+    try:
+        tag_filters = parse_tag_filters(tag)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     conn = psycopg2.connect(
         dbname=os.getenv('DB_NAME', 'cloud_cost'),
@@ -64,6 +86,14 @@ async def get_anomalies(
         port=os.getenv('DB_PORT', '5432')
     )
     
+    if group_by:
+        try:
+            return anomaly_groups(conn, group_by, tag_filters, cloud, severity, status)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        finally:
+            conn.close()
+    
     query = "SELECT * FROM cost_anomalies WHERE 1=1"
     params = []
     
@@ -79,6 +109,10 @@ async def get_anomalies(
         query += " AND status = %s"
         params.append(status)
     
+    if tag_filters:
+        query += " AND tags @> %s::jsonb"
+        params.append(json.dumps(tag_filters))
+    
     query += " ORDER BY detected_at DESC LIMIT %s"
     params.append(limit)
     
@@ -103,6 +137,132 @@ async def get_anomalies(
         }
     }
 
+@router.patch("/anomalies", response_model=AnomalyStatusUpdateResult)
+async def update_anomalies(update: AnomalyStatusUpdate):
+    """Set the status of many anomalies in one statement"""
+    
+    ids = sorted(set(update.ids))
+    if not ids:
+        raise HTTPException(status_code=400, detail="ids must not be empty")
+    if len(ids) > MAX_BULK_UPDATE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_UPDATE} ids per request")
+    
+    closed = update.status in ('resolved', 'false_positive')
+    
+    conn = psycopg2.connect(
+        dbname=os.getenv('DB_NAME', 'cloud_cost'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', 'postgres'),
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432')
+    )
+    
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE cost_anomalies a
+                SET status = %s,
+                    resolved_at = CASE WHEN %s THEN NOW() END,
+                    resolved_by = CASE WHEN %s THEN %s END
+                FROM unnest(%s::int[]) AS u(id)
+                WHERE a.id = u.id
+                RETURNING a.id
+            """, (update.status, closed, closed, update.resolved_by or 'api', ids))
+            updated = {row[0] for row in cur.fetchall()}
+        conn.commit()
+    finally:
+        conn.close()
+    
+    return {
+        "status": update.status,
+        "updated": len(updated),
+        "not_found": [i for i in ids if i not in updated]
+    }
+
+@router.get("/costs")
+async def get_costs(
+    start: date = None,
+    end: date = None,
+    group_by: str = "service",
+    cloud: str = None,
+    account_id: str = None,
+    service: str = None,
+    tag: List[str] = Query(None, description="key:value")
+):
+    """Daily spend totals per service|account|cloud|date|tag:<key>"""
+    
+    end = end or date.today()
+    start = start or end - timedelta(days=30)
+    try:
+        tag_filters = parse_tag_filters(tag)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    conn = psycopg2.connect(
+        dbname=os.getenv('DB_NAME', 'cloud_cost'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', 'postgres'),
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432')
+    )
+    
+    try:
+        return cost_groups(conn, start, end, group_by, tag_filters, cloud, account_id, service)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        conn.close()
+
+@router.get("/export/{dataset}")
+def export_dataset(
+    dataset: str,
+    format: str = Query("ndjson", enum=sorted(FORMATS)),
+    start: datetime = None,
+    end: datetime = None,
+    cloud: str = None,
+    severity: str = None,
+    status: str = None,
+    anomaly_type: str = None,
+    resource_type: str = None,
+    account_id: str = None,
+    service: str = None,
+    tag: List[str] = Query(None, description="key:value, repeatable"),
+    since: str = Query(None, description="Only rows with id (anomalies) / updated_at (daily_costs) after this"),
+    watermark: str = Query(None, description="Named incremental export; advances when the stream completes")
+):
+    """Stream anomalies or daily_costs as NDJSON, CSV or Parquet with bounded memory"""
+    
+    filters = {
+        'cloud_provider': cloud, 'severity': severity, 'status': status, 'anomaly_type': anomaly_type,
+        'resource_type': resource_type, 'account_id': account_id, 'service': service
+    }
+    filters = {column: value for column, value in filters.items() if value}
+    
+    conn = psycopg2.connect(
+        dbname=os.getenv('DB_NAME', 'cloud_cost'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', 'postgres'),
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432')
+    )
+    
+    try:
+        stream = prepare_export(conn, dataset, format, start, end, filters,
+                                parse_tag_filters(tag), since, watermark)
+    except ValueError as e:
+        conn.close()
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    def body():
+        try:
+            yield from stream
+        finally:
+            conn.close()
+    
+    return StreamingResponse(body(), media_type=FORMATS[format], headers={
+        'Content-Disposition': f'attachment; filename="{dataset}.{format}"'
+    })
+
 @router.get("/stats")
 async def get_stats(hours: int = 24):
     """Get statistics for the last N hours"""
@@ -164,4 +324,48 @@ async def get_stats(hours: int = 24):
         "by_cloud": by_cloud,
         "by_type": by_type,
         "estimated_monthly_savings": savings['total_savings'] * 30 / hours if hours > 0 else 0
-    }
\ No newline at end of file
+    }
+
+@router.get("/forecast")
+async def get_forecast(
+    cloud: str = None,
+    account_id: str = None,
+    service: str = None,
+    history_days: int = Query(90, ge=14, le=730),
+    confidence: float = Query(0.95, gt=0, lt=1)
+):
+    """Month-end spend projections with confidence intervals"""
+    
+    conn = psycopg2.connect(
+        dbname=os.getenv('DB_NAME', 'cloud_cost'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', 'postgres'),
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432')
+    )
+    
+    try:
+        return build_forecast(conn, history_days, confidence, cloud, account_id, service)
+    finally:
+        conn.close()
+
+@router.get("/commitments")
+async def get_commitments(
+    cloud: str = None,
+    days: int = Query(365, ge=7, le=1095),
+    discount: float = Query(None, gt=0, lt=1)
+):
+    """Reserved Instance / Savings Plan commitment levels that maximize net savings"""
+    
+    conn = psycopg2.connect(
+        dbname=os.getenv('DB_NAME', 'cloud_cost'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', 'postgres'),
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432')
+    )
+    
+    try:
+        return analyze_commitments(conn, days, discount, cloud)
+    finally:
+        conn.close()
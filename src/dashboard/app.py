@@ -226,7 +226,14 @@ try:
                 st.info(recommendation)
                 
                 if st.button("Mark as Resolved", key=f"resolve_{selected_id}"):
-                    st.success("Anomaly marked as resolved (demo)")
+                    response = requests.patch(
+                        f"{api_url}/api/v1/anomalies",
+                        json={"ids": [selected_id], "status": "resolved", "resolved_by": "dashboard"}
+                    )
+                    if response.status_code == 200 and response.json()['updated']:
+                        st.success("Anomaly marked as resolved")
+                    else:
+                        st.error(f"Could not resolve anomaly: {response.text}")
     
     else:
         st.info("No anomalies detected in the selected time window.")
@@ -1,90 +1,222 @@
 import boto3
-from datetime import datetime, timedelta
-from .base_detector import BaseDetector
+from botocore.config import Config
+from datetime import timedelta
+from typing import Dict, List
+import numpy as np
+from .base_detector import BaseDetector, spike_severity
+from .cloud_client import BOTO_NO_RETRIES
+from .metric_store import MetricStore
+from .replay import detector_mode, detector_now
+from .utilization import UtilizationProfiles, collect_profiles
+from src.analytics.rightsizing import catalog, recommend
+from src.analytics.ml_scoring import FEATURE_NAMES, build_feature_matrix, explain, fleet_key, model_store
 import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# CloudWatch series collected for each resource: profile name -> (metric, statistic)
+EC2_PROFILE_METRICS = {
+    'cpu': ('CPUUtilization', 'Average'),
+    'network_in': ('NetworkIn', 'Sum'),
+    'network_out': ('NetworkOut', 'Sum'),
+    'read_ops': ('DiskReadOps', 'Sum'),
+    'write_ops': ('DiskWriteOps', 'Sum')
+}
+
+RDS_PROFILE_METRICS = {
+    'cpu': ('CPUUtilization', 'Average'),
+    'network_in': ('NetworkReceiveThroughput', 'Average'),
+    'network_out': ('NetworkTransmitThroughput', 'Average'),
+    'read_ops': ('ReadIOPS', 'Average'),
+    'write_ops': ('WriteIOPS', 'Average')
+}
 
 
 class AWSDetector(BaseDetector):
     """Real-time AWS cost anomaly detector"""
     
-    def __init__(self):
-        super().__init__()
-        self.session = boto3.Session(
+    cloud_provider = 'aws'
+    
+    # Cost spikes are point-in-time events and stay open until someone triages them
+    RULE_COVERAGE = {
+        '_detect_idle_ec2': [('ec2', 'idle_resource')],
+        '_detect_oversized_ec2': [('ec2', 'oversized_resource')],
+        '_detect_unattached_ebs': [('ebs', 'orphaned_resource')],
+        '_detect_idle_rds': [('rds', 'idle_resource')],
+        '_detect_ml_outliers': [('ec2', 'ml_outlier'), ('rds', 'ml_outlier')]
+    }
+    
+    def __init__(self, session=None, account_id=None, db_conn=None):
+        super().__init__(db_conn=db_conn)
+        self.session = session or boto3.Session(
             aws_access_key_id=os.getenv('AWS_ACCESS_KEY'),
             aws_secret_access_key=os.getenv('AWS_SECRET_KEY'),
             region_name=os.getenv('AWS_REGION', 'us-east-1')
         )
-        self.ec2 = self.session.client('ec2')
-        self.rds = self.session.client('rds')
-        self.cloudwatch = self.session.client('cloudwatch')
-        self.cost_explorer = self.session.client('ce')
+        self.account_id = account_id
+        self.region = self.session.region_name
+        config = Config(**BOTO_NO_RETRIES)
+        self.ec2 = self.instrument_client(self.session.client('ec2', config=config), 'ec2')
+        self.rds = self.instrument_client(self.session.client('rds', config=config), 'rds')
+        self.cloudwatch = self.instrument_client(self.session.client('cloudwatch', config=config), 'cloudwatch')
+        self.cost_explorer = self.instrument_client(self.session.client('ce', config=config), 'ce')
+        self.idle_cpu_p99 = float(os.getenv('IDLE_CPU_P99', '10'))
+        self.rds_idle_cpu_p99 = float(os.getenv('RDS_IDLE_CPU_P99', '5'))
+        self.oversized_cpu_p95 = float(os.getenv('OVERSIZED_CPU_P95', '40'))
+        self.oversized_cpu_p99 = float(os.getenv('OVERSIZED_CPU_P99', '80'))
+        self.utilization_days = int(os.getenv('UTILIZATION_DAYS', '14'))
+        self.utilization_period = int(os.getenv('UTILIZATION_PERIOD_SECONDS', '3600'))
+        # Record/replay must see every CloudWatch call, not just the uncached gap
+        self.metric_store_dir = '' if detector_mode() else os.getenv('METRIC_STORE_DIR', '/tmp/cost-detector-metrics')
+        self.spike_multiplier = float(os.getenv('SPIKE_MULTIPLIER', '1.5'))
+        self.spike_high_threshold = float(os.getenv('SPIKE_HIGH_THRESHOLD', '0'))
+        self.collect_hourly_usage = os.getenv('COMMITMENT_USAGE_COLLECTION', 'false').lower() == 'true'
+        self.cost_allocation_tags = [k.strip() for k in os.getenv('COST_ALLOCATION_TAG_KEYS', '').split(',') if k.strip()]
+        # Without sharding, a detector with no account is the only one writing AWS anomalies
+        self.single_account = os.getenv('AWS_SHARDED_SWEEP', 'false').lower() != 'true'
+        self._run_cache = {}
     
-    def detect_anomalies(self) -> List[Dict]:
-        """Run all AWS detection rules"""
-        findings = []
+    def detect_anomalies(self, scope: str = 'all') -> List[Dict]:
+        """Run all AWS detection rules
         
-        # 1. Detect idle EC2 instances
-        findings.extend(self._detect_idle_ec2())
+        ``scope`` restricts the run to the 'regional' rules (EC2, EBS, RDS)
+        or the account-wide 'global' rules (Cost Explorer) when a sweep is
+        sharded by account and region.
+        """
+        findings = []
+        self.start_run()
         
-        # 2. Detect unattached EBS volumes
-        findings.extend(self._detect_unattached_ebs())
+        # Inventory and utilization profiles are shared by the rules of one run
+        self._run_cache = {}
         
-        # 3. Detect idle RDS instances
-        findings.extend(self._detect_idle_rds())
+        if scope in ('all', 'regional'):
+            findings.extend(self.run_rules([
+                self._detect_idle_ec2,          # 1. Idle EC2 instances
+                self._detect_oversized_ec2,     # 2. Oversized EC2 instances
+                self._detect_unattached_ebs,    # 3. Unattached EBS volumes
+                self._detect_idle_rds,          # 4. Idle RDS instances
+                self._detect_ml_outliers        # 5. ML outliers across EC2/RDS
+            ]))
         
-        # 4. Detect cost spikes
-        findings.extend(self._detect_cost_spikes())
+        if scope in ('all', 'global'):
+            findings.extend(self.run_rules([
+                self._detect_cost_spikes,       # 6. Cost spikes
+                self._collect_hourly_usage,     # Usage history for the commitment optimizer
+                self._collect_tag_costs         # Daily spend per cost allocation tag
+            ]))
         
         # Save and alert
         for finding in findings:
+            if self.account_id:
+                finding.setdefault('details', {}).update({
+                    'account_id': self.account_id,
+                    'region': self.region
+                })
             finding_id = self.save_finding(finding)
             finding['id'] = finding_id
             self.trigger_alert(finding)
         
+        # Close anomalies whose resource is gone or no longer matches a rule.
+        # A run with no account can't tell its anomalies from other shards'
+        if self.account_id:
+            self.reconcile(findings, {'account_id': self.account_id, 'region': self.region})
+        elif self.single_account:
+            self.reconcile(findings)
+        else:
+            logger.warning("Skipping reconcile for a run without an account_id")
+        
         return findings
     
     def _detect_idle_ec2(self) -> List[Dict]:
-        """Detect EC2 instances with low CPU utilization"""
+        """Detect EC2 instances whose CPU stays low even at its peaks"""
         findings = []
         
-        # Get all running instances
-        response = self.ec2.describe_instances(
-            Filters=[{'Name': 'instance-state-name', 'Values': ['running']}]
+        instances = self._running_instances()
+        profiles = self._ec2_profiles()
+        cpu = profiles.percentiles('cpu')
+        network = self._network_p95_gbps(profiles)
+        peak_hour = profiles.peak_hour('cpu')
+        
+        # Idle only if even the busiest 1% of hours stay below the cutoff,
+        # so boxes with short nightly batch peaks are not flagged
+        flagged = np.flatnonzero(profiles.has_data('cpu') & (cpu[:, 2] < self.idle_cpu_p99))
+        types = [instances[i].get('InstanceType', 'unknown') for i in flagged]
+        targets = recommend('ec2', types, cpu[flagged, 1], network[flagged])
+        
+        for i, instance_type, target in zip(flagged, types, targets):
+            p50, p95, p99 = cpu[i]
+            findings.append({
+                'cloud_provider': 'aws',
+                'resource_id': instances[i]['InstanceId'],
+                'resource_type': 'ec2',
+                'anomaly_type': 'idle_resource',
+                'tags': self._tags(instances[i]),
+                'severity': 'high',
+                'cost_impact': self._estimate_ec2_cost(instance_type),
+                'details': {
+                    'cpu_p50': round(float(p50), 2),
+                    'cpu_p95': round(float(p95), 2),
+                    'cpu_p99': round(float(p99), 2),
+                    'network_p95_gbps': round(float(network[i]), 4),
+                    'peak_hour_utc': int(peak_hour[i]),
+                    'instance_type': instance_type,
+                    'rightsizing': target,
+                    'recommendation': (
+                        f"Consider stopping this instance or downsizing to {target['target_type']}"
+                        if target else 'Consider stopping or downsizing this instance'
+                    )
+                }
+            })
+        
+        return findings
+    
+    def _detect_oversized_ec2(self) -> List[Dict]:
+        """Detect EC2 instances that a cheaper type could serve at p95 load"""
+        findings = []
+        
+        instances = self._running_instances()
+        profiles = self._ec2_profiles()
+        cpu = profiles.percentiles('cpu')
+        network = self._network_p95_gbps(profiles)
+        peak_hour = profiles.peak_hour('cpu')
+        
+        # Idle instances are reported by _detect_idle_ec2; instances that
+        # peak near capacity are left alone even if p95 is low
+        flagged = np.flatnonzero(
+            profiles.has_data('cpu')
+            & (cpu[:, 2] >= self.idle_cpu_p99)
+            & (cpu[:, 2] < self.oversized_cpu_p99)
+            & (cpu[:, 1] < self.oversized_cpu_p95)
         )
+        types = [instances[i].get('InstanceType', 'unknown') for i in flagged]
+        targets = recommend('ec2', types, cpu[flagged, 1], network[flagged])
         
-        for reservation in response['Reservations']:
-            for instance in reservation['Instances']:
-                instance_id = instance['InstanceId']
-                instance_type = instance.get('InstanceType', 'unknown')
-                
-                # Get CPU utilization for last 7 days
-                cpu_stats = self.cloudwatch.get_metric_statistics(
-                    Namespace='AWS/EC2',
-                    MetricName='CPUUtilization',
-                    Dimensions=[{'Name': 'InstanceId', 'Value': instance_id}],
-                    StartTime=datetime.utcnow() - timedelta(days=7),
-                    EndTime=datetime.utcnow(),
-                    Period=86400,  # 1 day
-                    Statistics=['Average']
-                )
-                
-                if cpu_stats['Datapoints']:
-                    avg_cpu = sum([dp['Average'] for dp in cpu_stats['Datapoints']]) / len(cpu_stats['Datapoints'])
-                    
-                    if avg_cpu < 5:  # Less than 5% average CPU
-                        findings.append({
-                            'cloud_provider': 'aws',
-                            'resource_id': instance_id,
-                            'resource_type': 'ec2',
-                            'anomaly_type': 'idle_resource',
-                            'severity': 'high',
-                            'cost_impact': self._estimate_ec2_cost(instance_type),
-                            'details': {
-                                'average_cpu': round(avg_cpu, 2),
-                                'instance_type': instance_type,
-                                'recommendation': 'Consider stopping or downsizing this instance'
-                            }
-                        })
+        for i, instance_type, target in zip(flagged, types, targets):
+            # Nothing cheaper fits the observed load
+            if target is None:
+                continue
+            
+            p50, p95, p99 = cpu[i]
+            findings.append({
+                'cloud_provider': 'aws',
+                'resource_id': instances[i]['InstanceId'],
+                'resource_type': 'ec2',
+                'anomaly_type': 'oversized_resource',
+                'tags': self._tags(instances[i]),
+                'severity': 'medium',
+                'cost_impact': target['monthly_savings'],
+                'details': {
+                    'cpu_p50': round(float(p50), 2),
+                    'cpu_p95': round(float(p95), 2),
+                    'cpu_p99': round(float(p99), 2),
+                    'peak_hour_utc': int(peak_hour[i]),
+                    'instance_type': instance_type,
+                    'target_instance_type': target['target_type'],
+                    'monthly_savings': target['monthly_savings'],
+                    'recommendation': f"Downsize to {target['target_type']} to save ${target['monthly_savings']:,.2f}/month"
+                }
+            })
         
         return findings
     
@@ -92,17 +224,18 @@ class AWSDetector(BaseDetector):
         """Detect EBS volumes not attached to any instance"""
         findings = []
         
-        response = self.ec2.describe_volumes(
+        volumes = self._all_pages(
+            self.ec2.describe_volumes, 'Volumes',
             Filters=[{'Name': 'status', 'Values': ['available']}]
         )
         
-        for volume in response['Volumes']:
+        for volume in volumes:
             volume_id = volume['VolumeId']
             size_gb = volume['Size']
             
             # Check if volume creation date > 7 days (not newly created)
             create_time = volume['CreateTime']
-            age_days = (datetime.utcnow() - create_time.replace(tzinfo=None)).days
+            age_days = (detector_now() - create_time.replace(tzinfo=None)).days
             
             if age_days > 7:
                 findings.append({
@@ -110,6 +243,7 @@ class AWSDetector(BaseDetector):
                     'resource_id': volume_id,
                     'resource_type': 'ebs',
                     'anomaly_type': 'orphaned_resource',
+                    'tags': self._tags(volume),
                     'severity': 'medium',
                     'cost_impact': size_gb * 0.10,  # Approx $0.10/GB-month
                     'details': {
@@ -122,42 +256,42 @@ class AWSDetector(BaseDetector):
         return findings
     
     def _detect_idle_rds(self) -> List[Dict]:
-        """Detect idle RDS instances"""
+        """Detect RDS instances whose CPU stays low even at its peaks"""
         findings = []
         
-        response = self.rds.describe_db_instances()
+        db_instances = self._db_instances()
+        profiles = self._rds_profiles()
+        cpu = profiles.percentiles('cpu')
+        peak_hour = profiles.peak_hour('cpu')
         
-        for db_instance in response['DBInstances']:
-            db_id = db_instance['DBInstanceIdentifier']
-            engine = db_instance['Engine']
-            
-            # Get CPU utilization for last 7 days
-            cpu_stats = self.cloudwatch.get_metric_statistics(
-                Namespace='AWS/RDS',
-                MetricName='CPUUtilization',
-                Dimensions=[{'Name': 'DBInstanceIdentifier', 'Value': db_id}],
-                StartTime=datetime.utcnow() - timedelta(days=7),
-                EndTime=datetime.utcnow(),
-                Period=86400,
-                Statistics=['Average']
-            )
-            
-            if cpu_stats['Datapoints']:
-                avg_cpu = sum([dp['Average'] for dp in cpu_stats['Datapoints']]) / len(cpu_stats['Datapoints'])
-                
-                if avg_cpu < 2:  # Less than 2% average CPU for RDS
-                    findings.append({
-                        'cloud_provider': 'aws',
-                        'resource_id': db_id,
-                        'resource_type': 'rds',
-                        'anomaly_type': 'idle_resource',
-                        'severity': 'high',
-                        'details': {
-                            'average_cpu': round(avg_cpu, 2),
-                            'engine': engine,
-                            'recommendation': 'Consider stopping or downsizing this database'
-                        }
-                    })
+        flagged = np.flatnonzero(profiles.has_data('cpu') & (cpu[:, 2] < self.rds_idle_cpu_p99))
+        classes = [db_instances[i].get('DBInstanceClass', 'unknown') for i in flagged]
+        targets = recommend('rds', classes, cpu[flagged, 1])
+        
+        for i, instance_class, target in zip(flagged, classes, targets):
+            p50, p95, p99 = cpu[i]
+            findings.append({
+                'cloud_provider': 'aws',
+                'resource_id': db_instances[i]['DBInstanceIdentifier'],
+                'resource_type': 'rds',
+                'anomaly_type': 'idle_resource',
+                'tags': self._tags(db_instances[i]),
+                'severity': 'high',
+                'cost_impact': self._estimate_rds_cost(instance_class),
+                'details': {
+                    'cpu_p50': round(float(p50), 2),
+                    'cpu_p95': round(float(p95), 2),
+                    'cpu_p99': round(float(p99), 2),
+                    'peak_hour_utc': int(peak_hour[i]),
+                    'engine': db_instances[i]['Engine'],
+                    'instance_class': instance_class,
+                    'rightsizing': target,
+                    'recommendation': (
+                        f"Consider stopping this database or downsizing to {target['target_type']}"
+                        if target else 'Consider stopping or downsizing this database'
+                    )
+                }
+            })
         
         return findings
     
@@ -165,8 +299,8 @@ class AWSDetector(BaseDetector):
         """Detect daily cost spikes using Cost Explorer"""
         findings = []
         
-        end_date = datetime.utcnow().strftime('%Y-%m-%d')
-        start_date = (datetime.utcnow() - timedelta(days=30)).strftime('%Y-%m-%d')
+        end_date = detector_now().strftime('%Y-%m-%d')
+        start_date = (detector_now() - timedelta(days=30)).strftime('%Y-%m-%d')
         
         response = self.cost_explorer.get_cost_and_usage(
             TimePeriod={'Start': start_date, 'End': end_date},
@@ -175,26 +309,35 @@ class AWSDetector(BaseDetector):
             GroupBy=[{'Type': 'DIMENSION', 'Key': 'SERVICE'}]
         )
         
-        # Analyze daily costs for spikes
+        # Analyze daily costs for spikes. With GroupBy the daily total is
+        # only available as the sum of the per-service groups.
         daily_costs = {}
+        service_costs = []
         for result in response['ResultsByTime']:
             date = result['TimePeriod']['Start']
-            total = float(result['Total']['UnblendedCost']['Amount'])
+            total = 0.0
+            for group in result.get('Groups', []):
+                amount = float(group['Metrics']['UnblendedCost']['Amount'])
+                service_costs.append((date, group['Keys'][0], amount))
+                total += amount
             daily_costs[date] = total
         
+        # Keep the per-service history for forecasting
+        self.save_daily_costs(self.account_id or '', service_costs)
+        
         # Calculate average and detect spikes
         if len(daily_costs) > 7:
             last_7_days = list(daily_costs.values())[-7:]
             avg_cost = sum(last_7_days) / len(last_7_days)
             latest_cost = last_7_days[-1]
             
-            if latest_cost > avg_cost * 1.5:  # 50% increase
+            if latest_cost > avg_cost * self.spike_multiplier:  # 1.5 = 50% increase
                 findings.append({
                     'cloud_provider': 'aws',
                     'resource_id': 'daily_spend',
                     'resource_type': 'account',
                     'anomaly_type': 'cost_spike',
-                    'severity': 'critical' if latest_cost > self.critical_threshold else 'high',
+                    'severity': spike_severity(latest_cost, self.critical_threshold, self.spike_high_threshold),
                     'cost_impact': latest_cost - avg_cost,
                     'details': {
                         'average_daily_cost': round(avg_cost, 2),
@@ -206,14 +349,245 @@ class AWSDetector(BaseDetector):
         
         return findings
     
-    def _estimate_ec2_cost(self, instance_type: str) -> float:
-        """Simple EC2 cost estimation"""
-        # Simplified cost mapping (real implementation would use AWS Pricing API)
-        cost_map = {
-            't2.micro': 0.0116 * 24 * 30,  # ~$8.35/month
-            't2.small': 0.023 * 24 * 30,   # ~$16.56/month
-            't2.medium': 0.0464 * 24 * 30, # ~$33.41/month
-            'm5.large': 0.096 * 24 * 30,   # ~$69.12/month
-            'm5.xlarge': 0.192 * 24 * 30,  # ~$138.24/month
+    def _collect_hourly_usage(self) -> List[Dict]:
+        """Store hourly on-demand EC2 usage per instance family and region
+        
+        Hourly Cost Explorer data must be enabled on the payer account and
+        only covers the last 14 days, so history builds up in hourly_usage.
+        Runs at most once an hour per account; never produces findings.
+        """
+        account_id = self.account_id or ''
+        if not self.collect_hourly_usage or not self.collection_due('hourly_usage', account_id):
+            return []
+        
+        now = detector_now().replace(minute=0, second=0, microsecond=0)
+        kwargs = {
+            'TimePeriod': {
+                'Start': (now - timedelta(days=13)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'End': now.strftime('%Y-%m-%dT%H:%M:%SZ')
+            },
+            'Granularity': 'HOURLY',
+            'Metrics': ['NormalizedUsageAmount', 'UnblendedCost'],
+            'Filter': {'And': [
+                {'Dimensions': {'Key': 'USAGE_TYPE_GROUP', 'Values': ['EC2: Running Hours']}},
+                {'Dimensions': {'Key': 'PURCHASE_TYPE', 'Values': ['On Demand Instances']}}
+            ]},
+            'GroupBy': [
+                {'Type': 'DIMENSION', 'Key': 'INSTANCE_TYPE_FAMILY'},
+                {'Type': 'DIMENSION', 'Key': 'REGION'}
+            ]
         }
-        return cost_map.get(instance_type, 50.0)  # Default $50/month
+        
+        rows = []
+        while True:
+            response = self.cost_explorer.get_cost_and_usage(**kwargs)
+            for result in response['ResultsByTime']:
+                hour = result['TimePeriod']['Start']
+                for group in result.get('Groups', []):
+                    family, region = group['Keys']
+                    rows.append((
+                        hour,
+                        region,
+                        family,
+                        float(group['Metrics']['NormalizedUsageAmount']['Amount']),
+                        float(group['Metrics']['UnblendedCost']['Amount'])
+                    ))
+            if not response.get('NextPageToken'):
+                break
+            kwargs['NextPageToken'] = response['NextPageToken']
+        
+        self.save_hourly_usage(account_id, rows)
+        return []
+    
+    def _collect_tag_costs(self) -> List[Dict]:
+        """Store daily spend per service for every COST_ALLOCATION_TAG_KEYS value
+        
+        Cost Explorer allows two GroupBy dimensions, so each tag key is one
+        (TAG, SERVICE) query. Runs at most once an hour per account.
+        """
+        account_id = self.account_id or ''
+        if not self.cost_allocation_tags or not self.collection_due('daily_tag_costs', account_id):
+            return []
+        
+        end_date = detector_now().strftime('%Y-%m-%d')
+        start_date = (detector_now() - timedelta(days=30)).strftime('%Y-%m-%d')
+        
+        for tag_key in self.cost_allocation_tags:
+            kwargs = {
+                'TimePeriod': {'Start': start_date, 'End': end_date},
+                'Granularity': 'DAILY',
+                'Metrics': ['UnblendedCost'],
+                'GroupBy': [
+                    {'Type': 'TAG', 'Key': tag_key},
+                    {'Type': 'DIMENSION', 'Key': 'SERVICE'}
+                ]
+            }
+            rows = []
+            while True:
+                response = self.cost_explorer.get_cost_and_usage(**kwargs)
+                for result in response['ResultsByTime']:
+                    date = result['TimePeriod']['Start']
+                    for group in result.get('Groups', []):
+                        # Tag groups come back as "key$value"; untagged spend has an empty value
+                        tag_value = group['Keys'][0].split('$', 1)[-1]
+                        rows.append((date, group['Keys'][1], tag_value,
+                                     float(group['Metrics']['UnblendedCost']['Amount'])))
+                if not response.get('NextPageToken'):
+                    break
+                kwargs['NextPageToken'] = response['NextPageToken']
+            self.save_tag_costs(account_id, tag_key, rows)
+        
+        return []
+    
+    def _detect_ml_outliers(self) -> List[Dict]:
+        """Score EC2 and RDS resources with IsolationForest over usage, cost and age"""
+        findings = []
+        now = detector_now()
+        
+        ec2_resources = []
+        for instance in self._running_instances():
+            ec2_resources.append({
+                'resource_id': instance['InstanceId'],
+                'tags': self._tags(instance),
+                'instance_type': instance.get('InstanceType', 'unknown'),
+                'monthly_cost': self._estimate_ec2_cost(instance.get('InstanceType', 'unknown')),
+                'age_days': (now - instance['LaunchTime'].replace(tzinfo=None)).days
+            })
+        
+        rds_resources = []
+        for db_instance in self._db_instances():
+            instance_class = db_instance.get('DBInstanceClass', 'unknown')
+            rds_resources.append({
+                'resource_id': db_instance['DBInstanceIdentifier'],
+                'tags': self._tags(db_instance),
+                'instance_type': instance_class,
+                'monthly_cost': self._estimate_rds_cost(instance_class),
+                'age_days': (now - db_instance['InstanceCreateTime'].replace(tzinfo=None)).days
+            })
+        
+        for resource_type, resources, profiles in (('ec2', ec2_resources, self._ec2_profiles()),
+                                                   ('rds', rds_resources, self._rds_profiles())):
+            if not resources:
+                continue
+            
+            X = build_feature_matrix(resources)
+            X[:, FEATURE_NAMES.index('cpu')] = profiles.mean('cpu')
+            X[:, FEATURE_NAMES.index('network_bytes')] = profiles.mean('network_in') + profiles.mean('network_out')
+            X[:, FEATURE_NAMES.index('iops')] = profiles.mean('read_ops') + profiles.mean('write_ops')
+            X = np.nan_to_num(X)
+            
+            scores = model_store.score(fleet_key(resource_type, self.account_id, self.region), X)
+            if scores is None:
+                continue
+            
+            for i in np.flatnonzero(scores['is_outlier']):
+                resource = resources[i]
+                drivers = explain(scores['feature_z'][i])
+                findings.append({
+                    'cloud_provider': 'aws',
+                    'resource_id': resource['resource_id'],
+                    'resource_type': resource_type,
+                    'anomaly_type': 'ml_outlier',
+                    'tags': resource['tags'],
+                    'severity': 'medium',
+                    'cost_impact': resource['monthly_cost'],
+                    'details': {
+                        'anomaly_score': round(float(scores['anomaly_score'][i]), 3),
+                        'instance_type': resource['instance_type'],
+                        'features': {name: round(float(X[i, j]), 2) for j, name in enumerate(FEATURE_NAMES)},
+                        'drivers': drivers,
+                        'recommendation': f"Usage profile is unusual for this fleet, driven mainly by {drivers[0]['direction']} {drivers[0]['feature']}"
+                    }
+                })
+        
+        return findings
+    
+    def _running_instances(self) -> List[Dict]:
+        """Running EC2 instances, fetched once per detection run"""
+        if 'instances' not in self._run_cache:
+            reservations = self._all_pages(
+                self.ec2.describe_instances, 'Reservations',
+                Filters=[{'Name': 'instance-state-name', 'Values': ['running']}]
+            )
+            self._run_cache['instances'] = [
+                instance
+                for reservation in reservations
+                for instance in reservation['Instances']
+            ]
+        return self._run_cache['instances']
+    
+    def _db_instances(self) -> List[Dict]:
+        """RDS instances, fetched once per detection run"""
+        if 'db_instances' not in self._run_cache:
+            self._run_cache['db_instances'] = self._all_pages(
+                self.rds.describe_db_instances, 'DBInstances', token_key='Marker'
+            )
+        return self._run_cache['db_instances']
+    
+    @staticmethod
+    def _all_pages(operation, items_key: str, token_key: str = 'NextToken', **kwargs) -> List[Dict]:
+        """Items from every page of a describe call
+        
+        Reconcile resolves anything missing from the inventory, so a partial
+        first page is not enough. Pages are requested through the wrapped
+        client rather than get_paginator, which would bypass retries, metrics
+        and record/replay.
+        """
+        items = []
+        while True:
+            response = operation(**kwargs)
+            items.extend(response[items_key])
+            if not response.get(token_key):
+                return items
+            kwargs[token_key] = response[token_key]
+    
+    def _metric_store(self, namespace: str):
+        """Local metric cache for this account/region, or None if disabled"""
+        if not self.metric_store_dir:
+            return None
+        root = os.path.join(
+            self.metric_store_dir,
+            self.account_id or 'default',
+            self.region or 'default',
+            namespace.replace('/', '_')
+        )
+        return MetricStore(root, self.utilization_period, self.utilization_days)
+    
+    def _ec2_profiles(self) -> UtilizationProfiles:
+        if 'ec2_profiles' not in self._run_cache:
+            self._run_cache['ec2_profiles'] = collect_profiles(
+                self.cloudwatch, 'AWS/EC2', 'InstanceId',
+                [i['InstanceId'] for i in self._running_instances()], EC2_PROFILE_METRICS,
+                self.utilization_days, self.utilization_period, self._metric_store('AWS/EC2'),
+                end_time=detector_now()
+            )
+        return self._run_cache['ec2_profiles']
+    
+    def _rds_profiles(self) -> UtilizationProfiles:
+        if 'rds_profiles' not in self._run_cache:
+            self._run_cache['rds_profiles'] = collect_profiles(
+                self.cloudwatch, 'AWS/RDS', 'DBInstanceIdentifier',
+                [d['DBInstanceIdentifier'] for d in self._db_instances()], RDS_PROFILE_METRICS,
+                self.utilization_days, self.utilization_period, self._metric_store('AWS/RDS'),
+                end_time=detector_now()
+            )
+        return self._run_cache['rds_profiles']
+    
+    def _tags(self, resource: Dict) -> Dict[str, str]:
+        """EC2/EBS ``Tags`` or RDS ``TagList`` as a plain dict"""
+        return {t['Key']: t['Value'] for t in resource.get('Tags') or resource.get('TagList') or []}
+    
+    def _network_p95_gbps(self, profiles: UtilizationProfiles) -> np.ndarray:
+        """p95 of inbound plus outbound traffic, converted from bytes per period to Gbps"""
+        total = profiles.percentiles('network_in', (95,))[:, 0] + profiles.percentiles('network_out', (95,))[:, 0]
+        return np.nan_to_num(total) * 8 / profiles.period / 1e9
+    
+    def _estimate_ec2_cost(self, instance_type: str) -> float:
+        """Monthly on-demand EC2 cost from the instance catalog"""
+        price = catalog.monthly_price('ec2', instance_type)
+        return price if price is not None else 50.0  # Default $50/month
+    
+    def _estimate_rds_cost(self, instance_class: str) -> float:
+        """Monthly on-demand RDS cost from the instance catalog"""
+        price = catalog.monthly_price('rds', instance_class)
+        return price if price is not None else 100.0  # Default $100/month
@@ -1,18 +1,27 @@
 from azure.identity import DefaultAzureCredential
 from azure.mgmt.compute import ComputeManagementClient
 from azure.mgmt.costmanagement import CostManagementClient
+from typing import Dict, List
 from .base_detector import BaseDetector
+from .cloud_client import AZURE_NO_RETRIES
+from .replay import detector_now
 import os
 
 class AzureDetector(BaseDetector):
     """Real-time Azure cost anomaly detector"""
     
+    cloud_provider = 'azure'
+    
     def __init__(self):
         super().__init__()
         credential = DefaultAzureCredential()
         self.subscription_id = os.getenv('AZURE_SUBSCRIPTION_ID')
-        self.compute_client = ComputeManagementClient(credential, self.subscription_id)
-        self.cost_client = CostManagementClient(credential)
+        self.compute_client = self.instrument_client(
+            ComputeManagementClient(credential, self.subscription_id, **AZURE_NO_RETRIES), 'compute'
+        )
+        self.cost_client = self.instrument_client(
+            CostManagementClient(credential, **AZURE_NO_RETRIES), 'costmanagement'
+        )
     
     def detect_anomalies(self) -> List[Dict]:
         findings = []
@@ -37,3 +46,36 @@ class AzureDetector(BaseDetector):
             pass
         
         return findings
+    
+    def _detect_unattached_disks(self) -> List[Dict]:
+        """Detect managed disks not attached to any VM"""
+        findings = []
+        
+        for disk in self.compute_client.disks.list():
+            if disk.disk_state != 'Unattached':
+                continue
+            
+            # Skip disks created in the last 7 days (likely still being set up)
+            age_days = (detector_now() - disk.time_created.replace(tzinfo=None)).days if disk.time_created else 0
+            if age_days <= 7:
+                continue
+            
+            size_gb = disk.disk_size_gb or 0
+            findings.append({
+                'cloud_provider': 'azure',
+                'resource_id': disk.id,
+                'resource_type': 'managed_disk',
+                'anomaly_type': 'orphaned_resource',
+                'tags': dict(disk.tags or {}),
+                'severity': 'medium',
+                'cost_impact': size_gb * 0.05,  # Approx $0.05/GB-month (Standard SSD)
+                'details': {
+                    'name': disk.name,
+                    'size_gb': size_gb,
+                    'sku': disk.sku.name if disk.sku else None,
+                    'age_days': age_days,
+                    'recommendation': 'Delete this unused disk or snapshot it first'
+                }
+            })
+        
+        return findings
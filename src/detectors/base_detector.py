@@ -2,23 +2,66 @@ import os
 
 import json
 
-import time
-from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
-import boto3
-from azure.identity import DefaultAzureCredential
-from azure.mgmt.costmanagement import CostManagementClient
-from google.cloud import billing_v1
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+from src.monitoring.metrics import (
+    ALERT_SEND_DURATION,
+    ANOMALIES_AUTO_RESOLVED,
+    DB_QUERY_DURATION,
+    FINDINGS_TOTAL,
+    InstrumentedClient,
+    instrument_rule,
+)
+from .cloud_client import ResilientClient
+from .replay import REPLAY, detector_mode, replay_db_connection, wrap_for_mode
+
+logger = logging.getLogger(__name__)
+
+
+def spike_severity(daily_cost: float, critical_threshold: float, high_threshold: float = 0.0) -> str:
+    """Severity of a cost spike from the day's spend
+    
+    With the default ``high_threshold`` of 0 every non-critical spike is
+    'high' (and pages Slack); a higher value routes smaller spikes to 'medium'.
+    """
+    if daily_cost > critical_threshold:
+        return 'critical'
+    if daily_cost > high_threshold:
+        return 'high'
+    return 'medium'
+
 
 class BaseDetector:
     """Base class for all cloud detectors"""
     
-    def __init__(self):
-        self.db_conn = self._get_db_connection()
+    cloud_provider = None  # Set by subclasses ('aws', 'azure', 'gcp')
+    
+    # Rule name -> (resource_type, anomaly_type) pairs the rule re-checks on every run.
+    # Open anomalies of a completed rule that it no longer reports are auto-resolved.
+    RULE_COVERAGE = {}
+    
+    def __init_subclass__(cls, **kwargs):
+        """Time every ``_detect_*`` rule defined on a subclass"""
+        super().__init_subclass__(**kwargs)
+        for name, value in list(vars(cls).items()):
+            if name.startswith('_detect_') and callable(value):
+                setattr(cls, name, instrument_rule(value, name[len('_detect_'):]))
+    
+    def __init__(self, db_conn=None):
+        self.replaying = detector_mode() == REPLAY
+        if self.replaying:
+            # A replayed run must not write findings into the live database
+            self.db_conn = replay_db_connection()
+        else:
+            self.db_conn = db_conn or self._get_db_connection()
         self.critical_threshold = float(os.getenv('CRITICAL_THRESHOLD', '1000'))  # $1000/day spike
         self.high_threshold = float(os.getenv('HIGH_THRESHOLD', '500'))  # $500/day spike
+        self.completed_rules = []
+        self.failed_rules = []
+        self.run_started_at = datetime.utcnow()
         
     def _get_db_connection(self):
         """Get PostgreSQL connection"""
@@ -30,34 +73,236 @@ class BaseDetector:
             port=os.getenv('DB_PORT', '5432')
         )
     
+    def instrument_client(self, client, service: str):
+        """Wrap a cloud SDK client so its API calls are measured, rate limited,
+        retried on throttling and cached when read-only; DETECTOR_MODE=record
+        or replay saves or serves the responses under REPLAY_DIR"""
+        scope = '/'.join(filter(None, (getattr(self, 'account_id', None), getattr(self, 'region', None))))
+        client = wrap_for_mode(InstrumentedClient(client, self.cloud_provider, service),
+                               self.cloud_provider, service, scope)
+        return ResilientClient(client, self.cloud_provider, service, scope)
+    
+    def run_rules(self, rules) -> List[Dict]:
+        """Run detection rules, recording a failed rule in ``failed_rules`` instead of aborting the run"""
+        findings = []
+        for rule in rules:
+            try:
+                findings.extend(rule())
+                self.completed_rules.append(rule.__name__)
+            except Exception:
+                self.failed_rules.append(rule.__name__)
+                logger.exception("Detection rule failed", extra={
+                    'cloud': self.cloud_provider,
+                    'rule': rule.__name__
+                })
+        return findings
+    
     def detect_anomalies(self) -> List[Dict]:
         """Main detection method to be implemented by subclasses"""
         raise NotImplementedError
     
+    def start_run(self):
+        """Reset per-run bookkeeping used by ``reconcile``"""
+        self.completed_rules = []
+        self.failed_rules = []
+        self.run_started_at = datetime.utcnow()
+    
+    def reconcile(self, findings: List[Dict], scope: Optional[Dict] = None) -> int:
+        """Resolve open anomalies that this run's completed rules no longer report
+        
+        One set-based UPDATE: candidate rows are the open anomalies detected
+        before this run whose (resource_type, anomaly_type) a completed rule
+        covers and whose details contain ``scope``; those with no matching
+        (resource_id, anomaly_type) among ``findings`` are resolved, as are
+        older open duplicates of a newer open row. Rules that failed keep
+        their anomalies open.
+        """
+        covered = [pair for rule in self.completed_rules for pair in self.RULE_COVERAGE.get(rule, ())]
+        # A replayed run says nothing about the current state of the fleet
+        if not covered or self.replaying:
+            return 0
+        
+        with DB_QUERY_DURATION.labels(query='reconcile_anomalies').time(), \
+                self.db_conn.cursor() as cur:
+            cur.execute("""
+                UPDATE cost_anomalies a
+                SET status = 'resolved', resolved_at = NOW(), resolved_by = 'auto-reconciler'
+                WHERE a.status = 'open'
+                  AND a.detected_at < %(run_started_at)s
+                  AND (%(cloud)s IS NULL OR a.cloud_provider = %(cloud)s)
+                  AND COALESCE(a.details, '{}') @> %(scope)s::jsonb
+                  AND (a.resource_type, a.anomaly_type) IN (
+                      SELECT * FROM unnest(%(resource_types)s::text[], %(anomaly_types)s::text[]))
+                  AND (
+                      NOT EXISTS (
+                          SELECT 1 FROM unnest(%(resource_ids)s::text[], %(finding_types)s::text[]) AS f(resource_id, anomaly_type)
+                          WHERE f.resource_id = a.resource_id AND f.anomaly_type = a.anomaly_type)
+                      -- Duplicates left by earlier versions that inserted a row per cycle
+                      OR EXISTS (
+                          SELECT 1 FROM cost_anomalies b
+                          WHERE b.status = 'open' AND b.id > a.id
+                            AND b.cloud_provider = a.cloud_provider
+                            AND b.resource_id = a.resource_id
+                            AND b.anomaly_type = a.anomaly_type
+                            AND b.details->>'account_id' IS NOT DISTINCT FROM a.details->>'account_id'
+                            AND b.details->>'region' IS NOT DISTINCT FROM a.details->>'region'
+                            AND b.details->>'date' IS NOT DISTINCT FROM a.details->>'date'))
+            """, {
+                'run_started_at': self.run_started_at,
+                'cloud': self.cloud_provider if self.cloud_provider != 'all' else None,
+                'scope': json.dumps(scope or {}),
+                'resource_types': [resource_type for resource_type, _ in covered],
+                'anomaly_types': [anomaly_type for _, anomaly_type in covered],
+                'resource_ids': [f['resource_id'] for f in findings],
+                'finding_types': [f['anomaly_type'] for f in findings]
+            })
+            resolved = cur.rowcount
+            self.db_conn.commit()
+        
+        if resolved:
+            ANOMALIES_AUTO_RESOLVED.labels(cloud=self.cloud_provider).inc(resolved)
+            logger.info("Auto-resolved anomalies", extra={
+                'cloud': self.cloud_provider,
+                'resolved': resolved,
+                'rules': self.completed_rules
+            })
+        return resolved
+    
     def save_finding(self, finding: Dict):
-        """Save detection to database"""
-        with self.db_conn.cursor(cursor_factory=RealDictCursor) as cur:
+        """Save detection to database
+        
+        A finding that is already open for the same resource, anomaly type and
+        account/region (and day, for daily findings) refreshes that row instead
+        of adding another, so re-detection every cycle keeps a single open row.
+        """
+        details = finding.get('details', {})
+        with DB_QUERY_DURATION.labels(query='upsert_anomaly').time(), \
+                self.db_conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute("""
-                INSERT INTO cost_anomalies 
-                (cloud_provider, resource_id, resource_type, anomaly_type, 
-                 detected_at, cost_impact, severity, details, status)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 'open')
-                RETURNING id
-            """, (
-                finding['cloud_provider'],
-                finding['resource_id'],
-                finding['resource_type'],
-                finding['anomaly_type'],
-                datetime.utcnow(),
-                finding.get('cost_impact', 0),
-                finding.get('severity', 'medium'),
-                json.dumps(finding.get('details', {}))
-            ))
+                WITH existing AS (
+                    SELECT id FROM cost_anomalies
+                    WHERE status = 'open'
+                      AND cloud_provider = %(cloud_provider)s
+                      AND resource_id = %(resource_id)s
+                      AND anomaly_type = %(anomaly_type)s
+                      AND details->>'account_id' IS NOT DISTINCT FROM %(account_id)s
+                      AND details->>'region' IS NOT DISTINCT FROM %(region)s
+                      AND details->>'date' IS NOT DISTINCT FROM %(date)s
+                    ORDER BY id DESC
+                    LIMIT 1
+                ), refreshed AS (
+                    UPDATE cost_anomalies a
+                    SET cost_impact = %(cost_impact)s, severity = %(severity)s,
+                        details = %(details)s, tags = %(tags)s
+                    FROM existing
+                    WHERE a.id = existing.id
+                    RETURNING a.id
+                ), inserted AS (
+                    INSERT INTO cost_anomalies 
+                    (cloud_provider, resource_id, resource_type, anomaly_type, 
+                     detected_at, cost_impact, severity, details, tags, status)
+                    SELECT %(cloud_provider)s, %(resource_id)s, %(resource_type)s, %(anomaly_type)s,
+                           %(detected_at)s, %(cost_impact)s, %(severity)s, %(details)s, %(tags)s, 'open'
+                    WHERE NOT EXISTS (SELECT 1 FROM existing)
+                    RETURNING id
+                )
+                SELECT id FROM refreshed
+                UNION ALL
+                SELECT id FROM inserted
+            """, {
+                'cloud_provider': finding['cloud_provider'],
+                'resource_id': finding['resource_id'],
+                'resource_type': finding['resource_type'],
+                'anomaly_type': finding['anomaly_type'],
+                'account_id': self._detail_text(details, 'account_id'),
+                'region': self._detail_text(details, 'region'),
+                'date': self._detail_text(details, 'date'),
+                'detected_at': datetime.utcnow(),
+                'cost_impact': finding.get('cost_impact', 0),
+                'severity': finding.get('severity', 'medium'),
+                'details': json.dumps(details),
+                'tags': json.dumps(finding.get('tags', {}))
+            })
+            self.db_conn.commit()
+            finding_id = cur.fetchone()['id']
+        
+        FINDINGS_TOTAL.labels(
+            cloud=finding['cloud_provider'],
+            anomaly_type=finding['anomaly_type'],
+            severity=finding.get('severity', 'medium')
+        ).inc()
+        return finding_id
+    
+    @staticmethod
+    def _detail_text(details: Dict, key: str) -> Optional[str]:
+        """``details->>key`` as Postgres would return it"""
+        value = details.get(key)
+        return None if value is None else str(value)
+    
+    def save_daily_costs(self, account_id: str, costs: List[tuple]):
+        """Upsert (date, service, amount) rows into the daily cost history"""
+        if not costs:
+            return
+        with DB_QUERY_DURATION.labels(query='upsert_daily_costs').time(), \
+                self.db_conn.cursor() as cur:
+            execute_values(cur, """
+                INSERT INTO daily_costs (usage_date, cloud_provider, account_id, service, amount)
+                VALUES %s
+                ON CONFLICT (usage_date, cloud_provider, account_id, service)
+                DO UPDATE SET amount = EXCLUDED.amount, updated_at = CURRENT_TIMESTAMP
+            """, [(date, self.cloud_provider, account_id, service, amount) for date, service, amount in costs])
+            self.db_conn.commit()
+    
+    def collection_due(self, table: str, account_id: str) -> bool:
+        """True if ``table`` was not refreshed for this account in the last hour"""
+        with self.db_conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT MAX(updated_at) > NOW() - INTERVAL '1 hour'
+                FROM {table}
+                WHERE cloud_provider = %s AND account_id = %s
+            """, (self.cloud_provider, account_id))
+            fresh = cur.fetchone()[0]
+        self.db_conn.rollback()
+        return not fresh
+    
+    def save_hourly_usage(self, account_id: str, usage: List[tuple]):
+        """Upsert (hour, region, family, units, on-demand cost) rows into the usage history"""
+        if not usage:
+            return
+        with DB_QUERY_DURATION.labels(query='upsert_hourly_usage').time(), \
+                self.db_conn.cursor() as cur:
+            execute_values(cur, """
+                INSERT INTO hourly_usage
+                (usage_hour, cloud_provider, account_id, region, instance_family, usage_units, on_demand_cost)
+                VALUES %s
+                ON CONFLICT (usage_hour, cloud_provider, account_id, region, instance_family)
+                DO UPDATE SET usage_units = EXCLUDED.usage_units,
+                              on_demand_cost = EXCLUDED.on_demand_cost,
+                              updated_at = CURRENT_TIMESTAMP
+            """, [(hour, self.cloud_provider, account_id, region, family, units, cost)
+                  for hour, region, family, units, cost in usage])
+            self.db_conn.commit()
+    
+    def save_tag_costs(self, account_id: str, tag_key: str, costs: List[tuple]):
+        """Upsert (date, service, tag value, amount) rows for one cost allocation tag"""
+        if not costs:
+            return
+        with DB_QUERY_DURATION.labels(query='upsert_tag_costs').time(), \
+                self.db_conn.cursor() as cur:
+            execute_values(cur, """
+                INSERT INTO daily_tag_costs
+                (usage_date, cloud_provider, account_id, service, tag_key, tag_value, amount)
+                VALUES %s
+                ON CONFLICT (usage_date, cloud_provider, account_id, service, tag_key, tag_value)
+                DO UPDATE SET amount = EXCLUDED.amount, updated_at = CURRENT_TIMESTAMP
+            """, [(date, self.cloud_provider, account_id, service, tag_key, value, amount)
+                  for date, service, value, amount in costs])
             self.db_conn.commit()
-            return cur.fetchone()['id']
     
     def trigger_alert(self, finding: Dict):
         """Trigger alert based on severity"""
+        if self.replaying:
+            return
         if finding.get('severity') == 'critical':
             self._send_slack_alert(finding)
             self._create_jira_ticket(finding)
@@ -67,7 +312,8 @@ class BaseDetector:
     def _send_slack_alert(self, finding: Dict):
         """Send Slack alert"""
         from src.alerting.slack_alert import send_slack_alert
-        send_slack_alert(finding)
+        with ALERT_SEND_DURATION.labels(channel='slack').time():
+            send_slack_alert(finding)
     
     def _create_jira_ticket(self, finding: Dict):
         """Create Jira ticket for critical issues"""
@@ -0,0 +1,91 @@
+from typing import Dict, List
+import numpy as np
+from .base_detector import BaseDetector
+from .replay import detector_now
+from src.analytics.forecast import forecast_budgets, load_budgets, load_cost_history
+import os
+
+
+class BudgetDetector(BaseDetector):
+    """Raise findings for budgets that the month-end forecast will exceed"""
+    
+    cloud_provider = 'all'
+    
+    RULE_COVERAGE = {
+        '_detect_budget_breaches': [('budget', 'budget_breach_predicted')]
+    }
+    
+    def __init__(self, db_conn=None):
+        super().__init__(db_conn=db_conn)
+        self.history_days = int(os.getenv('FORECAST_HISTORY_DAYS', '90'))
+        self.confidence = float(os.getenv('FORECAST_CONFIDENCE', '0.95'))
+    
+    def detect_anomalies(self) -> List[Dict]:
+        self.start_run()
+        findings = self.run_rules([self._detect_budget_breaches])
+        
+        for finding in findings:
+            # An open breach for the budget is refreshed rather than duplicated
+            finding['id'] = self.save_finding(finding)
+            if self._claim_monthly_alert(finding['details']['budget_id'], finding['details']['month']):
+                self.trigger_alert(finding)
+        
+        self.reconcile(findings)
+        return findings
+    
+    def _detect_budget_breaches(self) -> List[Dict]:
+        """Forecast every budget scope and flag projected overruns"""
+        findings = []
+        
+        budgets = load_budgets(self.db_conn)
+        if not budgets:
+            return findings
+        
+        keys, dates, costs = load_cost_history(self.db_conn, self.history_days)
+        
+        # Cost Explorer's end date is exclusive, so on the 1st the newest
+        # stored day is still in last month: wait for this month's first day
+        month = np.datetime64(detector_now().date(), 'M')
+        if not len(dates) or dates[-1] < month.astype('datetime64[D]'):
+            return findings
+        
+        for status in forecast_budgets(dates, costs, keys, budgets, self.confidence, month):
+            # A scope with no spend stored this month has nothing to project from
+            if not status['breach_predicted'] or not status['month_to_date']:
+                continue
+            
+            scope = '/'.join(part for part in (status['account_id'], status['service']) if part) or 'all'
+            findings.append({
+                'cloud_provider': status['cloud_provider'],
+                'resource_id': f"budget:{status['budget_id']}",
+                'resource_type': 'budget',
+                'anomaly_type': 'budget_breach_predicted',
+                # Critical when even the lower confidence bound is over budget
+                'severity': 'critical' if status['breach_certain'] else 'high',
+                'cost_impact': status['projected_month_end'] - status['budget'],
+                'details': {
+                    'budget_id': status['budget_id'],
+                    'month': str(month.astype('datetime64[D]')),
+                    'scope': scope,
+                    'budget': status['budget'],
+                    'month_to_date': status['month_to_date'],
+                    'projected_month_end': status['projected_month_end'],
+                    'confidence_interval': [status['lower'], status['upper']],
+                    'recommendation': 'Projected spend exceeds the monthly budget; review the largest services in this scope'
+                }
+            })
+        
+        return findings
+    
+    def _claim_monthly_alert(self, budget_id: int, month: str) -> bool:
+        """True the first time a budget breaches in ``month`` (its first day)"""
+        with self.db_conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO budget_alerts (budget_id, month)
+                VALUES (%s, %s::date)
+                ON CONFLICT (budget_id, month) DO NOTHING
+                RETURNING budget_id
+            """, (budget_id, month))
+            claimed = cur.fetchone() is not None
+        self.db_conn.commit()
+        return claimed
@@ -0,0 +1,274 @@
+import os
+import time
+import random
+import logging
+import threading
+import functools
+from typing import Dict, Tuple
+from src.monitoring.metrics import (
+    CIRCUIT_STATE,
+    CLIENT_CACHE_REQUESTS,
+    CLIENT_RATE_LIMIT,
+    InstrumentedClient,
+    is_throttle_error,
+)
+
+logger = logging.getLogger(__name__)
+
+# Operation name prefixes that never change cloud state and may be cached
+READ_ONLY_PREFIXES = ('describe_', 'get_', 'list')
+
+# Client helpers that match READ_ONLY_PREFIXES but make no API call
+LOCAL_HELPERS = {'get_paginator', 'get_waiter', 'can_paginate'}
+
+# ResilientClient owns retries: SDK clients it wraps are built with their own
+# retries off, so one call is never retried SDK attempts x our attempts times
+BOTO_NO_RETRIES = {'retries': {'mode': 'standard', 'total_max_attempts': 1}}
+AZURE_NO_RETRIES = {'retry_total': 0}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a service whose circuit breaker is open"""
+
+
+def _is_transient_error(exc: Exception) -> bool:
+    """Throttles, 5xx responses and connection failures are worth retrying"""
+    if is_throttle_error(exc):
+        return True
+    response = getattr(exc, 'response', None)
+    if isinstance(response, dict):
+        status = response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0)
+        if status >= 500:
+            return True
+    status = getattr(exc, 'status_code', None)
+    if isinstance(status, int) and status >= 500:
+        return True
+    return type(exc).__name__ in ('EndpointConnectionError', 'ConnectTimeoutError', 'ReadTimeoutError',
+                                  'ServiceRequestError', 'ServiceResponseError')
+
+
+class AdaptiveRateLimiter:
+    """Token bucket whose rate halves on every throttle and creeps back up
+    on success (AIMD), so callers settle just below the service's limit.
+    """
+
+    def __init__(self, max_rate: float, min_rate: float = 0.5):
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.rate = max_rate
+        self._tokens = max_rate
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def on_throttle(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, self.rate)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive transient failures
+    (throttles, timeouts, 5xx) and rejects calls for ``reset_timeout``
+    seconds, then lets one trial call through.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return self.state == self.CLOSED
+
+    def on_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def on_ignored(self):
+        """A failed call that says nothing about the service's health (access
+        denied, bad request): nothing is counted, but a half-open trial is
+        given back so the next call can probe again"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic() - self.reset_timeout
+
+    def on_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+# Limiters and breakers are shared by every client for the same
+# (cloud, service, account/region) in this process, so short-lived detector
+# instances in a sharded sweep keep what earlier ones learned
+_limiters: Dict[Tuple[str, str, str], AdaptiveRateLimiter] = {}
+_breakers: Dict[Tuple[str, str, str], CircuitBreaker] = {}
+_cache_counts: Dict[Tuple[str, str], Dict[str, int]] = {}
+_registry_lock = threading.Lock()
+
+
+def _shared(key: Tuple[str, str, str]):
+    with _registry_lock:
+        if key not in _limiters:
+            _limiters[key] = AdaptiveRateLimiter(float(os.getenv('CLIENT_MAX_RATE', '20')))
+            _breakers[key] = CircuitBreaker(
+                int(os.getenv('CLIENT_BREAKER_FAILURES', '5')),
+                float(os.getenv('CLIENT_BREAKER_RESET_SECONDS', '60'))
+            )
+        return _limiters[key], _breakers[key]
+
+
+def client_stats() -> Dict:
+    """Current limiter rates, breaker states and cache hit/miss counts"""
+    with _registry_lock:
+        return {
+            'clients': [
+                {
+                    'cloud': cloud,
+                    'service': service,
+                    'scope': scope,
+                    'rate_per_second': round(_limiters[(cloud, service, scope)].rate, 2),
+                    'circuit': _breakers[(cloud, service, scope)].state
+                }
+                for cloud, service, scope in _limiters
+            ],
+            'cache': [
+                {'cloud': cloud, 'service': service, **counts}
+                for (cloud, service), counts in _cache_counts.items()
+            ]
+        }
+
+
+def _is_operation_group(obj) -> bool:
+    # Record/replay proxies flag their operation groups explicitly
+    return (isinstance(obj, InstrumentedClient) or getattr(obj, '_operation_group', False)
+            or type(obj).__name__.endswith('Operations'))
+
+
+class ResilientClient:
+    """Proxy adding rate limiting, jittered retries, a circuit breaker and a
+    short-TTL response cache for read-only calls to a cloud SDK client.
+
+    Cached responses are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, client, cloud: str, service: str, scope: str = '', prefix: str = '', cache: Dict = None):
+        self._client = client
+        self._cloud = cloud
+        self._service = service
+        self._scope = scope
+        self._prefix = prefix
+        self._limiter, self._breaker = _shared((cloud, service, scope))
+        self._cache = cache if cache is not None else {}
+        self._cache_ttl = float(os.getenv('CLIENT_CACHE_TTL_SECONDS', '60'))
+        self._max_retries = int(os.getenv('CLIENT_MAX_RETRIES', '5'))
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith('_'):
+            return attr
+        if _is_operation_group(attr):
+            return ResilientClient(attr, self._cloud, self._service, self._scope,
+                                   f"{self._prefix}{name}.", self._cache)
+        if not callable(attr) or isinstance(attr, type) or name in LOCAL_HELPERS:
+            return attr
+
+        operation = f"{self._prefix}{name}"
+        cacheable = name.startswith(READ_ONLY_PREFIXES) and self._cache_ttl > 0
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            if cacheable:
+                key = (operation, repr(args), repr(sorted(kwargs.items())))
+                cached = self._cache.get(key)
+                if cached is not None and time.monotonic() - cached[0] < self._cache_ttl:
+                    self._count_cache('hit')
+                    return cached[1]
+                self._count_cache('miss')
+
+            result = self._call_with_retries(operation, attr, args, kwargs)
+
+            if cacheable:
+                # Azure list operations return single-use pagers
+                if not isinstance(result, (dict, list, str)) and hasattr(result, '__iter__'):
+                    result = list(result)
+                self._cache[key] = (time.monotonic(), result)
+            return result
+
+        return call
+
+    def _count_cache(self, outcome: str):
+        CLIENT_CACHE_REQUESTS.labels(cloud=self._cloud, service=self._service, outcome=outcome).inc()
+        with _registry_lock:
+            counts = _cache_counts.setdefault((self._cloud, self._service), {'hit': 0, 'miss': 0})
+            counts[outcome] += 1
+
+    def _call_with_retries(self, operation: str, func, args, kwargs):
+        labels = {'cloud': self._cloud, 'service': self._service}
+
+        if not self._breaker.allow():
+            raise CircuitOpenError(f"{self._cloud} {self._service} circuit is open; skipping {operation}")
+
+        for attempt in range(self._max_retries + 1):
+            self._limiter.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if is_throttle_error(e):
+                    self._limiter.on_throttle()
+                    CLIENT_RATE_LIMIT.labels(**labels).set(self._limiter.rate)
+                # Only throttles, timeouts and 5xx count towards opening the breaker
+                if not _is_transient_error(e):
+                    self._breaker.on_ignored()
+                    raise
+                if attempt == self._max_retries:
+                    self._breaker.on_failure()
+                    CIRCUIT_STATE.labels(**labels).set(self._breaker.state == CircuitBreaker.OPEN)
+                    raise
+                # Full jitter: sleep anywhere up to the exponential cap
+                delay = random.uniform(0, min(20.0, 0.5 * 2 ** attempt))
+                logger.warning("Retrying cloud API call", extra={
+                    'cloud': self._cloud,
+                    'service': self._service,
+                    'operation': operation,
+                    'attempt': attempt + 1,
+                    'delay_seconds': round(delay, 2),
+                    'error': type(e).__name__
+                })
+                time.sleep(delay)
+                continue
+
+            self._limiter.on_success()
+            self._breaker.on_success()
+            CLIENT_RATE_LIMIT.labels(**labels).set(self._limiter.rate)
+            CIRCUIT_STATE.labels(**labels).set(0)
+            return result
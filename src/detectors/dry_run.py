@@ -0,0 +1,79 @@
+import logging
+from typing import List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _NullRow(dict):
+    """Row that reads as NULL by position or by column name"""
+
+    def __getitem__(self, key):
+        return None
+
+
+class DryRunCursor:
+    """Cursor that records statements and returns no rows"""
+
+    def __init__(self, connection, name=None):
+        self.connection = connection
+        self.name = name
+        self.itersize = 2000
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        return iter([])
+
+    def execute(self, query, params=None):
+        if isinstance(query, bytes):
+            query = query.decode()
+        self.connection.statements.append((' '.join(str(query).split()), params))
+        logger.debug("Dry-run statement", extra={'query': ' '.join(str(query).split())[:200]})
+
+    def mogrify(self, query, params=None) -> bytes:
+        # Only used by execute_values to build the VALUES list
+        return repr(params).encode()
+
+    def fetchone(self):
+        return _NullRow()
+
+    def fetchall(self) -> List:
+        return []
+
+    def fetchmany(self, size=None) -> List:
+        return []
+
+    def close(self):
+        pass
+
+
+class DryRunConnection:
+    """Stand-in for a psycopg2 connection that never touches a database.
+
+    Writes are recorded in ``statements`` instead of being sent; reads
+    return no rows (or a row of NULLs from ``fetchone``), so detectors run
+    end to end without Postgres.
+    """
+
+    encoding = 'UTF8'
+
+    def __init__(self):
+        self.statements: List[Tuple[str, object]] = []
+        self.closed = 0
+
+    def cursor(self, name=None, cursor_factory=None):
+        return DryRunCursor(self, name)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
@@ -0,0 +1,117 @@
+import os
+import json
+import hashlib
+from pathlib import Path
+from typing import Iterable, Optional
+import numpy as np
+
+# Number of most recent slots fetched again every cycle, because CloudWatch
+# keeps filling in the latest periods for a few minutes after they close
+REFRESH_OVERLAP_SLOTS = 2
+
+
+class MetricStore:
+    """Append-only on-disk ring buffers of metric datapoints.
+
+    Each (resource, metric) series is a memory-mapped float32 ``.npy`` file
+    holding ``capacity`` slots; absolute slot ``n`` (``epoch // period``)
+    lives at position ``n % capacity``, so appending never moves data and
+    old slots are overwritten in place. ``index.json`` records the newest
+    slot written for every series.
+    """
+
+    def __init__(self, root: str, period: int, days: int):
+        self.period = period
+        self.capacity = int(days * 86400 // period)
+        self.root = Path(root) / f"p{period}"
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._index_path = self.root / 'index.json'
+        self._index = {}
+        if self._index_path.exists():
+            with open(self._index_path) as f:
+                self._index = json.load(f)
+
+    @staticmethod
+    def key(resource_id: str, metric: str) -> str:
+        return hashlib.sha1(f"{resource_id}|{metric}".encode()).hexdigest()[:24]
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}.npy"
+
+    def _open(self, key: str, mode: str = 'r+'):
+        path = self._path(key)
+        if not path.exists():
+            ring = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(self.capacity,))
+            ring[:] = np.nan
+            return ring
+        ring = np.load(path, mmap_mode=mode)
+        if ring.shape != (self.capacity,):
+            # Window length changed; start this series over
+            path.unlink()
+            return self._open(key, mode)
+        return ring
+
+    def last_slot(self, resource_id: str, metric: str) -> Optional[int]:
+        entry = self._index.get(self.key(resource_id, metric))
+        return entry['last_slot'] if entry else None
+
+    def fetch_start(self, resource_id: str, metric: str, window_start: int) -> int:
+        """First slot that must be fetched from the cloud API for this series"""
+        last = self.last_slot(resource_id, metric)
+        if last is None or last < window_start:
+            return window_start
+        return max(window_start, last + 1 - REFRESH_OVERLAP_SLOTS)
+
+    def write(self, resource_id: str, metric: str, fetched_from: int, fetched_to: int,
+              slots: np.ndarray, values: np.ndarray):
+        """Store a fetched range [fetched_from, fetched_to] and its datapoints.
+
+        The whole range is cleared first so ring positions left over from
+        an earlier lap never masquerade as new data.
+        """
+        key = self.key(resource_id, metric)
+        ring = self._open(key)
+
+        span = np.arange(max(fetched_from, fetched_to - self.capacity + 1), fetched_to + 1)
+        ring[span % self.capacity] = np.nan
+
+        keep = (slots >= span[0]) & (slots <= fetched_to)
+        ring[slots[keep] % self.capacity] = values[keep]
+        ring.flush()
+        del ring
+
+        self._index[key] = {
+            'resource_id': resource_id,
+            'metric': metric,
+            'last_slot': int(fetched_to)
+        }
+
+    def read(self, resource_id: str, metric: str, start_slot: int, n_slots: int) -> np.ndarray:
+        """Series for slots [start_slot, start_slot + n_slots), NaN where unknown"""
+        out = np.full(n_slots, np.nan, dtype=np.float32)
+        last = self.last_slot(resource_id, metric)
+        if last is None:
+            return out
+
+        slots = np.arange(start_slot, start_slot + n_slots)
+        valid = (slots <= last) & (slots > last - self.capacity)
+        ring = self._open(self.key(resource_id, metric), mode='r')
+        out[valid] = ring[slots[valid] % self.capacity]
+        del ring
+        return out
+
+    def evict(self, keep_resource_ids: Iterable[str]) -> int:
+        """Delete series whose resource no longer exists; returns the count"""
+        keep = set(keep_resource_ids)
+        stale = [key for key, entry in self._index.items() if entry['resource_id'] not in keep]
+        for key in stale:
+            self._path(key).unlink(missing_ok=True)
+            del self._index[key]
+        return len(stale)
+
+    def save(self):
+        """Persist the index atomically"""
+        tmp_path = self._index_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self._index_path)
@@ -0,0 +1,238 @@
+import os
+import json
+import pickle
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Tuple
+from src.monitoring.metrics import InstrumentedClient
+from .dry_run import DryRunConnection
+from .trusted_files import app_data_dir, check_trusted, make_private_dirs
+
+logger = logging.getLogger(__name__)
+
+# DETECTOR_MODE=record saves every cloud API response of a run under
+# REPLAY_DIR; DETECTOR_MODE=replay answers the same calls from those files
+# without touching the cloud, writes to a scratch or dry-run database and
+# sends no alerts. Layout:
+#   <REPLAY_DIR>/<cloud>/<scope>/<service>/<operation>/<seq>-<call key>.pkl
+#   <REPLAY_DIR>/manifest.json    capture time that replayed runs use as "now"
+# Recordings are pickles: REPLAY_DIR must belong to the detector's user.
+RECORD, REPLAY = 'record', 'replay'
+MANIFEST = 'manifest.json'
+
+
+def detector_mode() -> str:
+    return os.getenv('DETECTOR_MODE', '').lower()
+
+
+_replay_db = {}
+
+
+def replay_db_connection():
+    """Scratch database named by REPLAY_DB_NAME, or a dry-run connection;
+    shared by every detector replayed in this process"""
+    conn = _replay_db.get('conn')
+    if conn is not None and not conn.closed:
+        return conn
+    if not os.getenv('REPLAY_DB_NAME'):
+        conn = DryRunConnection()
+    else:
+        import psycopg2
+        conn = psycopg2.connect(
+            dbname=os.getenv('REPLAY_DB_NAME'),
+            user=os.getenv('REPLAY_DB_USER', os.getenv('DB_USER', 'postgres')),
+            password=os.getenv('REPLAY_DB_PASSWORD', os.getenv('DB_PASSWORD', 'postgres')),
+            host=os.getenv('REPLAY_DB_HOST', os.getenv('DB_HOST', 'localhost')),
+            port=os.getenv('REPLAY_DB_PORT', os.getenv('DB_PORT', '5432'))
+        )
+    _replay_db['conn'] = conn
+    return conn
+
+
+def _replay_dir() -> Path:
+    return Path(os.getenv('REPLAY_DIR') or app_data_dir('replay'))
+
+
+def replay_root(cloud: str, service: str, scope: str = '') -> Path:
+    return _replay_dir() / cloud / (scope.replace('/', '_') or 'default') / service
+
+
+_clock = {}
+
+
+def detector_now() -> datetime:
+    """Current UTC time, or the capture time of the recording when replaying.
+
+    Rules derive their time windows (utilization slots, Cost Explorer dates,
+    resource ages) from this, so a replay sees the windows of the recorded
+    run. The first call of a recording process stores the capture time.
+    """
+    mode = detector_mode()
+    manifest = _replay_dir() / MANIFEST
+    if mode == REPLAY:
+        if manifest not in _clock:
+            try:
+                _clock[manifest] = datetime.fromisoformat(json.loads(manifest.read_text())['recorded_at'])
+            except (OSError, ValueError, KeyError):
+                logger.warning("No capture time recorded; replaying against the current time",
+                               extra={'path': str(manifest)})
+                _clock[manifest] = None
+        return _clock[manifest] or datetime.utcnow()
+
+    now = datetime.utcnow()
+    if mode == RECORD and manifest not in _clock:
+        _clock[manifest] = now
+        if not manifest.exists():
+            make_private_dirs(manifest.parent)
+            tmp_path = manifest.with_suffix('.tmp')
+            tmp_path.write_text(json.dumps({'recorded_at': now.isoformat()}))
+            os.replace(tmp_path, manifest)
+    return now
+
+
+class ReplayMissError(LookupError):
+    """Raised in replay mode for a call that was never recorded"""
+
+
+def _call_key(args, kwargs) -> str:
+    # Parameters such as StartTime move between record and replay; the key
+    # only has to match exactly for calls whose parameters are stable
+    payload = json.dumps([args, kwargs], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def _is_group(obj) -> bool:
+    return isinstance(obj, InstrumentedClient) or type(obj).__name__.endswith('Operations')
+
+
+_sequence_lock = threading.Lock()
+_sequences = {}
+
+
+def _next_sequence(directory: Path) -> int:
+    """Per-operation call counter; appends after anything already recorded"""
+    with _sequence_lock:
+        if directory not in _sequences:
+            _sequences[directory] = len(list(directory.glob('*.pkl'))) if directory.exists() else 0
+        seq = _sequences[directory]
+        _sequences[directory] += 1
+        return seq
+
+
+class RecordingClient:
+    """Proxy that passes calls through and pickles each response (or error)"""
+
+    _operation_group = False
+
+    def __init__(self, client, root: Path, prefix: str = ''):
+        self._client = client
+        self._root = root
+        self._prefix = prefix
+        self._operation_group = bool(prefix)
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith('_'):
+            return attr
+        if _is_group(attr):
+            return RecordingClient(attr, self._root, f"{self._prefix}{name}.")
+        if not callable(attr) or isinstance(attr, type):
+            return attr
+
+        operation = f"{self._prefix}{name}"
+
+        def call(*args, **kwargs):
+            try:
+                result = attr(*args, **kwargs)
+            except Exception as e:
+                self._save(operation, args, kwargs, ('error', e))
+                raise
+            # Azure list operations return single-use pagers
+            if not isinstance(result, (dict, list, str, bytes)) and hasattr(result, '__iter__'):
+                result = list(result)
+            self._save(operation, args, kwargs, ('ok', result))
+            return result
+
+        return call
+
+    def _save(self, operation: str, args, kwargs, outcome: Tuple):
+        directory = self._root / operation
+        make_private_dirs(directory)
+        path = directory / f"{_next_sequence(directory):06d}-{_call_key(args, kwargs)}.pkl"
+        try:
+            data = pickle.dumps(outcome)
+        except Exception:
+            kind, value = outcome
+            data = pickle.dumps((kind, RuntimeError(f"{type(value).__name__}: {value}")))
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_bytes(data)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, path)
+
+
+class ReplayClient:
+    """Stand-in client that answers calls from a recording.
+
+    A call is matched to a recording with the same parameters if there is
+    one, otherwise to the next unused recording of that operation in call
+    order. Rules take their time windows from ``detector_now``, so replayed
+    calls normally carry the recorded parameters.
+    """
+
+    _operation_group = False
+
+    def __init__(self, root: Path, prefix: str = '', index: Dict = None):
+        self._root = root
+        self._prefix = prefix
+        self._operation_group = bool(prefix)
+        self._index = index if index is not None else self._load_index(root)
+
+    @staticmethod
+    def _load_index(root: Path) -> Dict[str, List]:
+        index = {}
+        if root.exists():
+            for directory in sorted(p for p in root.iterdir() if p.is_dir()):
+                calls = sorted(directory.glob('*.pkl'))
+                index[directory.name] = {'calls': calls, 'used': set()}
+        return index
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        operation = f"{self._prefix}{name}"
+        if any(op.startswith(f"{operation}.") for op in self._index):
+            return ReplayClient(self._root, f"{operation}.", self._index)
+
+        def call(*args, **kwargs):
+            entry = self._index.get(operation)
+            if not entry:
+                raise ReplayMissError(f"No recording for {operation} under {self._root}")
+            key = _call_key(args, kwargs)
+            matches = [p for p in entry['calls'] if p.stem.endswith(key)]
+            unused = [p for p in (matches or entry['calls']) if p not in entry['used']]
+            # Repeated identical calls reuse the last matching response
+            path = unused[0] if unused else (matches or entry['calls'])[-1]
+            entry['used'].add(path)
+            check_trusted(path, _replay_dir())
+            kind, value = pickle.loads(path.read_bytes())
+            if kind == 'error':
+                raise value
+            return value
+
+        return call
+
+
+def wrap_for_mode(client, cloud: str, service: str, scope: str = ''):
+    """Apply DETECTOR_MODE to an (instrumented) SDK client"""
+    mode = detector_mode()
+    if mode == RECORD:
+        return RecordingClient(client, replay_root(cloud, service, scope))
+    if mode == REPLAY:
+        root = replay_root(cloud, service, scope)
+        if not root.exists():
+            logger.warning("Nothing recorded for client", extra={'cloud': cloud, 'service': service, 'path': str(root)})
+        return ReplayClient(root)
+    return client
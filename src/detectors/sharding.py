@@ -0,0 +1,281 @@
+import os
+import argparse
+import logging
+import multiprocessing
+from collections import namedtuple
+from typing import Dict, List, Optional
+import boto3
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_values
+
+logger = logging.getLogger(__name__)
+
+# One account/region pair processed by a worker. Region 'global' is the
+# account-wide unit that runs the Cost Explorer rules.
+WorkUnit = namedtuple('WorkUnit', ['account_id', 'region'])
+
+GLOBAL_REGION = 'global'
+
+# Per-process state populated by _init_worker
+_worker = {}
+
+
+def _get_db_connection():
+    return psycopg2.connect(
+        dbname=os.getenv('DB_NAME', 'cloud_cost'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', 'postgres'),
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432')
+    )
+
+
+def _base_session():
+    return boto3.Session(
+        aws_access_key_id=os.getenv('AWS_ACCESS_KEY'),
+        aws_secret_access_key=os.getenv('AWS_SECRET_KEY'),
+        region_name=os.getenv('AWS_REGION', 'us-east-1')
+    )
+
+
+def _init_worker():
+    """Reset per-process state; connections are opened lazily by ``_run_unit``
+    
+    Nothing here may raise: a failing Pool initializer makes the pool respawn
+    workers forever and the sweep never returns.
+    """
+    _worker.clear()
+    _worker['credentials'] = {}
+
+
+def _ensure_worker():
+    """Open the worker's DB connection and STS client on first use"""
+    if _worker.get('db_conn') is None or _worker['db_conn'].closed:
+        _worker['db_conn'] = _get_db_connection()
+    if 'caller_account' not in _worker:
+        sts = _base_session().client('sts')
+        _worker['caller_account'] = sts.get_caller_identity()['Account']
+        _worker['sts'] = sts
+
+
+def _session_for(account_id: str, region: str):
+    """Assume the sweep role in ``account_id`` and return a regional session"""
+    if account_id == _worker['caller_account']:
+        return boto3.Session(
+            aws_access_key_id=os.getenv('AWS_ACCESS_KEY'),
+            aws_secret_access_key=os.getenv('AWS_SECRET_KEY'),
+            region_name=region
+        )
+
+    # Credentials are cached per account so every region of an account
+    # handled by this worker shares a single AssumeRole call
+    credentials = _worker['credentials'].get(account_id)
+    if credentials is None:
+        role_name = os.getenv('AWS_ASSUME_ROLE_NAME', 'OrganizationAccountAccessRole')
+        response = _worker['sts'].assume_role(
+            RoleArn=f"arn:aws:iam::{account_id}:role/{role_name}",
+            RoleSessionName='cost-anomaly-sweep'
+        )
+        credentials = response['Credentials']
+        _worker['credentials'][account_id] = credentials
+
+    return boto3.Session(
+        aws_access_key_id=credentials['AccessKeyId'],
+        aws_secret_access_key=credentials['SecretAccessKey'],
+        aws_session_token=credentials['SessionToken'],
+        region_name=region
+    )
+
+
+def _run_unit(unit: WorkUnit):
+    """Worker entry point: run detection for one account/region"""
+    try:
+        from src.detectors.aws_detector import AWSDetector
+
+        _ensure_worker()
+        if unit.region == GLOBAL_REGION:
+            session = _session_for(unit.account_id, os.getenv('AWS_REGION', 'us-east-1'))
+            scope = 'global'
+        else:
+            session = _session_for(unit.account_id, unit.region)
+            scope = 'regional'
+        detector = AWSDetector(session=session, account_id=unit.account_id, db_conn=_worker['db_conn'])
+        findings = detector.detect_anomalies(scope=scope)
+        # A failed rule must not mark the unit done, or it is never retried
+        if detector.failed_rules:
+            return unit, findings, f"Rules failed: {', '.join(detector.failed_rules)}"
+        return unit, findings, None
+    except Exception as e:
+        # Leave the connection usable for the next unit, or drop it so the
+        # next unit reconnects
+        conn = _worker.get('db_conn')
+        if conn is not None and not conn.closed:
+            try:
+                conn.rollback()
+            except Exception:
+                conn.close()
+        return unit, [], f"{type(e).__name__}: {e}"
+
+
+class ShardedAWSSweep:
+    """Coordinator that fans AWS detection out over accounts and regions.
+
+    Work units are handed to a process pool one at a time, so a worker that
+    finishes early immediately pulls the next pending unit instead of
+    waiting on a fixed partition. Every finished unit is checkpointed in
+    ``sweep_checkpoints``; an interrupted sweep is resumed on the next run.
+    """
+
+    cloud_provider = 'aws'
+
+    def __init__(self, processes: Optional[int] = None):
+        self.processes = processes or int(os.getenv('SWEEP_PROCESSES', str(os.cpu_count() or 4)))
+        self.max_attempts = int(os.getenv('SWEEP_MAX_ATTEMPTS', '3'))
+        self.session = _base_session()
+        if not os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+            logger.warning("PROMETHEUS_MULTIPROC_DIR is not set; rule, API and DB metrics "
+                           "recorded in sweep workers will not appear on /metrics")
+
+    def list_accounts(self) -> List[str]:
+        """Accounts to sweep: AWS_ACCOUNT_IDS, or every active org account"""
+        configured = os.getenv('AWS_ACCOUNT_IDS')
+        if configured:
+            return [a.strip() for a in configured.split(',') if a.strip()]
+
+        accounts = []
+        paginator = self.session.client('organizations').get_paginator('list_accounts')
+        for page in paginator.paginate():
+            accounts.extend(a['Id'] for a in page['Accounts'] if a['Status'] == 'ACTIVE')
+        return accounts
+
+    def list_regions(self) -> List[str]:
+        """Regions to sweep: AWS_SWEEP_REGIONS, or every enabled region"""
+        configured = os.getenv('AWS_SWEEP_REGIONS')
+        if configured:
+            return [r.strip() for r in configured.split(',') if r.strip()]
+
+        response = self.session.client('ec2').describe_regions()
+        return [r['RegionName'] for r in response['Regions']]
+
+    def build_work_units(self) -> List[WorkUnit]:
+        regions = self.list_regions()
+        units = []
+        for account_id in self.list_accounts():
+            units.append(WorkUnit(account_id, GLOBAL_REGION))
+            units.extend(WorkUnit(account_id, region) for region in regions)
+        return units
+
+    def _start_or_resume(self, conn) -> int:
+        """Return the id of the running sweep, creating one if needed"""
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT id FROM detection_sweeps
+                WHERE status = 'running'
+                ORDER BY started_at DESC
+                LIMIT 1
+            """)
+            row = cur.fetchone()
+            if row:
+                logger.info("Resuming interrupted sweep", extra={'sweep_id': row['id']})
+                return row['id']
+
+            units = self.build_work_units()
+            cur.execute("""
+                INSERT INTO detection_sweeps (cloud_provider, total_units)
+                VALUES ('aws', %s)
+                RETURNING id
+            """, (len(units),))
+            sweep_id = cur.fetchone()['id']
+            execute_values(cur, """
+                INSERT INTO sweep_checkpoints (sweep_id, account_id, region)
+                VALUES %s
+            """, [(sweep_id, u.account_id, u.region) for u in units])
+        conn.commit()
+        logger.info("Started sweep", extra={'sweep_id': sweep_id, 'units': len(units)})
+        return sweep_id
+
+    def _pending_units(self, conn, sweep_id: int) -> List[WorkUnit]:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT account_id, region FROM sweep_checkpoints
+                WHERE sweep_id = %s AND status <> 'done' AND attempts < %s
+                ORDER BY region = %s DESC, account_id, region
+            """, (sweep_id, self.max_attempts, GLOBAL_REGION))
+            return [WorkUnit(*row) for row in cur.fetchall()]
+
+    def _checkpoint(self, conn, sweep_id: int, unit: WorkUnit, findings_count: int, error: Optional[str]):
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE sweep_checkpoints
+                SET status = %s,
+                    attempts = attempts + 1,
+                    findings_count = %s,
+                    error = %s,
+                    completed_at = CURRENT_TIMESTAMP
+                WHERE sweep_id = %s AND account_id = %s AND region = %s
+            """, ('failed' if error else 'done', findings_count, error, sweep_id, unit.account_id, unit.region))
+        conn.commit()
+
+    def _finish(self, conn, sweep_id: int):
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE detection_sweeps
+                SET status = CASE WHEN EXISTS (
+                        SELECT 1 FROM sweep_checkpoints
+                        WHERE sweep_id = %s AND status <> 'done'
+                    ) THEN 'partial' ELSE 'completed' END,
+                    completed_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+            """, (sweep_id, sweep_id))
+        conn.commit()
+
+    def detect_anomalies(self) -> List[Dict]:
+        """Run (or resume) a full sweep and return all findings"""
+        conn = _get_db_connection()
+        try:
+            sweep_id = self._start_or_resume(conn)
+            findings = []
+            pool = None
+
+            try:
+                # Failed units are retried until they succeed or run out of
+                # attempts; each pass only dispatches what is still pending
+                units = self._pending_units(conn, sweep_id)
+                while units:
+                    if pool is None:
+                        # spawn rather than fork: the API runs this from a thread
+                        context = multiprocessing.get_context('spawn')
+                        pool = context.Pool(processes=min(self.processes, len(units)), initializer=_init_worker)
+
+                    for unit, unit_findings, error in pool.imap_unordered(_run_unit, units, chunksize=1):
+                        self._checkpoint(conn, sweep_id, unit, len(unit_findings), error)
+                        findings.extend(unit_findings)
+                        if error:
+                            logger.warning("Sweep unit failed", extra={
+                                'sweep_id': sweep_id,
+                                'account_id': unit.account_id,
+                                'region': unit.region,
+                                'error': error
+                            })
+                    units = self._pending_units(conn, sweep_id)
+            finally:
+                if pool is not None:
+                    pool.close()
+                    pool.join()
+
+            self._finish(conn, sweep_id)
+            return findings
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    from src.monitoring.logging_config import configure_logging
+
+    parser = argparse.ArgumentParser(description="Run a sharded AWS detection sweep")
+    parser.add_argument('--processes', type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    configure_logging()
+    results = ShardedAWSSweep(processes=args.processes).detect_anomalies()
+    logger.info("Sweep complete", extra={'findings': len(results)})
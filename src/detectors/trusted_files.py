@@ -0,0 +1,46 @@
+import os
+import stat
+from pathlib import Path
+
+# Recordings and models are unpickled on load, so anyone who can write them
+# can run code in the detector. They live in a per-user directory by default
+# and are only loaded when nobody else could have written them.
+
+
+class UntrustedFileError(PermissionError):
+    """Raised for a file that another user could have written"""
+
+
+def app_data_dir(name: str) -> Path:
+    """Per-user default location for pickled state (never /tmp)"""
+    cache = os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return Path(cache) / 'cost-detector' / name
+
+
+def make_private_dirs(path: Path):
+    """Create ``path`` and its missing parents, accessible by this user only"""
+    missing = []
+    while not path.exists():
+        missing.append(path)
+        path = path.parent
+    for directory in reversed(missing):
+        directory.mkdir(mode=0o700, exist_ok=True)
+
+
+def check_trusted(path: Path, root: Path):
+    """Refuse ``path`` unless it and every directory from it up to ``root``
+    is owned by this process's user and not writable by group or others"""
+    uid = os.geteuid()
+    root = Path(os.path.abspath(root))
+    current = Path(os.path.abspath(path))
+    while True:
+        st = os.lstat(current)
+        if stat.S_ISLNK(st.st_mode):
+            raise UntrustedFileError(f"Refusing to load through symlink {current}")
+        if st.st_uid != uid:
+            raise UntrustedFileError(f"Refusing to load {path}: {current} is owned by uid {st.st_uid}")
+        if st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            raise UntrustedFileError(f"Refusing to load {path}: {current} is group/other-writable")
+        if current == root or current.parent == current:
+            return
+        current = current.parent
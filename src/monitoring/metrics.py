@@ -0,0 +1,174 @@
+import os
+import time
+import functools
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+# Error codes returned by the cloud SDKs when a request is rate limited
+THROTTLE_CODES = {
+    'Throttling',
+    'ThrottlingException',
+    'RequestLimitExceeded',
+    'TooManyRequestsException',
+    'RequestThrottled',
+    'SlowDown',
+}
+
+RULE_DURATION = Histogram(
+    'cost_detector_rule_duration_seconds',
+    'Time spent running a single detection rule',
+    ['cloud', 'rule']
+)
+
+DETECTION_RUN_DURATION = Histogram(
+    'cost_detector_run_duration_seconds',
+    'Time spent running a full detection cycle for one cloud',
+    ['cloud'],
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600)
+)
+
+CLOUD_API_LATENCY = Histogram(
+    'cost_detector_cloud_api_latency_seconds',
+    'Latency of cloud provider API calls',
+    ['cloud', 'service', 'operation']
+)
+
+CLOUD_API_CALLS = Counter(
+    'cost_detector_cloud_api_calls_total',
+    'Cloud provider API calls by outcome (ok, throttled, error)',
+    ['cloud', 'service', 'operation', 'outcome']
+)
+
+CLIENT_CACHE_REQUESTS = Counter(
+    'cost_detector_client_cache_requests_total',
+    'Read-only cloud API calls served from (hit) or missing (miss) the response cache',
+    ['cloud', 'service', 'outcome']
+)
+
+CLIENT_RATE_LIMIT = Gauge(
+    'cost_detector_client_rate_limit',
+    'Current adaptive request rate allowed per second',
+    ['cloud', 'service'],
+    multiprocess_mode='mostrecent'
+)
+
+CIRCUIT_STATE = Gauge(
+    'cost_detector_circuit_open',
+    'Whether the circuit breaker for a service is open (1) or closed (0)',
+    ['cloud', 'service'],
+    multiprocess_mode='mostrecent'
+)
+
+DB_QUERY_DURATION = Histogram(
+    'cost_detector_db_query_duration_seconds',
+    'Time spent executing database statements',
+    ['query']
+)
+
+ALERT_SEND_DURATION = Histogram(
+    'cost_detector_alert_send_duration_seconds',
+    'Time spent delivering an alert',
+    ['channel']
+)
+
+FETCHED_SLOTS = Counter(
+    'cost_detector_metric_slots_fetched_total',
+    'Metric datapoint slots requested from the cloud API',
+    ['namespace']
+)
+
+CACHED_SLOTS = Counter(
+    'cost_detector_metric_slots_cached_total',
+    'Metric datapoint slots served from the local metric store',
+    ['namespace']
+)
+
+FINDINGS_TOTAL = Counter(
+    'cost_detector_findings_total',
+    'Findings saved by the detectors',
+    ['cloud', 'anomaly_type', 'severity']
+)
+
+ANOMALIES_AUTO_RESOLVED = Counter(
+    'cost_detector_anomalies_auto_resolved_total',
+    'Open anomalies resolved because a detection run no longer reported them',
+    ['cloud']
+)
+
+
+def metrics_payload() -> bytes:
+    """Exposition text for /metrics.
+
+    With PROMETHEUS_MULTIPROC_DIR set, every process (including sharded
+    sweep workers) writes its samples there and they are merged here;
+    otherwise only this process's registry is reported.
+    """
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def is_throttle_error(exc: Exception) -> bool:
+    """Return True if a cloud SDK exception means the call was rate limited"""
+    # botocore ClientError
+    response = getattr(exc, 'response', None)
+    if isinstance(response, dict):
+        code = response.get('Error', {}).get('Code')
+        if code in THROTTLE_CODES:
+            return True
+    # azure-core HttpResponseError
+    if getattr(exc, 'status_code', None) == 429:
+        return True
+    return False
+
+
+def instrument_rule(func, rule: str):
+    """Wrap a detector rule method so its duration is recorded"""
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        cloud = getattr(self, 'cloud_provider', None) or 'unknown'
+        with RULE_DURATION.labels(cloud=cloud, rule=rule).time():
+            return func(self, *args, **kwargs)
+    return wrapper
+
+
+class InstrumentedClient:
+    """Proxy around a cloud SDK client that records latency and call counts
+    for every operation. Azure operation groups (``client.virtual_machines``)
+    are wrapped as well so their methods are labelled ``group.method``.
+    """
+
+    def __init__(self, client, cloud: str, service: str, prefix: str = ''):
+        self._client = client
+        self._cloud = cloud
+        self._service = service
+        self._prefix = prefix
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith('_'):
+            return attr
+        if type(attr).__name__.endswith('Operations'):
+            return InstrumentedClient(attr, self._cloud, self._service, f"{self._prefix}{name}.")
+        if not callable(attr) or isinstance(attr, type):
+            return attr
+
+        operation = f"{self._prefix}{name}"
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            labels = {'cloud': self._cloud, 'service': self._service, 'operation': operation}
+            start = time.perf_counter()
+            try:
+                result = attr(*args, **kwargs)
+            except Exception as e:
+                outcome = 'throttled' if is_throttle_error(e) else 'error'
+                CLOUD_API_CALLS.labels(outcome=outcome, **labels).inc()
+                raise
+            finally:
+                CLOUD_API_LATENCY.labels(**labels).observe(time.perf_counter() - start)
+            CLOUD_API_CALLS.labels(outcome='ok', **labels).inc()
+            return result
+
+        return call
@@ -0,0 +1,149 @@
+import os
+import re
+import json
+import time
+import pstats
+import cProfile
+import logging
+import threading
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_ID_PATTERN = re.compile(r'^[0-9]{8}T[0-9]{6}_[0-9]{6}_[a-z0-9_-]+$')
+
+
+class DetectionProfiler:
+    """Capture cProfile and tracemalloc data for the next N detection runs.
+
+    While no runs are armed, ``run()`` calls the target directly, so the
+    only cost is a single integer comparison.
+    """
+
+    def __init__(self, output_dir: Optional[str] = None, top_n: int = 25):
+        self.output_dir = Path(output_dir or os.getenv('PROFILE_DIR', '/tmp/cost-detector-profiles'))
+        self.top_n = top_n
+        self._remaining = 0
+        self._lock = threading.Lock()
+
+    @property
+    def remaining_runs(self) -> int:
+        return self._remaining
+
+    def arm(self, runs: int):
+        """Profile the next ``runs`` detection runs"""
+        with self._lock:
+            self._remaining = max(0, int(runs))
+
+    def disarm(self):
+        with self._lock:
+            self._remaining = 0
+
+    def _claim(self) -> bool:
+        with self._lock:
+            if self._remaining <= 0:
+                return False
+            self._remaining -= 1
+            return True
+
+    def run(self, label: str, func: Callable, *args, **kwargs):
+        """Run ``func``, profiling it if a capture is pending.
+
+        Must be called on the thread that does the work, since cProfile only
+        observes the thread it was enabled on.
+        """
+        if not self._remaining or not self._claim():
+            return func(*args, **kwargs)
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(10)
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            duration = time.perf_counter() - start
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+            try:
+                self._save(label, profile, snapshot, duration, peak)
+            except Exception:
+                logger.exception("Failed to save profile", extra={'label': label})
+
+    def _save(self, label: str, profile: cProfile.Profile, snapshot, duration: float, peak_bytes: int):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        safe_label = re.sub(r'[^a-z0-9_-]', '_', label.lower())
+        capture_id = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S_%f')}_{safe_label}"
+
+        profile.dump_stats(str(self.output_dir / f"{capture_id}.prof"))
+
+        stats = pstats.Stats(profile)
+        functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        top_functions = [
+            {
+                'function': f"{filename}:{lineno}({name})",
+                'calls': nc,
+                'total_time': round(tt, 6),
+                'cumulative_time': round(ct, 6)
+            }
+            for (filename, lineno, name), (cc, nc, tt, ct, callers) in functions[:self.top_n]
+        ]
+
+        top_allocators = [
+            {
+                'location': str(stat.traceback[0]),
+                'size_bytes': stat.size,
+                'count': stat.count
+            }
+            for stat in snapshot.statistics('lineno')[:self.top_n]
+        ]
+
+        summary = {
+            'id': capture_id,
+            'label': label,
+            'captured_at': datetime.utcnow().isoformat(),
+            'duration_seconds': round(duration, 3),
+            'peak_traced_memory_bytes': peak_bytes,
+            'top_cumulative_functions': top_functions,
+            'top_allocators': top_allocators
+        }
+        with open(self.output_dir / f"{capture_id}.json", 'w') as f:
+            json.dump(summary, f, indent=2)
+
+        logger.info("Saved detection profile", extra={'capture_id': capture_id, 'duration_seconds': round(duration, 3)})
+        return capture_id
+
+    def list_captures(self) -> List[Dict]:
+        """Return basic info for every saved capture, newest first"""
+        if not self.output_dir.exists():
+            return []
+        captures = []
+        for path in sorted(self.output_dir.glob('*.json'), reverse=True):
+            with open(path) as f:
+                summary = json.load(f)
+            captures.append({
+                'id': summary['id'],
+                'label': summary['label'],
+                'captured_at': summary['captured_at'],
+                'duration_seconds': summary['duration_seconds'],
+                'peak_traced_memory_bytes': summary['peak_traced_memory_bytes']
+            })
+        return captures
+
+    def capture_path(self, capture_id: str, suffix: str) -> Optional[Path]:
+        """Return the file for a capture, or None if the id is unknown"""
+        if not CAPTURE_ID_PATTERN.match(capture_id):
+            return None
+        path = self.output_dir / f"{capture_id}{suffix}"
+        return path if path.exists() else None
+
+
+profiler = DetectionProfiler()
@@ -0,0 +1,34 @@
+import os
+import tempfile
+
+import pytest
+
+INIT_DB = os.path.join(os.path.dirname(__file__), '..', 'init_db.sql')
+
+
+@pytest.fixture(scope='session')
+def pg_server():
+    """Throwaway Postgres with init_db.sql applied (``pip install pgserver``)"""
+    pgserver = pytest.importorskip('pgserver')
+    server = pgserver.get_server(tempfile.mkdtemp(), cleanup_mode='delete')
+    with open(INIT_DB) as f:
+        server.psql("\\set ON_ERROR_STOP on\n" + f.read())
+    return server
+
+
+@pytest.fixture
+def db_uri(pg_server):
+    return pg_server.get_uri('cloud_cost')
+
+
+@pytest.fixture
+def db(db_uri):
+    """Connection to an empty cloud_cost schema; every table is truncated afterwards"""
+    import psycopg2
+    conn = psycopg2.connect(db_uri)
+    with conn.cursor() as cur:
+        cur.execute("SELECT string_agg(quote_ident(tablename), ', ') FROM pg_tables WHERE schemaname = 'public'")
+        cur.execute(f"TRUNCATE {cur.fetchone()[0]} RESTART IDENTITY CASCADE")
+    conn.commit()
+    yield conn
+    conn.close()
@@ -0,0 +1,128 @@
+import json
+from datetime import date
+
+import pytest
+
+from src.analytics.allocation import (
+    ANOMALY_GROUP_COLUMNS, anomaly_groups, cost_groups, parse_group_by, parse_tag_filters, refresh_rollups
+)
+
+
+def _anomaly(cur, cloud, severity, impact, tags, status='open'):
+    cur.execute("""
+        INSERT INTO cost_anomalies (cloud_provider, resource_id, resource_type, anomaly_type,
+                                    cost_impact, severity, tags, status)
+        VALUES (%s, 'r', 'ec2', 'idle_instance', %s, %s, %s, %s)
+    """, (cloud, impact, severity, json.dumps(tags), status))
+
+
+@pytest.fixture
+def anomalies(db):
+    with db.cursor() as cur:
+        _anomaly(cur, 'aws', 'high', 100, {'team': 'payments', 'env': 'prod'})
+        _anomaly(cur, 'aws', 'critical', 300, {'team': 'payments', 'env': 'dev'})
+        _anomaly(cur, 'azure', 'high', 50, {'team': 'search', 'env': 'prod'})
+        _anomaly(cur, 'aws', 'medium', 20, {})
+        _anomaly(cur, 'gcp', 'high', 10, {'team': 'search'}, status='resolved')
+    db.commit()
+    refresh_rollups(db)
+    return db
+
+
+@pytest.fixture
+def costs(db):
+    with db.cursor() as cur:
+        cur.executemany("""
+            INSERT INTO daily_costs (usage_date, cloud_provider, account_id, service, amount)
+            VALUES (%s, 'aws', %s, %s, %s)
+        """, [(date(2024, 5, 1), '111', 'EC2', 10), (date(2024, 5, 2), '111', 'EC2', 12.5),
+              (date(2024, 5, 2), '222', 'RDS', 4), (date(2024, 5, 9), '111', 'EC2', 99)])
+        cur.executemany("""
+            INSERT INTO daily_tag_costs (usage_date, cloud_provider, account_id, service, tag_key, tag_value, amount)
+            VALUES (%s, 'aws', '111', 'EC2', %s, %s, %s)
+        """, [(date(2024, 5, 1), 'team', 'payments', 6), (date(2024, 5, 1), 'team', '', 4),
+              (date(2024, 5, 2), 'team', 'payments', 12.5), (date(2024, 5, 1), 'env', 'prod', 10)])
+    db.commit()
+    return db
+
+
+def _by_key(result, field):
+    return {g['key']: g[field] for g in result['groups']}
+
+
+class TestParsing:
+    def test_group_by(self):
+        assert parse_group_by('cloud', ANOMALY_GROUP_COLUMNS) == ('cloud_provider', None)
+        assert parse_group_by('tag:team', ANOMALY_GROUP_COLUMNS) == (None, 'team')
+        with pytest.raises(ValueError):
+            parse_group_by('tag:', ANOMALY_GROUP_COLUMNS)
+        with pytest.raises(ValueError):
+            parse_group_by('date', ANOMALY_GROUP_COLUMNS)
+
+    def test_tag_filters(self):
+        assert parse_tag_filters(['team:payments', 'url:http://x']) == {'team': 'payments', 'url': 'http://x'}
+        assert parse_tag_filters(None) == {}
+        for bad in ('team', ':payments'):
+            with pytest.raises(ValueError):
+                parse_tag_filters([bad])
+
+
+class TestAnomalyGroups:
+    def test_tag_group_reads_the_rollup(self, anomalies):
+        result = anomaly_groups(anomalies, 'tag:team', {}, status='open')
+
+        assert result['source'] == 'mv_anomaly_tag_rollup'
+        assert _by_key(result, 'anomaly_count') == {'payments': 2, 'search': 1}
+        assert _by_key(result, 'total_impact') == {'payments': 400.0, 'search': 50.0}
+
+    def test_rollup_matches_the_base_table(self, anomalies):
+        rollup = anomaly_groups(anomalies, 'tag:team', {'team': 'search'})
+        # A filter on another tag key forces the base table
+        base = anomaly_groups(anomalies, 'tag:team', {'team': 'search', 'env': 'prod'})
+
+        assert rollup['groups'] == [{'key': 'search', 'anomaly_count': 2, 'total_impact': 60.0}]
+        assert base['source'] == 'cost_anomalies'
+        assert base['groups'] == [{'key': 'search', 'anomaly_count': 1, 'total_impact': 50.0}]
+
+    def test_rollup_follows_refresh(self, anomalies):
+        with anomalies.cursor() as cur:
+            _anomaly(cur, 'aws', 'low', 5, {'team': 'infra'})
+        anomalies.commit()
+        assert 'infra' not in _by_key(anomaly_groups(anomalies, 'tag:team', {}), 'anomaly_count')
+
+        refresh_rollups(anomalies)
+        assert _by_key(anomaly_groups(anomalies, 'tag:team', {}), 'anomaly_count')['infra'] == 1
+
+    def test_column_group_with_tag_filter(self, anomalies):
+        result = anomaly_groups(anomalies, 'cloud', {'team': 'payments'})
+
+        assert result['source'] == 'cost_anomalies'
+        assert result['groups'] == [{'key': 'aws', 'anomaly_count': 2, 'total_impact': 400.0}]
+
+    def test_column_group_includes_untagged(self, anomalies):
+        result = anomaly_groups(anomalies, 'severity', {}, cloud='aws')
+        assert _by_key(result, 'anomaly_count') == {'critical': 1, 'high': 1, 'medium': 1}
+
+
+class TestCostGroups:
+    def test_untagged_spend_by_service(self, costs):
+        result = cost_groups(costs, date(2024, 5, 1), date(2024, 5, 2), 'service', {})
+
+        assert result['groups'] == [{'key': 'EC2', 'amount': 22.5}, {'key': 'RDS', 'amount': 4.0}]
+        assert result['total'] == 26.5
+
+    def test_dates_are_ordered_and_inclusive(self, costs):
+        result = cost_groups(costs, date(2024, 5, 1), date(2024, 5, 2), 'date', {}, account_id='111')
+        assert result['groups'] == [{'key': '2024-05-01', 'amount': 10.0}, {'key': '2024-05-02', 'amount': 12.5}]
+
+    def test_tag_group_keeps_untagged_spend(self, costs):
+        result = cost_groups(costs, date(2024, 5, 1), date(2024, 5, 2), 'tag:team', {})
+        assert _by_key(result, 'amount') == {'payments': 18.5, '': 4.0}
+
+    def test_tag_filter_with_column_group(self, costs):
+        result = cost_groups(costs, date(2024, 5, 1), date(2024, 5, 31), 'date', {'team': 'payments'})
+        assert result['groups'] == [{'key': '2024-05-01', 'amount': 6.0}, {'key': '2024-05-02', 'amount': 12.5}]
+
+    def test_one_tag_key_at_a_time(self, costs):
+        with pytest.raises(ValueError):
+            cost_groups(costs, date(2024, 5, 1), date(2024, 5, 2), 'tag:team', {'env': 'prod'})
@@ -0,0 +1,130 @@
+import os
+
+import numpy as np
+import pytest
+
+from src.analytics.backtest import SPIKE_WINDOW_DAYS, backtest_spikes, spike_signal
+from src.detectors.base_detector import spike_severity
+from src.detectors.replay import ReplayMissError, wrap_for_mode
+from src.detectors.trusted_files import UntrustedFileError
+
+
+def _loop_backtest(totals, labels, multiplier, critical, high):
+    """Re-run the spike rule day by day, as the detector would have"""
+    counts = {'alerts': 0, 'critical': 0, 'high': 0, 'medium': 0, 'tp': 0, 'fp': 0}
+    for i in range(totals.shape[0]):
+        first = np.flatnonzero(totals[i] > 0)
+        if not len(first):
+            continue
+        for d in range(totals.shape[1]):
+            window = totals[i, max(0, d - SPIKE_WINDOW_DAYS + 1):d + 1]
+            mean = window.sum() / SPIKE_WINDOW_DAYS
+            if d - first[0] + 1 <= SPIKE_WINDOW_DAYS or mean <= 0 or totals[i, d] <= mean * multiplier:
+                continue
+            counts['alerts'] += 1
+            counts[spike_severity(totals[i, d], critical, high)] += 1
+            counts['tp'] += labels[i, d] == 1
+            counts['fp'] += labels[i, d] == 0
+    return counts
+
+
+class TestBacktestSpikes:
+    def test_matches_day_by_day_loop(self):
+        rng = np.random.default_rng(2)
+        totals = rng.gamma(2.0, 200.0, size=(6, 60))
+        totals[:, rng.integers(0, 60, 12)] *= 4
+        totals[2, :20] = 0.0
+        labels = np.where(rng.random(totals.shape) < 0.3, rng.integers(0, 2, totals.shape), np.nan)
+
+        multipliers, criticals, highs = [1.3, 1.5, 2.5], [1000, 2000], [250, 500, 3000]
+        results = backtest_spikes(totals, labels, multipliers, criticals, highs)
+
+        assert len(results) == 3 * 2 * 3
+        for row in results:
+            expected = _loop_backtest(totals, labels, row['spike_multiplier'],
+                                      row['critical_threshold'], row['high_threshold'])
+            assert row['alerts'] == expected['alerts']
+            assert row['labelled'] == expected['tp'] + expected['fp']
+            # With high above critical there is no "high" band, as in spike_severity
+            assert (row['critical'], row['high'], row['medium']) == (
+                expected['critical'], expected['high'], expected['medium'])
+            if expected['tp'] + expected['fp']:
+                assert row['precision'] == round(expected['tp'] / (expected['tp'] + expected['fp']), 3)
+
+    def test_needs_a_full_window_of_history(self):
+        totals = np.array([[0, 0, 10, 10, 10, 10, 10, 10, 10, 100.0]])
+        _, _, valid = spike_signal(totals)
+        assert valid[0].tolist() == [False] * 9 + [True]
+
+    def test_empty_history(self):
+        results = backtest_spikes(np.zeros((0, 0)), np.zeros((0, 0)), [1.5], [1000], [500])
+        assert results[0]['alerts'] == 0
+        assert results[0]['precision'] is None
+        assert results[0]['recall'] is None
+
+
+def test_spike_severity_pages_every_spike_by_default():
+    assert spike_severity(1500, 1000) == 'critical'
+    assert spike_severity(20, 1000) == 'high'
+    assert spike_severity(20, 1000, high_threshold=250) == 'medium'
+
+
+class FakeEC2:
+    def __init__(self):
+        self.calls = 0
+
+    def describe_instances(self, **kwargs):
+        self.calls += 1
+        return {'Reservations': [], 'MaxResults': kwargs.get('MaxResults')}
+
+    def describe_volumes(self, **kwargs):
+        raise RuntimeError('AccessDenied')
+
+
+@pytest.fixture
+def recording(tmp_path, monkeypatch):
+    """Record two calls under a private REPLAY_DIR, then switch to replay"""
+    monkeypatch.setenv('REPLAY_DIR', str(tmp_path / 'replay'))
+    monkeypatch.setenv('DETECTOR_MODE', 'record')
+    raw = FakeEC2()
+    recorder = wrap_for_mode(raw, 'aws', 'ec2', '111/us-east-1')
+    recorder.describe_instances(MaxResults=5)
+    with pytest.raises(RuntimeError):
+        recorder.describe_volumes()
+    monkeypatch.setenv('DETECTOR_MODE', 'replay')
+    return tmp_path / 'replay'
+
+
+class TestReplay:
+    def test_replays_responses_and_errors(self, recording):
+        client = wrap_for_mode(FakeEC2(), 'aws', 'ec2', '111/us-east-1')
+
+        assert client.describe_instances(MaxResults=5) == {'Reservations': [], 'MaxResults': 5}
+        with pytest.raises(RuntimeError, match='AccessDenied'):
+            client.describe_volumes()
+        with pytest.raises(ReplayMissError):
+            client.describe_snapshots()
+
+    def test_files_are_private(self, recording):
+        (path,) = recording.glob('aws/*/ec2/describe_instances/*.pkl')
+        assert os.stat(path).st_mode & 0o777 == 0o600
+        assert os.stat(path.parent).st_mode & 0o777 == 0o700
+
+    @pytest.mark.parametrize('target', ['file', 'directory'])
+    def test_writable_by_others_is_refused(self, recording, target):
+        (path,) = recording.glob('aws/*/ec2/describe_instances/*.pkl')
+        os.chmod(path if target == 'file' else path.parent.parent, 0o777)
+        client = wrap_for_mode(FakeEC2(), 'aws', 'ec2', '111/us-east-1')
+
+        with pytest.raises(UntrustedFileError):
+            client.describe_instances(MaxResults=5)
+
+    def test_symlinked_recording_is_refused(self, recording, tmp_path):
+        (path,) = recording.glob('aws/*/ec2/describe_instances/*.pkl')
+        elsewhere = tmp_path / 'elsewhere.pkl'
+        os.replace(path, elsewhere)
+        path.symlink_to(elsewhere)
+        client = wrap_for_mode(FakeEC2(), 'aws', 'ec2', '111/us-east-1')
+
+        with pytest.raises(UntrustedFileError):
+            client.describe_instances(MaxResults=5)
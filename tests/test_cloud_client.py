@@ -0,0 +1,224 @@
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+
+from src.detectors import cloud_client
+from src.detectors.aws_detector import AWSDetector
+from src.detectors.cloud_client import AdaptiveRateLimiter, CircuitBreaker, CircuitOpenError, ResilientClient
+from src.detectors.dry_run import DryRunConnection
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(cloud_client.time, 'monotonic', fake.monotonic)
+    monkeypatch.setattr(cloud_client.time, 'sleep', fake.sleep)
+    return fake
+
+
+class TestCircuitBreaker:
+    def test_opens_after_consecutive_failures(self, clock):
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+        breaker.on_failure()
+        breaker.on_failure()
+        breaker.on_success()
+        breaker.on_failure()
+        breaker.on_failure()
+        assert breaker.allow()
+
+        breaker.on_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow()
+
+    def test_half_open_trial_after_timeout(self, clock):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        breaker.on_failure()
+        clock.now += 29
+        assert not breaker.allow()
+
+        clock.now += 1
+        assert breaker.allow()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        # Only one trial call while half open
+        assert not breaker.allow()
+
+    def test_trial_result_closes_or_reopens(self, clock):
+        breaker = CircuitBreaker(failure_threshold=5, reset_timeout=10)
+        for _ in range(5):
+            breaker.on_failure()
+        clock.now += 10
+        assert breaker.allow()
+        breaker.on_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow()
+
+        clock.now += 10
+        assert breaker.allow()
+        breaker.on_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.failures == 0
+        assert breaker.allow()
+
+
+class TestAdaptiveRateLimiter:
+    def test_aimd(self, clock):
+        limiter = AdaptiveRateLimiter(max_rate=20, min_rate=1)
+        limiter.on_throttle()
+        assert limiter.rate == 10
+        for _ in range(10):
+            limiter.on_throttle()
+        assert limiter.rate == 1
+
+        limiter.on_success()
+        assert limiter.rate == pytest.approx(2)
+        for _ in range(100):
+            limiter.on_success()
+        assert limiter.rate == 20
+
+    def test_burst_then_paced(self, clock):
+        limiter = AdaptiveRateLimiter(max_rate=5)
+        for _ in range(5):
+            limiter.acquire()
+        assert clock.slept == []
+
+        limiter.acquire()
+        assert clock.slept == [pytest.approx(0.2)]
+
+    def test_throttle_slows_acquire(self, clock):
+        limiter = AdaptiveRateLimiter(max_rate=4)
+        for _ in range(4):
+            limiter.acquire()
+        limiter.on_throttle()
+        limiter.on_throttle()
+        limiter.acquire()
+        assert sum(clock.slept) == pytest.approx(1.0)
+
+
+def _error(code, status):
+    return ClientError({'Error': {'Code': code}, 'ResponseMetadata': {'HTTPStatusCode': status}}, 'DescribeInstances')
+
+
+THROTTLED, SERVER_ERROR, DENIED = ('Throttling', 400), ('InternalError', 500), ('AccessDenied', 403)
+
+
+class FakeEC2:
+    """Raises the queued errors in order, then answers with its call count"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def describe_instances(self, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise _error(*self.errors.pop(0))
+        return {'Reservations': [], 'call': self.calls}
+
+    terminate_instances = describe_instances
+
+
+@pytest.fixture
+def resilient(clock, monkeypatch):
+    """Fresh shared limiter/breaker registries; builds a ResilientClient"""
+    monkeypatch.setattr(cloud_client, '_limiters', {})
+    monkeypatch.setattr(cloud_client, '_breakers', {})
+
+    def make(raw, **env):
+        for name, value in env.items():
+            monkeypatch.setenv(name, str(value))
+        return ResilientClient(raw, 'aws', 'ec2', 'test')
+
+    return make
+
+
+class TestResilientClient:
+    def test_transient_errors_are_retried(self, resilient, clock):
+        raw = FakeEC2(THROTTLED, SERVER_ERROR)
+        client = resilient(raw, CLIENT_CACHE_TTL_SECONDS=0)
+
+        assert client.describe_instances()['call'] == 3
+        assert len(clock.slept) == 2
+        assert client._breaker.state == CircuitBreaker.CLOSED and client._breaker.failures == 0
+        # The throttle halved the rate; each success creeps it back up
+        assert client._limiter.rate == pytest.approx(10 + 20 * 0.05)
+
+    def test_exhausted_retries_count_one_breaker_failure(self, resilient):
+        raw = FakeEC2(*[SERVER_ERROR] * 3)
+        client = resilient(raw, CLIENT_MAX_RETRIES=2, CLIENT_CACHE_TTL_SECONDS=0)
+
+        with pytest.raises(ClientError):
+            client.describe_instances()
+        assert raw.calls == 3
+        assert client._breaker.failures == 1
+
+    def test_non_transient_errors_are_not_retried_or_counted(self, resilient):
+        raw = FakeEC2(*[DENIED] * 10)
+        client = resilient(raw, CLIENT_BREAKER_FAILURES=2, CLIENT_CACHE_TTL_SECONDS=0)
+
+        for _ in range(10):
+            with pytest.raises(ClientError):
+                client.describe_instances()
+        assert raw.calls == 10
+        assert client._breaker.state == CircuitBreaker.CLOSED and client._breaker.failures == 0
+
+    def test_open_breaker_skips_the_call_until_a_trial_succeeds(self, resilient, clock):
+        raw = FakeEC2(SERVER_ERROR, SERVER_ERROR)
+        client = resilient(raw, CLIENT_MAX_RETRIES=0, CLIENT_BREAKER_FAILURES=2,
+                           CLIENT_BREAKER_RESET_SECONDS=30, CLIENT_CACHE_TTL_SECONDS=0)
+        for _ in range(2):
+            with pytest.raises(ClientError):
+                client.describe_instances()
+
+        with pytest.raises(CircuitOpenError):
+            client.describe_instances()
+        assert raw.calls == 2
+
+        clock.now += 30
+        assert client.describe_instances()['call'] == 3
+        assert client._breaker.state == CircuitBreaker.CLOSED
+
+    def test_non_transient_trial_lets_the_next_call_probe(self, resilient, clock):
+        raw = FakeEC2(SERVER_ERROR, DENIED)
+        client = resilient(raw, CLIENT_MAX_RETRIES=0, CLIENT_BREAKER_FAILURES=1,
+                           CLIENT_BREAKER_RESET_SECONDS=30, CLIENT_CACHE_TTL_SECONDS=0)
+        with pytest.raises(ClientError):
+            client.describe_instances()
+        clock.now += 30
+
+        with pytest.raises(ClientError):
+            client.describe_instances()
+        # The denied trial says nothing about health; the next call is a new trial
+        assert client.describe_instances()['call'] == 3
+
+    def test_read_only_responses_are_cached_for_the_ttl(self, resilient, clock):
+        raw = FakeEC2()
+        client = resilient(raw, CLIENT_CACHE_TTL_SECONDS=60)
+
+        assert client.describe_instances(MaxResults=5)['call'] == 1
+        assert client.describe_instances(MaxResults=5)['call'] == 1
+        assert client.describe_instances(MaxResults=6)['call'] == 2
+        assert client.terminate_instances(InstanceIds=['i-1'])['call'] == 3
+        assert client.terminate_instances(InstanceIds=['i-1'])['call'] == 4
+
+        clock.now += 60
+        assert client.describe_instances(MaxResults=5)['call'] == 5
+
+
+def test_aws_clients_leave_retries_to_the_resilient_client():
+    session = boto3.Session(aws_access_key_id='x', aws_secret_access_key='x', region_name='us-east-1')
+    detector = AWSDetector(session=session, account_id='111', db_conn=DryRunConnection())
+    for client in (detector.ec2, detector.rds, detector.cloudwatch, detector.cost_explorer):
+        assert client.meta.config.retries['total_max_attempts'] == 1
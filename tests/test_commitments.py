@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from src.analytics.commitments import analyze_commitments, load_hourly_usage, optimal_commitments
+
+
+def _commitment_savings(usage, rate, discount, level):
+    return rate * np.minimum(usage, level).sum() - rate * (1 - discount) * level * len(usage)
+
+
+def _brute_force_savings(usage, rate, discount):
+    """Best savings from trying every distinct usage value as the commitment"""
+    return max(0.0, *(_commitment_savings(usage, rate, discount, level) for level in np.unique(usage)))
+
+
+class TestOptimalCommitments:
+    def test_matches_brute_force(self):
+        rng = np.random.default_rng(0)
+        usage = np.round(rng.gamma(2.0, 3.0, size=(25, 200)), 2)
+        usage[3] = 0.0
+        usage[7, :150] = 0.0
+        rate = rng.uniform(0.05, 2.0, size=25)
+
+        result = optimal_commitments(usage, rate, discount=0.3)
+
+        for i in range(len(usage)):
+            savings = _brute_force_savings(usage[i], rate[i], 0.3)
+            assert result['savings'][i] == pytest.approx(savings, abs=1e-9)
+            # Several levels can tie; the chosen one must earn the best savings
+            level = result['commitment_level'][i]
+            assert _commitment_savings(usage[i], rate[i], 0.3, level) == pytest.approx(savings, abs=1e-9)
+
+    def test_no_commitment_without_savings(self):
+        usage = np.array([[0.0] * 10, [5.0] + [0.0] * 9])
+        result = optimal_commitments(usage, np.array([1.0, 1.0]), discount=0.3)
+        assert result['commitment_level'].tolist() == [0.0, 0.0]
+        assert result['savings'].tolist() == [0.0, 0.0]
+        assert result['utilization'].tolist() == [0.0, 0.0]
+
+    def test_flat_usage_commits_fully(self):
+        usage = np.full((1, 48), 4.0)
+        result = optimal_commitments(usage, np.array([0.5]), discount=0.4)
+        assert result['commitment_level'][0] == 4.0
+        assert result['utilization'][0] == pytest.approx(1.0)
+        assert result['savings'][0] == pytest.approx(0.5 * 0.4 * 4.0 * 48)
+
+
+def _insert_usage(db, rows):
+    """rows: (hours ago, account, region, family, units, cost)"""
+    with db.cursor() as cur:
+        for hours_ago, account_id, region, family, units, cost in rows:
+            cur.execute("""
+                INSERT INTO hourly_usage (usage_hour, cloud_provider, account_id, region, instance_family,
+                                          usage_units, on_demand_cost)
+                VALUES (date_trunc('hour', NOW()) - make_interval(hours => %s), 'aws', %s, %s, %s, %s, %s)
+            """, (hours_ago, account_id, region, family, units, cost))
+    db.commit()
+
+
+class TestLoadHourlyUsage:
+    def test_dense_matrix_sums_accounts(self, db):
+        _insert_usage(db, [
+            (3, '1', 'us-east-1', 'm5', 2.0, 0.2),
+            (3, '2', 'us-east-1', 'm5', 1.0, 0.1),
+            (1, '1', 'us-east-1', 'm5', 4.0, 0.4),
+            (2, '1', 'eu-west-1', 'c5', 8.0, 0.6),
+            (24 * 400, '1', 'eu-west-1', 'c5', 99.0, 9.9),
+        ])
+
+        keys, hours, usage, cost = load_hourly_usage(db, days=30)
+
+        assert keys == [('aws', 'eu-west-1', 'c5'), ('aws', 'us-east-1', 'm5')]
+        assert len(hours) == 3
+        assert (hours[1:] - hours[:-1]).astype(int).tolist() == [1, 1]
+        # Hours with no row are zero; the two m5 accounts in one hour are summed
+        assert usage.tolist() == [[0.0, 8.0, 0.0], [3.0, 0.0, 4.0]]
+        assert cost[1] == pytest.approx([0.3, 0.0, 0.4])
+
+    def test_empty(self, db):
+        keys, hours, usage, cost = load_hourly_usage(db)
+        assert keys == [] and len(hours) == 0 and usage.shape == (0, 0)
+
+    def test_savings_plan_reports_discounted_commitment(self, db):
+        _insert_usage(db, [(h, '1', 'us-east-1', 'm5', 2.0, 0.5) for h in range(1, 49)])
+
+        plan = analyze_commitments(db, days=30, discount=0.4)['savings_plan']
+
+        # Flat $0.50/h of on-demand spend is covered by committing $0.30/h
+        assert plan['covered_on_demand_dollars_per_hour'] == 0.5
+        assert plan['commit_dollars_per_hour'] == 0.3
+        assert plan['expected_utilization'] == 1.0
@@ -0,0 +1,114 @@
+import io
+import csv
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from src.analytics.export import DATASETS, ENCODERS, SETTLE_SECONDS, _build_query, load_watermark, prepare_export
+
+COLUMNS = [
+    ('id', 'int'), ('cost_impact', 'float'), ('severity', 'str'), ('details', 'json'),
+    ('detected_at', 'timestamp'), ('usage_date', 'date')
+]
+
+CHUNKS = [
+    [(1, Decimal('12.50'), 'high', {'cpu_p99': 3.2}, datetime(2024, 6, 1, 12, 0), date(2024, 6, 1)),
+     (2, None, 'low', None, None, None)],
+    [(3, Decimal('0.10'), 'critical', {'tags': ['a', 'b']}, datetime(2024, 6, 2, 8, 30), date(2024, 6, 2))]
+]
+
+
+def _encode(fmt):
+    parts = list(ENCODERS[fmt](COLUMNS, iter(CHUNKS)))
+    return parts, b''.join(parts)
+
+
+def test_ndjson():
+    parts, data = _encode('ndjson')
+    assert len(parts) == len(CHUNKS)
+    rows = [json.loads(line) for line in data.decode().splitlines()]
+    assert rows[0] == {
+        'id': 1, 'cost_impact': 12.5, 'severity': 'high', 'details': {'cpu_p99': 3.2},
+        'detected_at': '2024-06-01T12:00:00', 'usage_date': '2024-06-01'
+    }
+    assert rows[1]['cost_impact'] is None and rows[1]['detected_at'] is None
+    assert [r['id'] for r in rows] == [1, 2, 3]
+
+
+def test_csv():
+    parts, data = _encode('csv')
+    rows = list(csv.reader(io.StringIO(data.decode())))
+    assert rows[0] == [name for name, _ in COLUMNS]
+    assert rows[1] == ['1', '12.50', 'high', '{"cpu_p99": 3.2}', '2024-06-01 12:00:00', '2024-06-01']
+    assert rows[2] == ['2', '', 'low', '', '', '']
+    assert json.loads(rows[3][3]) == {'tags': ['a', 'b']}
+
+
+def test_parquet_streams_one_row_group_per_chunk():
+    pq = pytest.importorskip('pyarrow.parquet')
+    parts, data = _encode('parquet')
+    # Every chunk is flushed as soon as it is encoded
+    assert all(parts[:len(CHUNKS)])
+
+    table = pq.read_table(io.BytesIO(data))
+    assert pq.ParquetFile(io.BytesIO(data)).num_row_groups == len(CHUNKS)
+    assert table.column('id').to_pylist() == [1, 2, 3]
+    assert table.column('cost_impact').to_pylist() == [12.5, None, 0.1]
+    assert json.loads(table.column('details')[2].as_py()) == {'tags': ['a', 'b']}
+    assert table.column('detected_at')[0].as_py() == datetime(2024, 6, 1, 12, 0)
+    assert table.column('usage_date')[1].as_py() is None
+
+
+def test_empty_export_still_has_header_or_schema():
+    assert b''.join(ENCODERS['ndjson'](COLUMNS, iter([]))) == b''
+    assert b''.join(ENCODERS['csv'](COLUMNS, iter([]))).decode().strip() == ','.join(n for n, _ in COLUMNS)
+
+
+def test_incremental_daily_costs_query_waits_for_settled_rows():
+    query, params = _build_query(DATASETS['daily_costs'], None, None, {'account_id': '123'}, {},
+                                 '2024-06-01 00:00:00', incremental=True)
+    assert 'updated_at > %s::timestamp' in query
+    assert 'updated_at < LOCALTIMESTAMP' in query
+    assert query.endswith('ORDER BY updated_at')
+    assert params[:2] == ['123', '2024-06-01 00:00:00']
+
+
+def test_unknown_filter_is_rejected():
+    with pytest.raises(ValueError):
+        _build_query(DATASETS['daily_costs'], None, None, {'severity': 'high'}, {}, None)
+    with pytest.raises(ValueError):
+        _build_query(DATASETS['daily_costs'], None, None, {}, {'team': 'a'}, None)
+
+
+def test_incremental_anomalies_query_settles_against_utc():
+    query, params = _build_query(DATASETS['anomalies'], None, None, {}, {}, '41', incremental=True)
+    assert 'id > %s::bigint' in query
+    # detected_at is stored in UTC, so LOCALTIMESTAMP would be off by the session's offset
+    assert "detected_at < (NOW() AT TIME ZONE 'UTC') - %s * INTERVAL '1 second'" in query
+    assert params == ['41', SETTLE_SECONDS]
+
+
+def _export(conn, **kwargs):
+    return [json.loads(line) for line in b''.join(prepare_export(conn, 'anomalies', **kwargs)).decode().splitlines()]
+
+
+def test_incremental_export_leaves_unsettled_rows_for_the_next_run(db):
+    with db.cursor() as cur:
+        cur.execute("SET TIME ZONE 'America/Los_Angeles'")
+        for age in ('1 hour', '0 seconds'):
+            cur.execute(f"""
+                INSERT INTO cost_anomalies (cloud_provider, resource_id, resource_type, anomaly_type, severity, detected_at)
+                VALUES ('aws', 'i-1', 'ec2', 'idle_resource', 'high', (NOW() AT TIME ZONE 'UTC') - INTERVAL '{age}')
+            """)
+    db.commit()
+
+    assert [row['id'] for row in _export(db, watermark='lake')] == [1]
+    assert load_watermark(db, 'lake', 'anomalies') == '1'
+
+    with db.cursor() as cur:
+        cur.execute("UPDATE cost_anomalies SET detected_at = detected_at - INTERVAL '1 hour' WHERE id = 2")
+    db.commit()
+    assert [row['id'] for row in _export(db, watermark='lake')] == [2]
+    assert _export(db, watermark='lake') == []
@@ -0,0 +1,139 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+
+from src.analytics.forecast import forecast_month_end
+from src.detectors import budget_detector
+from src.detectors.budget_detector import BudgetDetector
+
+
+class TestForecastMonthEnd:
+    def test_constant_spend_projects_exactly(self):
+        dates = np.arange(np.datetime64('2024-05-01'), np.datetime64('2024-06-16'))
+        costs = np.full((2, len(dates)), 10.0)
+        costs[1] *= 3
+
+        result = forecast_month_end(dates, costs)
+
+        assert result['remaining_days'] == 15
+        assert result['month_to_date'] == pytest.approx([150.0, 450.0])
+        assert result['projected'] == pytest.approx([300.0, 900.0])
+        assert result['lower'] == pytest.approx(result['projected'])
+        assert result['upper'] == pytest.approx(result['projected'])
+
+    def test_trend_and_interval(self):
+        rng = np.random.default_rng(1)
+        dates = np.arange(np.datetime64('2024-03-01'), np.datetime64('2024-04-21'))
+        days = np.arange(len(dates))
+        costs = (100 + 2 * days + rng.normal(0, 5, len(dates)))[None, :]
+
+        result = forecast_month_end(dates, costs, confidence=0.9)
+
+        remaining = sum(100 + 2 * d for d in range(len(dates), len(dates) + 10))
+        assert result['projected'][0] == pytest.approx(costs[0, -20:].sum() + remaining, rel=0.02)
+        assert result['lower'][0] < result['projected'][0] < result['upper'][0]
+        assert result['lower'][0] >= result['month_to_date'][0]
+
+    def test_short_history_uses_daily_mean(self):
+        dates = np.arange(np.datetime64('2024-02-25'), np.datetime64('2024-03-03'))
+        costs = np.arange(1.0, len(dates) + 1)[None, :]
+
+        result = forecast_month_end(dates, costs)
+
+        # March 1-2 so far, 29 days left at the mean of the history
+        assert result['month_to_date'][0] == pytest.approx(costs[0, -2:].sum())
+        assert result['projected'][0] == pytest.approx(costs[0, -2:].sum() + costs.mean() * 29)
+
+
+    def test_target_month_after_the_last_stored_day(self):
+        # On June 1st the newest stored day is May 31st
+        dates = np.arange(np.datetime64('2024-05-01'), np.datetime64('2024-06-01'))
+        costs = np.full((1, len(dates)), 10.0)
+
+        result = forecast_month_end(dates, costs, month=np.datetime64('2024-06'))
+
+        assert result['remaining_days'] == 30
+        assert result['month_to_date'][0] == 0.0
+        assert result['projected'][0] == pytest.approx(300.0)
+
+
+@pytest.fixture
+def budgets(db, monkeypatch):
+    """One budget that the forecast breaches and one it does not; returns a
+    function that stores $10 of spend per day and sets the detector's clock"""
+    with db.cursor() as cur:
+        cur.execute("""
+            INSERT INTO budgets (cloud_provider, account_id, service, monthly_amount)
+            VALUES ('aws', '', '', 200), ('aws', '2', '', 1000000)
+        """)
+    db.commit()
+    alerts = []
+    monkeypatch.setattr(BudgetDetector, '_send_slack_alert', lambda self, finding: alerts.append(finding))
+
+    def spend_until(last_day: date, now: datetime):
+        with db.cursor() as cur:
+            cur.execute("""
+                INSERT INTO daily_costs (usage_date, cloud_provider, account_id, service, amount)
+                SELECT d::date, 'aws', '1', 'EC2', 10
+                FROM generate_series(%s::date - 30, %s::date, INTERVAL '1 day') d
+                ON CONFLICT DO NOTHING
+            """, (last_day, last_day))
+        db.commit()
+        monkeypatch.setattr(budget_detector, 'detector_now', lambda: now)
+        return alerts
+
+    return spend_until
+
+
+def _alerted_months(db):
+    with db.cursor() as cur:
+        cur.execute("SELECT budget_id, month FROM budget_alerts ORDER BY month")
+        return cur.fetchall()
+
+
+class TestBudgetDetector:
+    def test_breach_is_saved_and_alerted_once_per_month(self, db, budgets):
+        month = date.today().replace(day=1)
+        alerts = budgets(month + timedelta(days=9), datetime.combine(month + timedelta(days=10), datetime.min.time()))
+
+        first = BudgetDetector(db_conn=db).detect_anomalies()
+        second = BudgetDetector(db_conn=db).detect_anomalies()
+
+        assert [f['resource_id'] for f in first] == ['budget:1']
+        assert first[0]['details']['month'] == str(month)
+        assert first[0]['details']['month_to_date'] == 100.0
+        # The open breach is refreshed in place and alerted only the first time
+        assert second[0]['id'] == first[0]['id']
+        assert len(alerts) == 1
+        assert _alerted_months(db) == [(1, month)]
+
+    def test_first_of_month_waits_for_the_months_data(self, db, budgets):
+        month = date.today().replace(day=1)
+        first_day = datetime.combine(month, datetime.min.time())
+
+        # Cost Explorer's exclusive end: on the 1st the newest day is last month's
+        alerts = budgets(month - timedelta(days=1), first_day)
+        assert BudgetDetector(db_conn=db).detect_anomalies() == []
+        assert _alerted_months(db) == []
+
+        budgets(month, first_day)
+        findings = BudgetDetector(db_conn=db).detect_anomalies()
+        assert findings[0]['details']['month'] == str(month)
+        assert len(alerts) == 1
+        assert _alerted_months(db) == [(1, month)]
+
+    def test_breach_that_is_no_longer_predicted_is_resolved(self, db, budgets):
+        month = date.today().replace(day=1)
+        budgets(month + timedelta(days=9), datetime.combine(month + timedelta(days=10), datetime.min.time()))
+        (finding,) = BudgetDetector(db_conn=db).detect_anomalies()
+
+        with db.cursor() as cur:
+            cur.execute("UPDATE budgets SET monthly_amount = 1000000 WHERE id = 1")
+            cur.execute("UPDATE cost_anomalies SET detected_at = detected_at - INTERVAL '1 hour'")
+        db.commit()
+        assert BudgetDetector(db_conn=db).detect_anomalies() == []
+
+        with db.cursor() as cur:
+            cur.execute("SELECT status, resolved_by FROM cost_anomalies WHERE id = %s", (finding['id'],))
+            assert cur.fetchone() == ('resolved', 'auto-reconciler')
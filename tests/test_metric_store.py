@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from src.detectors.metric_store import REFRESH_OVERLAP_SLOTS, MetricStore
+from src.detectors.utilization import collect_profiles
+
+PERIOD = 3600
+
+
+@pytest.fixture
+def store(tmp_path):
+    # One day of hourly slots: a 24-slot ring
+    return MetricStore(str(tmp_path), PERIOD, days=1)
+
+
+def _write(store, resource_id, first, last, values=None):
+    slots = np.arange(first, last + 1)
+    values = slots.astype(np.float64) if values is None else values
+    store.write(resource_id, 'CPUUtilization:Maximum', first, last, slots, values)
+
+
+def _read(store, resource_id, start, n):
+    return store.read(resource_id, 'CPUUtilization:Maximum', start, n)
+
+
+def test_read_back_within_capacity(store):
+    _write(store, 'i-1', 1000, 1009)
+    out = _read(store, 'i-1', 1005, 8)
+    assert out[:5].tolist() == [1005, 1006, 1007, 1008, 1009]
+    assert np.isnan(out[5:]).all()
+
+
+def test_wraps_and_forgets_slots_older_than_capacity(store):
+    _write(store, 'i-1', 1000, 1019)
+    _write(store, 'i-1', 1020, 1035)
+
+    out = _read(store, 'i-1', 1000, 36)
+    # Only the last 24 slots survive the wrap; older ones read as unknown
+    assert np.isnan(out[:12]).all()
+    assert out[12:].tolist() == list(range(1012, 1036))
+
+
+def test_gap_in_fetched_range_clears_old_lap(store):
+    _write(store, 'i-1', 1000, 1023)
+    # Nothing came back for 1024-1030: those ring positions must not show the previous lap
+    store.write('i-1', 'CPUUtilization:Maximum', 1024, 1030, np.array([], dtype=np.int64), np.array([]))
+
+    out = _read(store, 'i-1', 1007, 24)
+    assert out[:17].tolist() == list(range(1007, 1024))
+    assert np.isnan(out[17:]).all()
+
+
+def test_fetch_start_refetches_overlap(store):
+    assert store.fetch_start('i-1', 'CPUUtilization:Maximum', 990) == 990
+    _write(store, 'i-1', 1000, 1010)
+    assert store.fetch_start('i-1', 'CPUUtilization:Maximum', 990) == 1011 - REFRESH_OVERLAP_SLOTS
+    # A series older than the window is fetched in full
+    assert store.fetch_start('i-1', 'CPUUtilization:Maximum', 1020) == 1020
+
+
+def test_evict_and_persisted_index(store, tmp_path):
+    _write(store, 'i-1', 1000, 1005)
+    _write(store, 'i-2', 1000, 1005)
+    assert store.evict(['i-2']) == 1
+    store.save()
+
+    reopened = MetricStore(str(tmp_path), PERIOD, days=1)
+    assert reopened.last_slot('i-1', 'CPUUtilization:Maximum') is None
+    assert reopened.last_slot('i-2', 'CPUUtilization:Maximum') == 1005
+    assert np.isnan(_read(reopened, 'i-1', 1000, 6)).all()
+    assert _read(reopened, 'i-2', 1000, 6).tolist() == list(range(1000, 1006))
+
+
+def test_window_change_starts_series_over(store, tmp_path):
+    _write(store, 'i-1', 1000, 1005)
+    store.save()
+
+    longer = MetricStore(str(tmp_path), PERIOD, days=2)
+    _write(longer, 'i-1', 1006, 1007)
+    out = _read(longer, 'i-1', 1000, 8)
+    assert np.isnan(out[:6]).all()
+    assert out[6:].tolist() == [1006, 1007]
+
+
+class FakeCloudWatch:
+    """Answers every query with one datapoint per period, valued at its slot"""
+
+    def __init__(self):
+        self.requests = []
+
+    def get_metric_data(self, MetricDataQueries, StartTime, EndTime, ScanBy):
+        self.requests.append((len(MetricDataQueries), StartTime, EndTime))
+        slots = range(int(StartTime.timestamp()) // PERIOD, int(EndTime.timestamp()) // PERIOD)
+        stamps = [datetime.fromtimestamp(s * PERIOD, tz=timezone.utc) for s in slots]
+        return {'MetricDataResults': [
+            {'Id': q['Id'], 'Timestamps': stamps, 'Values': [float(s) for s in slots]}
+            for q in MetricDataQueries
+        ]}
+
+
+def test_second_cycle_fetches_only_new_and_overlap_slots(tmp_path):
+    cloudwatch = FakeCloudWatch()
+    metrics = {'cpu': ('CPUUtilization', 'Average')}
+    end = datetime(2024, 6, 2, 0, 0)
+    first_end_slot = int(end.replace(tzinfo=timezone.utc).timestamp()) // PERIOD
+
+    def collect(end_time):
+        store = MetricStore(str(tmp_path), PERIOD, days=1)
+        return collect_profiles(cloudwatch, 'AWS/EC2', 'InstanceId', ['i-1', 'i-2'], metrics,
+                                days=1, period=PERIOD, store=store, end_time=end_time)
+
+    collect(end)
+    profiles = collect(end + timedelta(hours=1))
+
+    (_, first_start, _), (queries, second_start, second_end) = cloudwatch.requests
+    assert (end - first_start.replace(tzinfo=None)) == timedelta(days=1)
+    # One new hour plus the overlap that CloudWatch may still be filling in
+    assert second_end - second_start == timedelta(hours=1 + REFRESH_OVERLAP_SLOTS)
+    # Every series is still queried each cycle; only the datapoints shrink
+    assert queries == 2
+    assert profiles.values.shape == (2, 1, 24)
+    assert profiles.values[0, 0].tolist() == list(range(first_end_slot - 23, first_end_slot + 1))
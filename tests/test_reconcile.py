@@ -0,0 +1,183 @@
+import boto3
+import pytest
+
+from src.detectors.aws_detector import AWSDetector
+from src.detectors.base_detector import BaseDetector
+
+
+def _finding(resource_id, resource_type='ec2', anomaly_type='idle_resource', cost=10.0, **details):
+    return {
+        'cloud_provider': 'aws',
+        'resource_id': resource_id,
+        'resource_type': resource_type,
+        'anomaly_type': anomaly_type,
+        'severity': 'medium',
+        'cost_impact': cost,
+        'details': details
+    }
+
+
+class FakeDetector(BaseDetector):
+    """Reports the findings it is given; the EBS rule fails when asked to"""
+
+    cloud_provider = 'aws'
+
+    RULE_COVERAGE = {
+        '_detect_idle': [('ec2', 'idle_resource')],
+        '_detect_orphans': [('ebs', 'orphaned_resource')]
+    }
+
+    def __init__(self, db, idle=(), orphans=(), orphans_fail=False, scope=None):
+        super().__init__(db_conn=db)
+        self.idle, self.orphans, self.orphans_fail, self.scope = idle, orphans, orphans_fail, scope
+
+    def detect_anomalies(self):
+        self.start_run()
+        findings = self.run_rules([self._detect_idle, self._detect_orphans])
+        for finding in findings:
+            finding['id'] = self.save_finding(finding)
+        self.reconcile(findings, self.scope)
+        return findings
+
+    def _detect_idle(self):
+        return [_finding(r, **(self.scope or {})) for r in self.idle]
+
+    def _detect_orphans(self):
+        if self.orphans_fail:
+            raise RuntimeError('DescribeVolumes failed')
+        return [_finding(r, 'ebs', 'orphaned_resource', **(self.scope or {})) for r in self.orphans]
+
+
+def _rows(db):
+    with db.cursor() as cur:
+        cur.execute("SELECT resource_id, status, cost_impact::float8, details->>'account_id' FROM cost_anomalies ORDER BY id")
+        return cur.fetchall()
+
+
+def _open(db):
+    return sorted(row[0] for row in _rows(db) if row[1] == 'open')
+
+
+class TestSaveFinding:
+    def test_redetection_refreshes_the_open_row(self, db):
+        detector = FakeDetector(db)
+        first = detector.save_finding(_finding('i-1', cost=10.0, account_id='111', region='us-east-1'))
+        second = detector.save_finding(_finding('i-1', cost=25.0, account_id='111', region='us-east-1'))
+
+        assert first == second
+        assert _rows(db) == [('i-1', 'open', 25.0, '111')]
+
+    def test_other_accounts_and_days_get_their_own_row(self, db):
+        detector = FakeDetector(db)
+        detector.save_finding(_finding('i-1', account_id='111', region='us-east-1'))
+        detector.save_finding(_finding('i-1', account_id='222', region='us-east-1'))
+        detector.save_finding(_finding('ce', 'cost', 'cost_spike', date='2024-05-01'))
+        detector.save_finding(_finding('ce', 'cost', 'cost_spike', date='2024-05-02'))
+        detector.save_finding(_finding('ce', 'cost', 'cost_spike', cost=50.0, date='2024-05-02'))
+
+        assert [row[0] for row in _rows(db)] == ['i-1', 'i-1', 'ce', 'ce']
+        assert _rows(db)[-1][2] == 50.0
+
+    def test_closed_rows_are_not_reopened(self, db):
+        detector = FakeDetector(db)
+        first = detector.save_finding(_finding('i-1'))
+        with db.cursor() as cur:
+            cur.execute("UPDATE cost_anomalies SET status = 'false_positive'")
+        db.commit()
+
+        assert detector.save_finding(_finding('i-1')) != first
+        assert [row[1] for row in _rows(db)] == ['false_positive', 'open']
+
+
+class TestReconcile:
+    def test_resolves_what_completed_rules_no_longer_report(self, db):
+        FakeDetector(db, idle=['i-1', 'i-2'], orphans=['vol-1']).detect_anomalies()
+        FakeDetector(db, idle=['i-2'], orphans=[]).detect_anomalies()
+
+        assert _open(db) == ['i-2']
+        with db.cursor() as cur:
+            cur.execute("SELECT DISTINCT resolved_by FROM cost_anomalies WHERE status = 'resolved'")
+            assert cur.fetchall() == [('auto-reconciler',)]
+
+    def test_failed_rule_keeps_its_anomalies_open(self, db):
+        FakeDetector(db, idle=['i-1'], orphans=['vol-1']).detect_anomalies()
+        detector = FakeDetector(db, idle=[], orphans_fail=True)
+        detector.detect_anomalies()
+
+        assert detector.failed_rules == ['_detect_orphans']
+        assert _open(db) == ['vol-1']
+
+    def test_only_the_runs_scope_is_resolved(self, db):
+        FakeDetector(db, idle=['i-1'], scope={'account_id': '111', 'region': 'us-east-1'}).detect_anomalies()
+        FakeDetector(db, idle=['i-2'], scope={'account_id': '222', 'region': 'us-east-1'}).detect_anomalies()
+        FakeDetector(db, idle=[], scope={'account_id': '111', 'region': 'us-east-1'}).detect_anomalies()
+
+        assert _open(db) == ['i-2']
+
+    def test_older_duplicates_are_resolved(self, db):
+        with db.cursor() as cur:
+            for _ in range(3):
+                cur.execute("""
+                    INSERT INTO cost_anomalies (cloud_provider, resource_id, resource_type, anomaly_type, severity, details)
+                    VALUES ('aws', 'i-1', 'ec2', 'idle_resource', 'medium', '{}')
+                """)
+        db.commit()
+
+        FakeDetector(db, idle=['i-1']).detect_anomalies()
+
+        with db.cursor() as cur:
+            cur.execute("SELECT id FROM cost_anomalies WHERE status = 'open'")
+            assert cur.fetchall() == [(3,)]
+
+    def test_replayed_runs_resolve_nothing(self, db):
+        FakeDetector(db, idle=['i-1']).detect_anomalies()
+        detector = FakeDetector(db)
+        detector.start_run()
+        detector.completed_rules = ['_detect_idle']
+        detector.replaying = True
+
+        assert detector.reconcile([]) == 0
+        assert _open(db) == ['i-1']
+
+
+@pytest.fixture
+def aws_detector(db, monkeypatch):
+    """AWSDetector with its rules stubbed out and reconcile calls recorded"""
+    def make(account_id=None):
+        session = boto3.Session(region_name='us-east-1', aws_access_key_id='x', aws_secret_access_key='y')
+        detector = AWSDetector(session=session, account_id=account_id, db_conn=db)
+        detector.reconciled = []
+        monkeypatch.setattr(detector, 'run_rules', lambda rules: [])
+        monkeypatch.setattr(detector, 'reconcile', lambda findings, scope=None: detector.reconciled.append(scope))
+        return detector
+    return make
+
+
+class TestAWSReconcileScope:
+    def test_account_runs_reconcile_their_account_and_region(self, aws_detector):
+        detector = aws_detector('111')
+        detector.detect_anomalies()
+        assert detector.reconciled == [{'account_id': '111', 'region': 'us-east-1'}]
+
+    def test_single_account_runs_reconcile_everything(self, aws_detector):
+        detector = aws_detector()
+        detector.detect_anomalies()
+        assert detector.reconciled == [None]
+
+    def test_sharded_runs_without_an_account_skip_reconcile(self, aws_detector, monkeypatch):
+        monkeypatch.setenv('AWS_SHARDED_SWEEP', 'true')
+        detector = aws_detector()
+        detector.detect_anomalies()
+        assert detector.reconciled == []
+
+
+def test_all_pages_follows_the_token():
+    pages = {None: {'Volumes': [1, 2], 'NextToken': 'a'}, 'a': {'Volumes': [3], 'NextToken': 'b'}, 'b': {'Volumes': []}}
+    calls = []
+
+    def describe_volumes(**kwargs):
+        calls.append(kwargs)
+        return pages[kwargs.get('NextToken')]
+
+    assert AWSDetector._all_pages(describe_volumes, 'Volumes', Filters=['f']) == [1, 2, 3]
+    assert calls == [{'Filters': ['f']}, {'Filters': ['f'], 'NextToken': 'a'}, {'Filters': ['f'], 'NextToken': 'b'}]
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from src.analytics.rightsizing import HOURS_PER_MONTH, catalog, recommend
+
+
+class TestRecommend:
+    def test_picks_cheapest_compatible_type(self):
+        (rec,) = recommend('ec2', ['m5.2xlarge'], np.array([10.0]), target_utilization=0.7, memory_floor=0.5)
+        # 8 vCPU at 10% needs ~1.14 vCPU and 16 GiB of memory: cheapest general x86 is m5.xlarge
+        # m6i.xlarge costs the same; staying in the family wins the tie
+        assert rec['target_type'] == 'm5.xlarge'
+        expected = (catalog.hourly_price[catalog.lookup('ec2', 'm5.2xlarge')]
+                    - catalog.hourly_price[catalog.lookup('ec2', 'm5.xlarge')]) * HOURS_PER_MONTH
+        assert rec['monthly_savings'] == pytest.approx(round(expected, 2))
+
+    def test_never_changes_architecture_or_category(self):
+        recs = recommend('ec2', ['m6g.2xlarge', 'r5.2xlarge'], np.array([5.0, 5.0]),
+                         target_utilization=0.7, memory_floor=0.5)
+        assert recs[0]['target_type'].startswith('m6g.')
+        assert recs[1]['target_type'].startswith('r5.')
+
+    def test_busy_unknown_and_smallest_types_get_nothing(self):
+        recs = recommend('ec2', ['m5.large', 'x9.huge', 't3.nano'], np.array([90.0, 5.0, 1.0]),
+                         target_utilization=0.7, memory_floor=0.5)
+        assert recs == [None, None, None]
+
+    def test_missing_cpu_is_treated_as_busy(self):
+        assert recommend('ec2', ['m5.2xlarge'], np.array([np.nan]), target_utilization=0.7, memory_floor=0.5) == [None]
+
+    def test_network_requirement_rules_out_small_types(self):
+        (rec,) = recommend('ec2', ['m5.12xlarge'], np.array([5.0]), network_p95_gbps=np.array([11.0]),
+                           target_utilization=0.7, memory_floor=0.5)
+        # Only m5.12xlarge itself offers 11 / 0.7 Gbps among general x86 types
+        assert rec is None
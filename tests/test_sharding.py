@@ -0,0 +1,117 @@
+import psycopg2
+import pytest
+
+from src.detectors import sharding
+from src.detectors.sharding import GLOBAL_REGION, ShardedAWSSweep, WorkUnit
+
+
+class InlinePool:
+    """Pool stand-in that runs units in this process, in dispatch order"""
+
+    def __init__(self, processes=None, initializer=None):
+        self.processes = processes
+
+    def imap_unordered(self, func, units, chunksize=1):
+        return (func(unit) for unit in units)
+
+    def close(self):
+        pass
+
+    def join(self):
+        pass
+
+
+class InlineContext:
+    Pool = InlinePool
+
+
+@pytest.fixture
+def sweep_env(monkeypatch, db_uri):
+    monkeypatch.setenv('AWS_ACCOUNT_IDS', '111,222')
+    monkeypatch.setenv('AWS_SWEEP_REGIONS', 'us-east-1,eu-west-1')
+    monkeypatch.setenv('SWEEP_MAX_ATTEMPTS', '3')
+    monkeypatch.setattr(sharding.multiprocessing, 'get_context', lambda method: InlineContext)
+    monkeypatch.setattr(sharding, '_get_db_connection', lambda: psycopg2.connect(db_uri))
+
+    def use(run_unit):
+        """Replace the worker entry point; returns the list of units it is given"""
+        dispatched = []
+
+        def record(unit):
+            dispatched.append(unit)
+            return run_unit(unit)
+        monkeypatch.setattr(sharding, '_run_unit', record)
+        return dispatched
+
+    return use
+
+
+def _checkpoints(db):
+    with db.cursor() as cur:
+        cur.execute("SELECT account_id, region, status, attempts, findings_count FROM sweep_checkpoints "
+                    "ORDER BY account_id, region")
+        rows = cur.fetchall()
+        cur.execute("SELECT status FROM detection_sweeps ORDER BY id")
+        sweeps = [r[0] for r in cur.fetchall()]
+    db.commit()
+    return rows, sweeps
+
+
+def test_every_unit_runs_once_and_is_checkpointed(db, sweep_env):
+    dispatched = sweep_env(lambda unit: (unit, [{'resource_id': unit.region}], None))
+
+    findings = ShardedAWSSweep(processes=2).detect_anomalies()
+
+    assert len(findings) == len(dispatched) == 6
+    # Account-wide units go first: they are the slowest
+    assert [u.region for u in dispatched[:2]] == [GLOBAL_REGION, GLOBAL_REGION]
+    rows, sweeps = _checkpoints(db)
+    assert sweeps == ['completed']
+    assert {(account, region) for account, region, *_ in rows} == {
+        (a, r) for a in ('111', '222') for r in (GLOBAL_REGION, 'us-east-1', 'eu-west-1')}
+    assert all(status == 'done' and attempts == 1 and count == 1 for *_, status, attempts, count in rows)
+
+
+def test_failed_units_are_retried_until_attempts_run_out(db, sweep_env):
+    failures = {WorkUnit('111', 'us-east-1'): 1, WorkUnit('222', 'eu-west-1'): 99}
+
+    def run_unit(unit):
+        if failures.get(unit, 0):
+            failures[unit] -= 1
+            return unit, [], 'Rules failed: _detect_idle_ec2'
+        return unit, [], None
+
+    dispatched = sweep_env(run_unit)
+    ShardedAWSSweep(processes=2).detect_anomalies()
+
+    rows, sweeps = _checkpoints(db)
+    state = {(a, r): (status, attempts) for a, r, status, attempts, _ in rows}
+    assert state[('111', 'us-east-1')] == ('done', 2)
+    assert state[('222', 'eu-west-1')] == ('failed', 3)
+    assert dispatched.count(WorkUnit('222', 'eu-west-1')) == 3
+    assert dispatched.count(WorkUnit('111', GLOBAL_REGION)) == 1
+    assert sweeps == ['partial']
+
+
+def test_interrupted_sweep_resumes_with_pending_units_only(db, sweep_env):
+    def crash_after_two(unit):
+        if len(first) > 2:
+            raise KeyboardInterrupt
+        return unit, [], None
+
+    first = sweep_env(crash_after_two)
+    with pytest.raises(KeyboardInterrupt):
+        ShardedAWSSweep(processes=2).detect_anomalies()
+    rows, sweeps = _checkpoints(db)
+    assert sweeps == ['running']
+    done = {WorkUnit(a, r) for a, r, status, *_ in rows if status == 'done'}
+    assert len(done) == 2
+
+    second = sweep_env(lambda unit: (unit, [], None))
+    ShardedAWSSweep(processes=2).detect_anomalies()
+
+    rows, sweeps = _checkpoints(db)
+    # Same sweep, finished without repeating the checkpointed units
+    assert sweeps == ['completed']
+    assert len(second) == 4 and not done & set(second)
+    assert all(status == 'done' and attempts == 1 for _, _, status, attempts, _ in rows)